@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required
 
 from sqlalchemy.exc import IntegrityError
@@ -11,6 +11,7 @@ from ..decorators import admin_required
 from ..user import User, FailedLogin
 from .forms import UserForm
 from ..settings import Setting
+from ..notifications.transport import pool as notification_http_pool
 
 
 admin = Blueprint("admin", __name__, url_prefix="/settings")
@@ -98,3 +99,73 @@ def remove(user_id):
     use_ssl = Setting.get_by_name("use_ssl", default=False).value
 
     return redirect(url_for("admin.users"))
+
+
+@admin.route("/diagnostics/broadcast")
+@login_required
+@admin_required
+def broadcast_stats():
+    return jsonify(current_app.decoder.broadcast_stats())
+
+
+@admin.route("/diagnostics/reconnect")
+@login_required
+@admin_required
+def reconnect_stats():
+    return jsonify(current_app.decoder.reconnect_stats())
+
+
+@admin.route("/diagnostics/runtime")
+@login_required
+@admin_required
+def runtime_stats():
+    return jsonify(current_app.decoder.runtime_stats())
+
+
+@admin.route("/diagnostics/capture")
+@login_required
+@admin_required
+def capture_stats():
+    return jsonify(current_app.decoder.capture_stats())
+
+
+@admin.route("/diagnostics/devices")
+@login_required
+@admin_required
+def device_stats():
+    return jsonify(current_app.decoder.device_stats())
+
+
+@admin.route("/diagnostics/event_log")
+@login_required
+@admin_required
+def event_log_stats():
+    return jsonify(current_app.decoder.event_log_stats())
+
+
+@admin.route("/diagnostics/settings_cache")
+@login_required
+@admin_required
+def settings_cache_stats():
+    return jsonify(Setting.cache.stats())
+
+
+@admin.route("/diagnostics/notifications")
+@login_required
+@admin_required
+def notification_stats():
+    return jsonify(current_app.decoder._notifier_system.stats())
+
+
+@admin.route("/diagnostics/http_pool")
+@login_required
+@admin_required
+def http_pool_stats():
+    return jsonify(notification_http_pool.stats())
+
+
+@admin.route("/diagnostics/notifiers")
+@login_required
+@admin_required
+def notifier_stats():
+    return jsonify(current_app.decoder._notifier_system.metrics.stats())
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+"""
+Optional asyncio runtime for the decoder service.
+
+Enabled with ``DECODER_RUNTIME = 'asyncio'`` (or ``AD2WEB_RUNTIME=asyncio``
+in the environment).  One event loop thread then replaces:
+
+* the alarmdecoder reader thread: :py:class:`StreamDevice` reads the AD2
+  through asyncio streams and hands each line to the unchanged
+  :py:class:`~alarmdecoder.AlarmDecoder` parser, which fires the existing
+  :py:class:`~ad2web.decoder.Decoder` event handlers;
+* the periodic checker threads (version, camera, export, event log
+  retention): their ``check()`` step is scheduled as a task on the loop and
+  run on a single worker thread, since it does blocking database and HTTP
+  work, so checks never overlap and nothing sleeps in its own loop.
+
+Serial devices need ``pyserial-asyncio``; network devices (ser2sock, with or
+without SSL) only need the standard library.  The threaded runtime remains
+the default.
+"""
+
+import os
+import ssl
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+import concurrent.futures
+
+from alarmdecoder.devices.base_device import Device
+from alarmdecoder.util import NoDeviceError, CommError, InvalidMessageError
+from alarmdecoder.util import TimeoutError as DeviceTimeoutError
+
+try:
+    import serial_asyncio
+    have_serial_asyncio = True
+except ImportError:
+    have_serial_asyncio = False
+
+logger = logging.getLogger(__name__)
+
+THREADS = 'threads'
+ASYNCIO = 'asyncio'
+
+
+def _ssl_context(ca, certificate, key):
+    """
+    Builds a client SSL context from the pyOpenSSL objects stored with the
+    certificates.  Like :py:class:`~alarmdecoder.devices.SocketDevice`, the
+    peer is verified against the CA but not against its host name.
+    """
+    from OpenSSL import crypto
+
+    context = ssl.create_default_context(cadata=crypto.dump_certificate(crypto.FILETYPE_PEM, ca).decode('ascii'))
+    context.check_hostname = False
+
+    # load_cert_chain only reads files.
+    fd, path = tempfile.mkstemp(suffix='.pem')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, certificate))
+            f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+        context.load_cert_chain(path)
+    finally:
+        os.remove(path)
+
+    return context
+
+
+class StreamDevice(Device):
+    """
+    AD2 device read and written through asyncio streams on the runtime loop.
+    """
+    CONNECT_TIMEOUT = 10
+
+    def __init__(self, interface, runtime, serial=False):
+        """
+        Constructor
+
+        :param interface: ``(host, port)`` or serial device path
+        :type interface: tuple or str
+        :param runtime: runtime whose loop does the I/O
+        :type runtime: :py:class:`AsyncRuntime`
+        :param serial: open a serial port instead of a TCP connection
+        :type serial: bool
+        """
+        Device.__init__(self)
+
+        self._interface = interface
+        self._runtime = runtime
+        self._serial = serial
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+        self.ssl = False
+        self.ssl_ca = None
+        self.ssl_certificate = None
+        self.ssl_key = None
+
+        self.lines = 0
+
+    @property
+    def interface(self):
+        return self._interface
+
+    def open(self, baudrate=None, no_reader_thread=False):
+        """
+        Opens the device.  Blocks the calling thread until connected.
+
+        :param baudrate: serial baudrate
+        :type baudrate: int
+        :param no_reader_thread: do not start the reader task; lines are
+                                 then read with :py:meth:`read_line`
+        :type no_reader_thread: bool
+        """
+        try:
+            self._reader, self._writer = self._runtime.call(self._connect(baudrate), timeout=self.CONNECT_TIMEOUT)
+        except Exception as err:
+            raise NoDeviceError('Error opening device at {0}: {1}'.format(self._interface, err), err)
+
+        self._running = True
+        self._id = self._interface if self._serial else '{0}:{1}'.format(*self._interface)
+
+        self.on_open()
+
+        if not no_reader_thread:
+            self._task = self._runtime.call(self._start_reader())
+
+        return self
+
+    def close(self):
+        self._running = False
+
+        task, writer = self._task, self._writer
+        self._task = self._reader = self._writer = None
+
+        loop = self._runtime.loop
+        if task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+        if writer is not None:
+            loop.call_soon_threadsafe(writer.close)
+
+        self.on_close()
+
+    def is_reader_alive(self):
+        return self._task is not None and not self._task.done()
+
+    def stop_reader(self):
+        if self._task is not None:
+            self._runtime.loop.call_soon_threadsafe(self._task.cancel)
+
+    def write(self, data):
+        """
+        Queues data for the device.  Safe to call from any thread.
+
+        :returns: number of bytes queued
+        :raises: :py:class:`~alarmdecoder.util.CommError`
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        writer = self._writer
+        if writer is None:
+            raise CommError('Error writing to device: not open.')
+
+        self._runtime.loop.call_soon_threadsafe(writer.write, data)
+        self.on_write(data=data)
+
+        return len(data)
+
+    def read_line(self, timeout=0.0, purge_buffer=False):
+        """
+        Reads a line directly, for callers that opened the device without
+        the reader task (e.g. firmware uploads).
+
+        :raises: :py:class:`~alarmdecoder.util.TimeoutError`, :py:class:`~alarmdecoder.util.CommError`
+        """
+        if self._reader is None:
+            raise CommError('Error reading from device: not open.')
+
+        try:
+            line = self._runtime.call(self._reader.readline(), timeout=timeout or None)
+        except concurrent.futures.TimeoutError:
+            raise DeviceTimeoutError('Timeout while waiting for line terminator.')
+        except (OSError, asyncio.IncompleteReadError) as err:
+            raise CommError('Error reading from device: {0}'.format(err), err)
+
+        line = line.replace(b'\xff', b'').rstrip(b'\r\n')
+        if line:
+            self.on_read(data=line)
+
+        return line.decode('utf-8')
+
+    def read(self):
+        if self._reader is None:
+            raise CommError('Error reading from device: not open.')
+
+        return self._runtime.call(self._reader.read(1)).decode('utf-8')
+
+    def purge(self):
+        pass
+
+    async def _connect(self, baudrate):
+        if self._serial:
+            if not have_serial_asyncio:
+                raise NoDeviceError('The asyncio runtime needs pyserial-asyncio for serial devices; use "pip install pyserial-asyncio".')
+
+            kwargs = {'baudrate': baudrate} if baudrate else {}
+            return await serial_asyncio.open_serial_connection(url=self._interface, **kwargs)
+
+        context = None
+        if self.ssl:
+            context = _ssl_context(self.ssl_ca, self.ssl_certificate, self.ssl_key)
+
+        host, port = self._interface
+        return await asyncio.open_connection(host, port, ssl=context)
+
+    async def _start_reader(self):
+        return asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def _read_loop(self):
+        reader = self._reader
+
+        try:
+            while self._running:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                line = line.replace(b'\xff', b'').rstrip(b'\r\n')
+                if line:
+                    self._dispatch(line)
+        except asyncio.CancelledError:
+            return
+        except Exception as err:
+            logger.error('Error reading from {0}: {1}'.format(self._interface, err))
+
+        # Connection lost; the reconnect supervisor takes it from here.
+        if self._running:
+            self.close()
+
+    def _dispatch(self, line):
+        self.lines += 1
+
+        try:
+            self.on_read(data=line)
+        except InvalidMessageError:
+            pass
+        except Exception as err:
+            logger.error('Error handling message {0!r}: {1}'.format(line, err), exc_info=True)
+
+
+class AsyncRuntime(object):
+    """
+    One asyncio loop thread plus one worker for blocking periodic checks.
+    """
+    def __init__(self, workers=1):
+        """
+        Constructor
+
+        :param workers: threads running blocking checks
+        :type workers: int
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='ad2web-asyncio')
+        self._thread.daemon = True
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ad2web-check')
+        self._tasks = []
+        self._checks = {}
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        if not self.running:
+            return
+
+        async def _shutdown():
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        try:
+            self.call(_shutdown(), timeout=timeout)
+        except Exception as err:
+            logger.error('Error stopping asyncio runtime tasks: {0}'.format(err))
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def call(self, coro, timeout=None):
+        """
+        Runs a coroutine on the loop and waits for its result.  Must not be
+        called from the loop thread.
+
+        :raises concurrent.futures.TimeoutError: after ``timeout`` seconds;
+                                                 the coroutine is cancelled
+        """
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError('AsyncRuntime.call() would block the event loop.')
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def device(self, interface, serial=False):
+        """Returns a :py:class:`StreamDevice` bound to this loop."""
+        return StreamDevice(interface, self, serial=serial)
+
+    def schedule(self, name, check, interval, delay=0):
+        """
+        Runs ``check()`` on the worker every ``interval()`` seconds.  Runs of
+        the same check never overlap.
+
+        :param name: name reported in :py:meth:`stats`
+        :type name: str
+        :param check: blocking callable
+        :type check: callable
+        :param interval: callable returning the seconds until the next run,
+                         read after each run so setting changes apply
+        :type interval: callable
+        :param delay: seconds before the first run
+        :type delay: float
+        """
+        self._checks[name] = {
+            'runs': 0,
+            'errors': 0,
+            'last_run': None,
+            'duration_ms_last': None,
+            'duration_ms_max': 0.0,
+            'lag_ms_last': None,
+            'lag_ms_max': 0.0,
+        }
+
+        def _create():
+            self._tasks.append(self.loop.create_task(self._periodic(name, check, interval, delay)))
+
+        self.loop.call_soon_threadsafe(_create)
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'threads': threading.active_count(),
+            'checks': dict((name, dict(stats)) for name, stats in self._checks.items()),
+        }
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _periodic(self, name, check, interval, delay):
+        stats = self._checks[name]
+        due = self.loop.time() + delay
+        await asyncio.sleep(delay)
+
+        while True:
+            started = self.loop.time()
+            # Wakeup latency: how late the run started against its schedule.
+            lag = max(0.0, started - due) * 1000
+            stats['lag_ms_last'] = lag
+            stats['lag_ms_max'] = max(stats['lag_ms_max'], lag)
+
+            try:
+                await self.loop.run_in_executor(self._executor, check)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                stats['errors'] += 1
+                logger.error('Error in scheduled check {0}: {1}'.format(name, err), exc_info=True)
+
+            duration = (self.loop.time() - started) * 1000
+            stats['runs'] += 1
+            stats['last_run'] = time.time()
+            stats['duration_ms_last'] = duration
+            stats['duration_ms_max'] = max(stats['duration_ms_max'], duration)
+
+            seconds = interval()
+            due = self.loop.time() + seconds
+            await asyncio.sleep(seconds)
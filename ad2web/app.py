@@ -8,6 +8,7 @@ monkey.patch_all()
 import os
 import signal
 import logging
+import datetime
 
 
 
@@ -23,6 +24,7 @@ import click  # For CLI commands
 from .config import DefaultConfig
 from .extensions import db, mail, login_manager, oid, babel  # Added babel here from configure_extensions
 from .utils import INSTANCE_FOLDER_PATH  # Only import needed path from utils here
+from .logstore import SegmentedLogHandler
 from .settings.models import Setting
 from .setup.constants import SETUP_COMPLETE, SETUP_STAGE_ENDPOINT, SETUP_ENDPOINT_STAGE
 from .user.models import User  # Needed for LoginManager user_loader
@@ -283,6 +285,11 @@ def configure_logging(app):
          file_handler.setLevel(logging.INFO if not app.config.get('VERBOSE_LOGGING') else logging.DEBUG)
          app.logger.addHandler(file_handler)
 
+         # Same records as JSON in an indexed store, queried from the log page
+         record_handler = SegmentedLogHandler(os.path.join(log_folder, 'records'))
+         record_handler.setLevel(file_handler.level)
+         app.logger.addHandler(record_handler)
+
     app.logger.setLevel(logging.DEBUG if app.config['DEBUG'] else logging.INFO)
     app.logger.info('AlarmDecoder Webapp starting up...')
 
@@ -299,7 +306,7 @@ def configure_hook(app):
 
         if request.blueprint not in safe_blueprints:
             try:
-                 setup_stage = db.session.query(Setting.value).filter_by(name='setup_stage').scalar()
+                 setup_stage = Setting.get_many(['setup_stage'])['setup_stage']
             except Exception:
                  setup_stage = None  # Assume setup not complete if DB error
 
@@ -379,6 +386,139 @@ def register_commands(app):
             click.echo(f'Database initialization failed: {err}', err=True)
             app.logger.error(f'Database initialization failed: {err}', exc_info=True)
 
+    @app.cli.command('export-events')
+    @click.option('--format', 'format', type=click.Choice(['arrow', 'parquet', 'npz']), default='arrow',
+                  help='Output format.')
+    @click.option('--since', type=click.DateTime(), default=None, help='First timestamp included (UTC).')
+    @click.option('--until', type=click.DateTime(), default=None, help='First timestamp excluded (UTC).')
+    @click.option('--chunk-hours', type=int, default=24, help='Hours of history per record batch.')
+    @click.argument('output', type=click.File('wb'))
+    @with_appcontext
+    def export_events_command(format, since, until, chunk_hours, output):
+        """Exports the event log to OUTPUT ('-' for stdout) in a columnar format."""
+        from .log import analytics
+
+        try:
+            chunks = analytics.export(format, since, until, chunk=datetime.timedelta(hours=chunk_hours))
+            written = 0
+            for data in chunks:
+                output.write(data)
+                written += len(data)
+        except ValueError as err:
+            raise click.ClickException(str(err))
+
+        click.echo(f'Exported {written} bytes of event log.', err=True)
+
+    @app.cli.command('restore-backup')
+    @click.option('--folder', default=None, help='Directory holding the backups, defaults to the export path.')
+    @click.argument('archive_id', required=False)
+    @with_appcontext
+    def restore_backup_command(folder, archive_id):
+        """Restores an incremental backup chain, the last one written if ARCHIVE_ID is omitted."""
+        from .backup import IncrementalBackup
+
+        backup = IncrementalBackup(folder=folder)
+
+        try:
+            chain = backup.chain(archive_id)
+            click.echo('Restoring {0} archive(s) from {1}'.format(len(chain), backup.folder))
+            counts = backup.restore(chain[-1]['id'])
+        except ValueError as err:
+            raise click.ClickException(str(err))
+
+        for name, count in sorted(counts.items()):
+            click.echo(f'{name}: {count} rows')
+        click.echo('Restart the service to apply the restored settings.')
+
+    @app.cli.command('replay-capture')
+    @click.option('--speed', type=float, default=1.0, help='Playback speed, 0 for as fast as possible.')
+    @click.argument('journal', type=click.Path(exists=True, dir_okay=False))
+    @with_appcontext
+    def replay_capture_command(speed, journal):
+        """Replays a device capture JOURNAL, with its rotated files, into a mock device."""
+        from .capture import read_journal, READ, KEYPRESS
+        from .replay import Replay
+
+        try:
+            records = list(read_journal(journal))
+        except ValueError as err:
+            raise click.ClickException(str(err))
+
+        lines = [r for r in records if r.kind == READ]
+        if not lines:
+            raise click.ClickException('No device lines in {0}.'.format(journal))
+
+        offsets = None
+        if speed > 0:
+            offsets = [(r.time - lines[0].time) / speed for r in lines]
+
+        click.echo('Replaying {0} lines ({1} keypresses recorded) from {2}, captured {3:%Y-%m-%d %H:%M:%S}'.format(
+            len(lines), sum(1 for r in records if r.kind == KEYPRESS), journal,
+            datetime.datetime.fromtimestamp(lines[0].time)))
+
+        with Replay(app.decoder) as replay:
+            report = replay.run([r.data for r in lines], offsets=offsets)
+
+        for line in Replay.format_report(report):
+            click.echo(line)
+
+    @app.cli.command('add-device')
+    @click.option('--type', 'device_type', default='AD2USB', help='Device model, e.g. AD2USB or AD2PI.')
+    @click.option('--path', default=None, help='Serial port of a local device.')
+    @click.option('--baudrate', type=int, default=115200, help='Baudrate of a local device.')
+    @click.option('--address', default=None, help='Host of a network or ser2sock device.')
+    @click.option('--port', type=int, default=None, help='Port of a network or ser2sock device.')
+    @click.option('--ssl', 'use_ssl', is_flag=True, help='Connect to the network device over SSL.')
+    @click.option('--address-mask', default='FFFFFFFF', help='Partitions to report, as hex.')
+    @click.argument('name')
+    @with_appcontext
+    def add_device_command(device_type, path, baudrate, address, port, use_ssl, address_mask, name):
+        """Adds an AlarmDecoder device NAME alongside the primary one."""
+        from .devices import DeviceConfig
+
+        if path and address:
+            raise click.ClickException('Give either --path or --address, not both.')
+        if not path and not (address and port):
+            raise click.ClickException('Give --path for a local device or --address and --port for a network one.')
+
+        device = DeviceConfig(name=name, device_type=device_type, device_location='local' if path else 'network',
+                              device_path=path, device_baudrate=baudrate, device_address=address,
+                              device_port=port, use_ssl=use_ssl, address_mask=address_mask)
+        db.session.add(device)
+        try:
+            db.session.commit()
+        except Exception as err:
+            db.session.rollback()
+            raise click.ClickException(str(err))
+
+        click.echo(f'Added device {device.id} ({name}). Restart the service to connect to it.')
+
+    @app.cli.command('list-devices')
+    @with_appcontext
+    def list_devices_command():
+        """Lists the devices added alongside the primary one."""
+        from .devices import DeviceConfig
+
+        for device in db.session.query(DeviceConfig).order_by(DeviceConfig.id):
+            interface = device.device_path if device.device_location == 'local' else f'{device.device_address}:{device.device_port}'
+            click.echo(f"{device.id:3d} {device.name:20s} {device.device_type:8s} {interface}"
+                       f"{'' if device.enabled else ' (disabled)'}")
+
+    @app.cli.command('remove-device')
+    @click.argument('device_id', type=int)
+    @with_appcontext
+    def remove_device_command(device_id):
+        """Removes device DEVICE_ID; its event log rows are kept."""
+        from .devices import DeviceConfig
+
+        device = db.session.get(DeviceConfig, device_id)
+        if device is None:
+            raise click.ClickException(f'No device {device_id}.')
+
+        db.session.delete(device)
+        db.session.commit()
+        click.echo(f'Removed device {device_id} ({device.name}). Restart the service to disconnect it.')
+
 # --- User Loader for Flask-Login ---
 @login_manager.user_loader
 def load_user(user_id):
@@ -0,0 +1,436 @@
+"""
+Incremental scheduled backups.
+
+A chain starts with a full archive (every row of every table in the export
+map) followed by deltas holding only the rows that changed since the
+previous archive and the primary keys of rows that were deleted.  A new
+full archive is started after ``full_every`` deltas.
+
+Changes are found by comparing each row's content hash with the one
+recorded by the previous backup in a small state file.  Rows above a
+table's recorded high-water mark (its largest primary key) are new without
+a lookup; rows no longer seen were deleted.  When nothing changed no
+archive is written at all.  The state file holds one hash per row and is
+rewritten by every backup, which only suits the small configuration tables
+of the export map (settings, users, zones, notifications and the like); it
+is not meant for large or fast-growing tables such as the event log.
+
+Archives are content addressed: named after the SHA-256 of the data they
+hold (and, for deltas, the archive they follow), so an archive whose
+content already exists in the export directory is not written twice.
+Each archive starts with ``manifest.json``, which is enough to rebuild the
+chains from the directory alone.
+
+:py:meth:`IncrementalBackup.restore` replays a chain, base first, in a
+single transaction.
+"""
+
+import os
+import io
+import json
+import time
+import glob
+import hashlib
+import logging
+import tarfile
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam
+
+from .extensions import db
+from .exporter import Exporter, encode_row, export_name
+from .settings import Setting
+from .settings.constants import get_export_map
+from .zones import Zone
+from .utils import tar_add_directory, tar_add_fileobj
+
+logger = logging.getLogger(__name__)
+
+FULL = 'full'
+DELTA = 'delta'
+
+MANIFEST = 'manifest.json'
+STATE_FILE = 'alarmdecoder-backup.state'
+ARCHIVE_PREFIX = 'alarmdecoder-backup-'
+ARCHIVE_SUFFIX = '.tar.gz'
+DELETED_SUFFIX = '.deleted.jsonl'
+
+
+def _row_key(row, primary_key):
+    return json.dumps([row[c] for c in primary_key])
+
+
+def _row_hash(line):
+    return hashlib.sha1(line).hexdigest()[:16]
+
+
+def _high_water(row, primary_key):
+    # Only single integer keys have a meaningful maximum.
+    if len(primary_key) == 1 and isinstance(row[primary_key[0]], int):
+        return row[primary_key[0]]
+
+    return None
+
+
+def read_manifest(path):
+    """
+    Reads the manifest of an archive without decompressing the rest of it.
+
+    :returns: dict, or None if the file is not a backup archive
+    """
+    try:
+        with tarfile.open(path, mode='r|gz') as tar:
+            for member in tar:
+                if os.path.basename(member.name) == MANIFEST:
+                    return json.loads(tar.extractfile(member).read())
+                if member.isfile():
+                    return None
+    except (OSError, tarfile.TarError, ValueError):
+        return None
+
+    return None
+
+
+class IncrementalBackup(object):
+    """
+    Writes full and delta archives to the export directory.
+    """
+    FULL_EVERY = 24
+
+    def __init__(self, exporter=None, full_every=None, folder=None):
+        """
+        Constructor
+
+        :param exporter: exporter whose directory and row reader are used
+        :type exporter: :py:class:`~ad2web.exporter.Exporter`
+        :param full_every: deltas written before a new full archive
+        :type full_every: int
+        :param folder: directory holding the archives, defaults to the
+                       exporter's
+        :type folder: str
+        """
+        self.exporter = exporter or Exporter()
+        self.folder = folder or self.exporter.export_path
+        self.prefix = self.exporter.prefix
+        self.full_every = full_every or self.FULL_EVERY
+        self.state_path = os.path.join(self.folder, STATE_FILE)
+
+    def archives(self):
+        """
+        Lists the archives in the export directory.
+
+        :returns: dict of archive id to manifest, with ``path`` added
+        """
+        found = {}
+        for path in glob.glob(os.path.join(self.folder, ARCHIVE_PREFIX + '*' + ARCHIVE_SUFFIX)):
+            manifest = read_manifest(path)
+            if manifest is not None:
+                manifest['path'] = path
+                found[manifest['id']] = manifest
+
+        return found
+
+    def chain(self, archive_id=None):
+        """
+        Returns the manifests needed to restore an archive, base first.
+
+        :param archive_id: archive to restore or a prefix of its id, the
+                           last one written if None
+        :type archive_id: str
+        :raises ValueError: if the archive or one it depends on is missing,
+                            or the prefix matches more than one archive
+        """
+        archives = self.archives()
+        if not archives:
+            raise ValueError('No backups found in {0}'.format(self.folder))
+
+        if archive_id is None:
+            archive_id = self._load_state().get('head')
+            if archive_id not in archives:
+                archive_id = max(archives.values(), key=lambda m: (m['created'], m['sequence']))['id']
+        elif archive_id not in archives:
+            # Accept the shortened ids used in the file names.
+            matches = [a for a in archives if a.startswith(archive_id)]
+            if len(matches) > 1:
+                raise ValueError('Ambiguous backup id {0}: matches {1}'.format(archive_id, ', '.join(sorted(matches))))
+            if matches:
+                archive_id = matches[0]
+
+        chain = []
+        while archive_id is not None:
+            manifest = archives.get(archive_id)
+            if manifest is None:
+                raise ValueError('Backup {0} is missing from {1}'.format(archive_id, self.folder))
+
+            chain.append(manifest)
+            archive_id = manifest['parent']
+
+        return list(reversed(chain))
+
+    def run(self):
+        """
+        Writes the next archive of the chain.
+
+        :returns: path of the archive, or None if nothing changed
+        """
+        state = self._load_state()
+        parent = state.get('head')
+        if parent is not None and not os.path.exists(self._path(parent)) and state.get('local', True):
+            parent = None
+
+        full = parent is None or state.get('deltas', 0) >= self.full_every
+        kind = FULL if full else DELTA
+        tables = {} if full else state.get('tables', {})
+
+        digest = hashlib.sha256(kind.encode('ascii') + (parent or '').encode('ascii'))
+        new_tables = {}
+        summary = {}
+        spools = []
+        try:
+            for export_file, model in get_export_map().items():
+                name = os.path.splitext(export_file)[0]
+                previous = tables.get(name, {'max_id': None, 'rows': {}})
+                rows, deleted, new_tables[name] = self._diff(model, previous, full)
+
+                if rows.tell() or deleted.tell():
+                    has_deleted = deleted.tell() > 0
+                    digest.update(name.encode('utf-8'))
+                    for spool in (rows, deleted):
+                        spool.seek(0)
+                        for data in iter(lambda: spool.read(65536), b''):
+                            digest.update(data)
+                        spool.seek(0)
+
+                    spools.append((name, rows, deleted, has_deleted))
+                    summary[name] = new_tables[name]['changed']
+                else:
+                    rows.close()
+                    deleted.close()
+
+            if not full and not spools:
+                logger.debug('Backup skipped, nothing changed since {0}'.format(parent))
+                return None
+
+            archive_id = digest.hexdigest()
+            path = self._path(archive_id)
+            manifest = {
+                'id': archive_id,
+                'kind': kind,
+                'parent': None if full else parent,
+                'created': time.time(),
+                'sequence': 0 if full else state.get('deltas', 0) + 1,
+                'tables': summary,
+            }
+
+            if os.path.exists(path):
+                logger.info('Backup {0} already exists, not written again'.format(archive_id))
+            else:
+                self._write(path, manifest, spools)
+        finally:
+            for _, rows, deleted, _ in spools:
+                rows.close()
+                deleted.close()
+
+        for table in new_tables.values():
+            del table['changed']
+
+        self._save_state({
+            'head': archive_id,
+            'deltas': manifest['sequence'],
+            'tables': new_tables,
+        })
+
+        return path
+
+    def forget(self):
+        """
+        Marks the chain as not kept locally, e.g. after it was emailed and
+        removed.  The next delta still follows it.
+        """
+        state = self._load_state()
+        if state:
+            state['local'] = False
+            self._save_state(state)
+
+    def prune(self, days):
+        """
+        Removes chains whose newest archive is older than ``days``.  The
+        current chain is always kept.
+        """
+        cutoff = time.time() - days * Exporter.DAY_SECONDS
+        archives = self.archives()
+        head = self._load_state().get('head')
+
+        newest = {}
+        members = {}
+        for manifest in archives.values():
+            base = manifest
+            while base['parent'] is not None and base['parent'] in archives:
+                base = archives[base['parent']]
+
+            newest[base['id']] = max(newest.get(base['id'], 0), manifest['created'])
+            members.setdefault(base['id'], []).append(manifest)
+            if manifest['id'] == head:
+                newest[base['id']] = float('inf')
+
+        for base_id, created in newest.items():
+            if created < cutoff:
+                for manifest in members[base_id]:
+                    logger.info('Removing expired backup {0}'.format(manifest['path']))
+                    os.remove(manifest['path'])
+
+    def restore(self, archive_id=None):
+        """
+        Replaces the exported tables with the contents of an archive and the
+        archives it follows.  Runs in one transaction.
+
+        :param archive_id: archive to restore, the newest if None
+        :type archive_id: str
+
+        :returns: dict of table name to rows after the restore
+        :raises ValueError: if the chain is incomplete
+        """
+        chain = self.chain(archive_id)
+        models = dict((os.path.splitext(f)[0], m) for f, m in get_export_map().items())
+
+        try:
+            for manifest in chain:
+                self._apply(manifest, models)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Bulk statements skip the mapper events that keep the caches current.
+        Setting.cache.invalidate()
+        Zone.index.invalidate()
+
+        return dict((name, model.query.count()) for name, model in models.items())
+
+    def _diff(self, model, previous, full):
+        primary_key = [c.key for c in model.__table__.primary_key.columns]
+        old_rows = previous['rows']
+        max_id = previous['max_id']
+
+        rows = tempfile.SpooledTemporaryFile(max_size=self.exporter.SPOOL_SIZE)
+        deleted = tempfile.SpooledTemporaryFile(max_size=self.exporter.SPOOL_SIZE)
+        seen = {}
+        high_water = None
+        changed = 0
+
+        for row in self.exporter.iter_rows(model):
+            line = encode_row(row)
+            key = _row_key(row, primary_key)
+            row_hash = seen[key] = _row_hash(line)
+
+            row_id = _high_water(row, primary_key)
+            if row_id is not None:
+                high_water = row_id if high_water is None else max(high_water, row_id)
+
+            is_new = row_id is not None and max_id is not None and row_id > max_id
+            if full or is_new or old_rows.get(key) != row_hash:
+                rows.write(line)
+                changed += 1
+
+        for key in old_rows:
+            if key not in seen:
+                deleted.write((key + '\n').encode('utf-8'))
+                changed += 1
+
+        return rows, deleted, {'max_id': high_water, 'rows': seen, 'changed': changed}
+
+    def _write(self, path, manifest, spools):
+        partial = path + '.part'
+        try:
+            with tarfile.open(partial, mode='w:gz') as tar:
+                tar_add_directory(tar, self.prefix)
+                tar_add_fileobj(tar, MANIFEST, io.BytesIO(json.dumps(manifest, sort_keys=True).encode('utf-8')), self.prefix)
+
+                for name, rows, deleted, has_deleted in spools:
+                    tar_add_fileobj(tar, export_name(name), rows, self.prefix)
+                    if has_deleted:
+                        tar_add_fileobj(tar, name + DELETED_SUFFIX, deleted, self.prefix)
+
+            os.replace(partial, path)
+        except Exception:
+            if os.path.isfile(partial):
+                os.remove(partial)
+            raise
+
+    def _apply(self, manifest, models):
+        with tarfile.open(manifest['path'], mode='r|gz') as tar:
+            if manifest['kind'] == FULL:
+                for model in models.values():
+                    db.session.execute(model.__table__.delete())
+
+            for member in tar:
+                filename = os.path.basename(member.name)
+                if filename.endswith(DELETED_SUFFIX):
+                    name, rows = filename[:-len(DELETED_SUFFIX)], False
+                else:
+                    name, rows = os.path.splitext(filename)[0], True
+
+                model = models.get(name)
+                if model is None or not member.isfile():
+                    continue
+
+                fileobj = tar.extractfile(member)
+                if rows:
+                    self._upsert(model.__table__, fileobj, replace=manifest['kind'] == DELTA)
+                else:
+                    self._delete(model.__table__, [json.loads(line) for line in fileobj if line.strip()])
+
+    def _upsert(self, table, fileobj, replace):
+        primary_key = [c.key for c in table.primary_key.columns]
+        datetimes = [c.key for c in table.columns if isinstance(c.type, db.DateTime)]
+
+        batch = []
+        for line in fileobj:
+            if not line.strip():
+                continue
+
+            row = json.loads(line)
+            for key in datetimes:
+                if row.get(key) is not None:
+                    row[key] = datetime.strptime(row[key], '%Y-%m-%d %H:%M:%S.%f')
+            batch.append(row)
+
+            if len(batch) >= self.exporter.BATCH_SIZE:
+                self._insert(table, batch, primary_key, replace)
+                batch = []
+
+        if batch:
+            self._insert(table, batch, primary_key, replace)
+
+    def _insert(self, table, batch, primary_key, replace):
+        if replace:
+            self._delete(table, [[row[c] for c in primary_key] for row in batch])
+
+        db.session.execute(table.insert(), batch)
+
+    @staticmethod
+    def _delete(table, keys):
+        if not keys:
+            return
+
+        columns = list(table.primary_key.columns)
+        statement = table.delete().where(and_(*[c == bindparam('pk_' + c.key) for c in columns]))
+        db.session.execute(statement, [dict(('pk_' + c.key, value) for c, value in zip(columns, key)) for key in keys])
+
+    def _path(self, archive_id):
+        return os.path.join(self.folder, ARCHIVE_PREFIX + archive_id[:32] + ARCHIVE_SUFFIX)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
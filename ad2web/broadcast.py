@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Coalescing, rate-limited Socket.IO broadcast queue.
+
+:py:meth:`Decoder.emit_event` used to call ``socketio.emit`` directly from the
+alarmdecoder reader thread, so a slow websocket client or a burst of keypad
+updates stalled serial reading.  Frames are now queued here and drained by a
+dedicated sender thread once per flush window.
+
+Keypad ``message`` frames for the same partition (address mask) supersede
+each other: only the latest one pending in a window is sent.  When the queue
+is full the oldest ``message`` frame is dropped.  ``event`` frames are never
+coalesced or dropped.
+"""
+
+import time
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+
+from .extensions import socketio
+from .serializer import serializer
+
+logger = logging.getLogger(__name__)
+
+# Frames that may be coalesced or dropped under load.
+COALESCE_EVENTS = ('message',)
+
+
+class BroadcastQueue(threading.Thread):
+    """
+    Bounded broadcast queue drained by its own sender thread.
+    """
+    MAX_DEPTH = 1000
+    FLUSH_INTERVAL = 0.1
+
+    def __init__(self, max_depth=None, flush_interval=None, emitter=None):
+        """
+        Constructor
+
+        :param max_depth: maximum number of droppable frames held at once
+        :type max_depth: int
+        :param flush_interval: minimum seconds between flushes
+        :type flush_interval: float
+        :param emitter: callable used to deliver frames, defaults to ``socketio.emit``
+        :type emitter: callable
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.max_depth = max_depth or self.MAX_DEPTH
+        self.flush_interval = self.FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._emitter = emitter or self._socketio_emit
+        self._pending = OrderedDict()
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._last_flush = 0
+
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        """
+        Returns the queue counters.
+
+        :returns: dict
+        """
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+        }
+
+    def put(self, event_name, data=None, namespace='/alarmdecoder', room=None):
+        """
+        Queues a frame for broadcast.  Never blocks.
+
+        :param event_name: Name of the Socket.IO event.
+        :type event_name: str
+        :param data: payload, serialized by the sender thread
+        :type data: dict
+        :param namespace: The Socket.IO namespace to emit to.
+        :type namespace: str
+        :param room: room to emit to, everyone in the namespace if None
+        :type room: str
+        """
+        key = self._coalesce_key(event_name, data, namespace, room)
+
+        with self._cond:
+            self.enqueued += 1
+
+            if key is not None and key in self._pending:
+                # Superseded before it was sent; keep only the latest.
+                del self._pending[key]
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_depth and not self._drop_oldest():
+                if event_name in COALESCE_EVENTS:
+                    # Nothing droppable is queued, so shed the new frame instead.
+                    self.dropped += 1
+                    return
+
+            if key is None:
+                key = ('frame', next(self._sequence))
+
+            self._pending[key] = (event_name, data, namespace, room)
+            self._cond.notify()
+
+    def flush(self):
+        """
+        Sends everything currently pending.
+
+        :returns: number of frames sent
+        """
+        with self._cond:
+            frames = list(self._pending.values())
+            self._pending.clear()
+            self._last_flush = time.time()
+
+        for event_name, data, namespace, room in frames:
+            try:
+                if room is None:
+                    self._emitter(event_name, serializer.serialize(data), namespace)
+                else:
+                    self._emitter(event_name, serializer.serialize(data), namespace, room=room)
+                self.sent += 1
+            except Exception as err:
+                self.errors += 1
+                logger.error("Error broadcasting '{0}': {1}".format(event_name, err), exc_info=True)
+
+        return len(frames)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+
+    def run(self):
+        self._running = True
+
+        while self._running:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+
+            # Rate limit: let frames accumulate until the window closes.
+            remaining = self._last_flush + self.flush_interval - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+
+            self.flush()
+
+        # Deliver anything left so events are not lost on shutdown.
+        self.flush()
+
+    def _coalesce_key(self, event_name, data, namespace, room=None):
+        if event_name not in COALESCE_EVENTS or not isinstance(data, dict):
+            return None
+
+        if data.get('message_type') != 'panel':
+            return None
+
+        # One pending keypad frame per device room and partition (address mask).
+        return (event_name, namespace, room, getattr(data.get('message'), 'mask', None))
+
+    def _drop_oldest(self):
+        for key, frame in self._pending.items():
+            if frame[0] in COALESCE_EVENTS:
+                del self._pending[key]
+                self.dropped += 1
+                return True
+
+        return False
+
+    @staticmethod
+    def _socketio_emit(event_name, data, namespace, room=None):
+        socketio.emit(event_name, data, namespace=namespace, to=room)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+"""
+Raw device traffic capture.
+
+When ``CAPTURE_ENABLED`` is set, every line read from the AD2 device and
+every key sent from the keypad page is appended to a binary journal, so a
+field problem can be replayed later with ``flask replay-capture`` without
+a panel attached.
+
+A journal file starts with a header::
+
+    magic 'AD2J' | version (uint8) | 3 pad bytes | wall clock (double) | monotonic ns (uint64)
+
+followed by records::
+
+    length (uint16) | kind (uint8) | monotonic ns (uint64) | data
+
+All integers are little-endian.  The header pairs the monotonic clock with
+the wall clock, so record times are exact relative to each other and can
+still be shown as dates.  Files rotate at ``CAPTURE_MAX_BYTES`` like
+:py:class:`logging.handlers.RotatingFileHandler` (``capture.ad2j``,
+``capture.ad2j.1``, ...).  Writes are buffered and flushed at most once a
+second, so a record costs one ``struct.pack`` and a buffered write.  A
+record left in the buffer arms a timer that flushes it when the second is
+up even if nothing else is written, so a crash loses at most the last
+second; readers stop at a truncated record.
+
+Journals are read through ``mmap`` without copying the file into memory.
+"""
+
+import os
+import mmap
+import time
+import struct
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'AD2J'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xdQ')
+RECORD = struct.Struct('<HBQ')
+MAX_LENGTH = 0xFFFF
+
+# Record kinds
+READ = 1
+KEYPRESS = 2
+
+KINDS = {READ: 'read', KEYPRESS: 'keypress'}
+
+CAPTURE_FILE = 'capture.ad2j'
+
+Record = namedtuple('Record', 'time kind data')
+
+
+def journal_files(path):
+    """
+    Returns a journal and its rotated files, oldest first.
+
+    :param path: current journal file
+    :type path: str
+
+    :returns: list of existing paths
+    """
+    files = []
+    index = 1
+    while os.path.isfile('{0}.{1}'.format(path, index)):
+        files.insert(0, '{0}.{1}'.format(path, index))
+        index += 1
+
+    if os.path.isfile(path):
+        files.append(path)
+
+    return files
+
+
+def read_journal(path, kinds=None):
+    """
+    Reads a journal and its rotated files in order.
+
+    :param path: current journal file
+    :type path: str
+    :param kinds: record kinds to return, all if None
+    :type kinds: set
+
+    :returns: generator of :py:class:`Record`
+    """
+    for filename in journal_files(path):
+        with CaptureReader(filename) as reader:
+            for record in reader:
+                if kinds is None or record.kind in kinds:
+                    yield record
+
+
+class CaptureWriter(object):
+    """
+    Appends records to a rotating journal.  Safe to call from any thread;
+    I/O errors are counted and logged, never raised to the caller.
+    """
+    MAX_BYTES = 16 * 1024 * 1024
+    BACKUPS = 4
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path, max_bytes=None, backups=None, flush_interval=None):
+        """
+        Constructor
+
+        :param path: journal file
+        :type path: str
+        :param max_bytes: file size that triggers a rotation
+        :type max_bytes: int
+        :param backups: rotated files kept
+        :type backups: int
+        :param flush_interval: maximum seconds a record stays buffered
+        :type flush_interval: float
+        """
+        self.path = path
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        self.backups = self.BACKUPS if backups is None else backups
+        self.flush_interval = self.FLUSH_INTERVAL if flush_interval is None else flush_interval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._flush_ns = int(self.flush_interval * 1e9)
+        self._flushed = 0
+        self._timer = None
+
+        self.records = 0
+        self.bytes = 0
+        self.rotations = 0
+        self.errors = 0
+
+    def stats(self):
+        """
+        Returns the capture counters.
+
+        :returns: dict
+        """
+        return {
+            'path': self.path,
+            'records': self.records,
+            'bytes': self.bytes,
+            'rotations': self.rotations,
+            'errors': self.errors,
+        }
+
+    def write(self, kind, data):
+        """
+        Appends one record.
+
+        :param kind: :py:data:`READ` or :py:data:`KEYPRESS`
+        :type kind: int
+        :param data: line or keys
+        :type data: bytes or str
+        """
+        if data is None:
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        data = data[:MAX_LENGTH]
+        now = time.monotonic_ns()
+        size = RECORD.size + len(data)
+
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                elif self._size + size > self.max_bytes:
+                    self._rotate()
+
+                self._file.write(RECORD.pack(len(data), kind, now))
+                self._file.write(data)
+                self._size += size
+
+                if now - self._flushed >= self._flush_ns:
+                    self._file.flush()
+                    self._flushed = now
+                elif self._timer is None:
+                    self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            except (OSError, ValueError) as err:
+                self.errors += 1
+                if self.errors == 1:
+                    logger.error('Error writing device capture to {0}: {1}'.format(self.path, err))
+                return
+
+            self.records += 1
+            self.bytes += size
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            try:
+                if self._file is not None:
+                    self._file.flush()
+                    self._flushed = time.monotonic_ns()
+            except (OSError, ValueError) as err:
+                self.errors += 1
+                logger.error('Error flushing device capture to {0}: {1}'.format(self.path, err))
+
+    def _open(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        # Every run starts a new file, so each file has one clock pairing.
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            self._shift()
+
+        self._file = open(self.path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time(), time.monotonic_ns()))
+        self._size = HEADER.size
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        self._open()
+        self.rotations += 1
+
+    def _shift(self):
+        if not self.backups:
+            os.remove(self.path)
+            return
+
+        for index in range(self.backups - 1, 0, -1):
+            source = '{0}.{1}'.format(self.path, index)
+            if os.path.isfile(source):
+                os.replace(source, '{0}.{1}'.format(self.path, index + 1))
+        os.replace(self.path, self.path + '.1')
+
+
+class CaptureReader(object):
+    """
+    Memory-mapped reader for one journal file.
+    """
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: journal file
+        :type path: str
+
+        :raises ValueError: if the file is not a capture journal
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = None
+
+        try:
+            if os.fstat(self._file.fileno()).st_size < HEADER.size:
+                raise ValueError('{0} is not a capture journal.'.format(path))
+
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.wall_start, self.monotonic_start = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('{0} is not a capture journal.'.format(path))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yields the records.  A record cut short by a crash ends the file.
+
+        :returns: generator of :py:class:`Record` with wall clock times
+        """
+        data = self._map
+        end = len(data)
+        offset = HEADER.size
+
+        while offset + RECORD.size <= end:
+            length, kind, monotonic = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            offset = start + length
+            if offset > end:
+                break
+
+            yield Record(self.wall_start + (monotonic - self.monotonic_start) / 1e9, kind, data[start:offset])
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -19,6 +19,17 @@ class BaseConfig(object):
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
 
+    # 'threads' (default) or 'asyncio': run the device reader and the
+    # periodic checks on one event loop, see ad2web.aio.
+    DECODER_RUNTIME = os.getenv('AD2WEB_RUNTIME', 'threads')
+
+    # Journal of raw device traffic for replaying field problems, see
+    # ad2web.capture and "flask replay-capture".
+    CAPTURE_ENABLED = os.getenv('AD2WEB_CAPTURE', '') == '1'
+    CAPTURE_FOLDER = os.path.join(INSTANCE_FOLDER_PATH, 'capture')
+    CAPTURE_MAX_BYTES = 16 * 1024 * 1024
+    CAPTURE_BACKUPS = 4
+
 
 class DefaultConfig(BaseConfig):
     DEBUG = True
@@ -4,6 +4,8 @@ import os
 import sys
 import time
 import datetime
+import random
+import functools
 import threading
 import binascii
 import logging # Use standard logging
@@ -17,7 +19,8 @@ except ImportError:
 
 # --- Flask & SocketIO Imports ---
 from flask import request, current_app # Added flash
-from flask_socketio import Namespace, emit # emit is useful here
+from flask_socketio import Namespace, emit, join_room, leave_room # emit is useful here
+from flask_login import current_user
 # Import the single socketio instance from extensions
 from .extensions import db, socketio # ADDED socketio
 
@@ -25,7 +28,6 @@ from .extensions import db, socketio # ADDED socketio
 # from .socketioflaskdebug.debugger import SocketIODebugger # Keep commented unless verified compatible
 
 # --- Other Necessary Imports ---
-import jsonpickle
 from OpenSSL import SSL
 from alarmdecoder import AlarmDecoder
 from alarmdecoder.devices import SocketDevice, SerialDevice
@@ -35,6 +37,7 @@ from sqlalchemy.orm.exc import NoResultFound # Import for exception handling
 # --- App Specific Imports ---
 from .notifications import NotificationSystem, NotificationThread
 from .settings.models import Setting
+from .zones.models import Zone
 from .certificate.models import Certificate
 from .updater import Updater
 from .updater.models import FirmwareUpdater
@@ -52,6 +55,16 @@ from .setup.constants import SETUP_COMPLETE
 from .utils import user_is_authenticated, INSTANCE_FOLDER_PATH
 from .mailer import Mailer
 from .exporter import Exporter
+from .backup import IncrementalBackup
+from .serializer import serializer
+from .broadcast import BroadcastQueue
+from .aio import AsyncRuntime, ASYNCIO
+from .capture import CaptureWriter, CAPTURE_FILE, READ, KEYPRESS
+from .panelstate import PanelState
+from .devices import DeviceConfig, PRIMARY_DEVICE, device_room
+from .log.writer import EventLogWriter
+from .log.retention import EventLogMaintenance
+from .log import follow as log_follow
 
 logger = logging.getLogger(__name__) # Setup logger for this module
 
@@ -79,6 +92,121 @@ EVENT_MAP = {
 }
 
 
+def parse_address_mask(value):
+    """
+    Parses a hex address mask setting, falling back to all partitions.
+
+    :param value: hex string, e.g. 'FFFFFFFF'
+    :type value: str
+
+    :returns: int
+    """
+    try:
+        return int(value, 16)
+    except (ValueError, TypeError):
+        logger.error(f"Invalid address mask '{value}', using default FFFFFFFF.")
+        return 0xFFFFFFFF
+
+
+def resolve_device_config(config):
+    """
+    Resolves the device class, interface, baudrate and SSL certificate
+    objects for a device.  Must be called within an application context.
+
+    :param config: device settings: device_location, device_path,
+                   device_baudrate, device_address, device_port and use_ssl
+    :type config: dict
+
+    :returns: dict, or None if the device is not fully configured
+    """
+    interface = None
+    devicetype = None
+    use_ssl = False
+    baudrate = 115200 # Default
+    location = config['device_location']
+
+    # Determine device type and interface based on settings
+    if location == 'local':
+        devicetype = SerialDevice
+        interface = config['device_path']
+        baud_val = config['device_baudrate']
+        if baud_val: baudrate = int(baud_val)
+        if not interface:
+             logger.error("Cannot open local device: Path not set.")
+             return None
+
+    elif location == 'network':
+        devicetype = SocketDevice
+        addr = config['device_address']
+        port = config['device_port']
+        if not addr or not port:
+             logger.error("Cannot open network device: Address or Port not set.")
+             return None
+        interface = (addr, int(port))
+        use_ssl = config['use_ssl']
+
+    else: # Includes ser2sock type or others
+         devicetype = SocketDevice # Assume socket for others like ser2sock
+         addr = config['device_address'] or 'localhost'
+         port = config['device_port'] or 10000
+         interface = (addr, int(port))
+         use_ssl = config['use_ssl']
+
+    ssl = None
+    if use_ssl:
+        try:
+            # Use session.get for primary key lookup if possible, else filter
+            ca_cert = db.session.query(Certificate).filter_by(name='AlarmDecoder CA').one()
+            internal_cert = db.session.query(Certificate).filter_by(name='AlarmDecoder Internal').one()
+
+            # Ensure cert objects are loaded (they should be by reconstructor)
+            if not ca_cert.certificate_obj or not internal_cert.certificate_obj or not internal_cert.key_obj:
+                 raise ValueError("Required certificate objects not loaded.")
+
+            ssl = (ca_cert.certificate_obj, internal_cert.certificate_obj, internal_cert.key_obj)
+
+        except NoResultFound:
+            logger.error('Required SSL certificates (AlarmDecoder CA, AlarmDecoder Internal) not found in database.', exc_info=True)
+            raise # Re-raise to prevent opening without SSL when configured
+        except ValueError as verr:
+             logger.error(f'Error loading SSL certificate objects: {verr}', exc_info=True)
+             raise # Re-raise
+
+    return {
+        'device_class': devicetype,
+        'interface': interface,
+        'baudrate': baudrate,
+        'serial': location == 'local',
+        'use_ssl': use_ssl,
+        'ssl': ssl,
+    }
+
+
+def create_device(config, address_mask):
+    """
+    Builds an unopened AlarmDecoder from a resolved device configuration.
+
+    :param config: result of :py:func:`resolve_device_config`
+    :type config: dict
+    :param address_mask: partitions the AlarmDecoder reports messages for
+    :type address_mask: int
+
+    :returns: :py:class:`alarmdecoder.AlarmDecoder`
+    """
+    device_instance = config['device_class'](interface=config['interface'])
+
+    if config['use_ssl']:
+        logger.info("Attempting SSL connection.")
+        device_instance.ssl = True
+        device_instance.ssl_ca, device_instance.ssl_certificate, device_instance.ssl_key = config['ssl']
+        logger.info("SSL parameters configured.")
+
+    device = AlarmDecoder(device_instance)
+    device.internal_address_mask = address_mask
+
+    return device
+
+
 class Decoder(object):
     """
     Primary application state for the AlarmDecoder device and related services.
@@ -95,31 +223,62 @@ class Decoder(object):
         self.logger = app.logger # Use app's logger
         # self.websocket = websocket # REMOVED
         self.device = None # The underlying alarmdecoder.AlarmDecoder instance
+        self.device_id = PRIMARY_DEVICE
+        self.name = None # Only additional devices are named in notifications
         self.updater = Updater()
         self.updates = {}
         self.version = ''
         self.firmware_file = None
         self.firmware_length = -1
 
-        self.trigger_reopen_device = False
-        self.trigger_restart = False
+        self._trigger_reopen_device = False
+        self._trigger_restart = False
+        self._device_config = None
+        self.last_open_error = None
 
         self._last_message_timestamp = None # Renamed for clarity
         self._device_baudrate = 115200
         self._device_type = None
         self._device_location = None
         self._event_thread = DecoderThread(self)
+        self._broadcast_thread = BroadcastQueue()
+        self._event_log_writer = EventLogWriter(app)
         self._discovery_thread = None
         self._notification_thread = None
         self._notifier_system = None
         self._upnp_thread = None
         self._internal_address_mask = 0xFFFFFFFF
         self.last_message_received = None # Raw message string
+        self.panel_state = PanelState()
 
         # Initialize background threads later in init() after config loaded
         self._version_thread = None
         self._camera_thread = None
         self._exporter_thread = None
+        self._event_log_maintenance = None
+        self._runtime = None
+        self._capture = None
+        self._devices = None
+
+    @property
+    def trigger_reopen_device(self):
+        return self._trigger_reopen_device
+
+    @trigger_reopen_device.setter
+    def trigger_reopen_device(self, value):
+        self._trigger_reopen_device = value
+        if value:
+            self._event_thread.wake()
+
+    @property
+    def trigger_restart(self):
+        return self._trigger_restart
+
+    @trigger_restart.setter
+    def trigger_restart(self, value):
+        self._trigger_restart = value
+        if value:
+            self._event_thread.wake()
 
     @property
     def internal_address_mask(self):
@@ -136,15 +295,41 @@ class Decoder(object):
 
     def start(self):
         """Starts the internal threads."""
+        if self._broadcast_thread and not self._broadcast_thread.is_alive(): self._broadcast_thread.start()
+        if self._event_log_writer and not self._event_log_writer.is_alive(): self._event_log_writer.start()
         if self._event_thread and not self._event_thread.is_alive(): self._event_thread.start()
-        if self._version_thread and not self._version_thread.is_alive(): self._version_thread.start()
-        if self._camera_thread and not self._camera_thread.is_alive(): self._camera_thread.start()
+        if self._devices is not None: self._devices.start()
         if self._discovery_thread and not self._discovery_thread.is_alive(): self._discovery_thread.start()
         if self._notification_thread and not self._notification_thread.is_alive(): self._notification_thread.start()
-        if self._exporter_thread and not self._exporter_thread.is_alive(): self._exporter_thread.start()
+
+        if self._runtime is not None:
+            self._start_runtime()
+        else:
+            if self._version_thread and not self._version_thread.is_alive(): self._version_thread.start()
+            if self._camera_thread and not self._camera_thread.is_alive(): self._camera_thread.start()
+            if self._exporter_thread and not self._exporter_thread.is_alive(): self._exporter_thread.start()
+            if self._event_log_maintenance and not self._event_log_maintenance.is_alive(): self._event_log_maintenance.start()
         if has_upnp and self._upnp_thread and not self._upnp_thread.is_alive():
             self._upnp_thread.start()
 
+    def _start_runtime(self):
+        """Starts the asyncio loop and schedules the periodic checks on it."""
+        if self._runtime.running:
+            return
+
+        self._runtime.start()
+
+        if self._version_thread:
+            self._runtime.schedule('version', self._version_thread.check, self._version_thread.poll_interval)
+        if self._camera_thread:
+            self._runtime.schedule('camera', self._camera_thread.check, self._camera_thread.poll_interval)
+        if self._exporter_thread:
+            self._runtime.schedule('export', self._exporter_thread.check, self._exporter_thread.poll_interval)
+        if self._event_log_maintenance:
+            maintenance = self._event_log_maintenance
+            self._runtime.schedule('event_log_retention', maintenance.run_once, lambda: maintenance.interval,
+                                   delay=maintenance.interval)
+
     def stop(self, restart=False):
         """
         Closes the device, stops the internal threads, and shuts down. Optionally
@@ -157,21 +342,33 @@ class Decoder(object):
 
         # Stop threads first
         if self._event_thread: self._event_thread.stop()
+        if self._devices is not None: self._devices.stop()
         if self._version_thread: self._version_thread.stop()
         if self._camera_thread: self._camera_thread.stop()
         if self._discovery_thread: self._discovery_thread.stop()
         if self._notification_thread: self._notification_thread.stop()
         if self._exporter_thread: self._exporter_thread.stop()
+        if self._event_log_maintenance: self._event_log_maintenance.stop()
         if has_upnp and self._upnp_thread: self._upnp_thread.stop()
 
         # Close the device connection
         self.close()
 
+        # The device reader and the scheduled checks end with the loop
+        if self._runtime is not None: self._runtime.stop()
+        if self._capture is not None: self._capture.close()
+
+        # Stop the broadcaster and log writer last so the device_close frame
+        # and any queued event log rows still go out
+        if self._broadcast_thread: self._broadcast_thread.stop()
+        if self._event_log_writer: self._event_log_writer.stop()
+
         # Wait for threads to finish (with timeout)
         threads = [
              self._event_thread, self._version_thread, self._camera_thread,
              self._discovery_thread, self._notification_thread, self._exporter_thread,
-             self._upnp_thread if has_upnp else None
+             self._event_log_maintenance,
+             self._broadcast_thread, self._event_log_writer, self._upnp_thread if has_upnp else None
         ]
         for t in filter(None, threads):
              try:
@@ -246,18 +443,45 @@ class Decoder(object):
             # Expose auth check function to templates
             self.app.jinja_env.globals['user_is_authenticated'] = user_is_authenticated
 
+            # Zone names are needed for every zone notification; load them up front.
+            try:
+                Zone.index.load()
+            except Exception as e:
+                 self.logger.error(f"Error loading zone index: {e}", exc_info=True)
+
             # Initialize systems and threads
             self._notifier_system = NotificationSystem()
             self._camera_thread = CameraChecker(self)
             self._discovery_thread = DiscoveryServer(self)
             self._notification_thread = NotificationThread(self)
             self._exporter_thread = ExportChecker(self)
+            self._event_log_maintenance = EventLogMaintenance(self.app)
             self._version_thread = VersionChecker(self)
             if has_upnp:
                 self._upnp_thread = UPNPThread(self)
             else:
                  self._upnp_thread = None
 
+            if self.app.config.get('CAPTURE_ENABLED') and self._capture is None:
+                self._capture = CaptureWriter(os.path.join(self.app.config['CAPTURE_FOLDER'], CAPTURE_FILE),
+                                              self.app.config.get('CAPTURE_MAX_BYTES'),
+                                              self.app.config.get('CAPTURE_BACKUPS'))
+
+            # The asyncio runtime takes over the device reader and the periodic checks.
+            if self.app.config.get('DECODER_RUNTIME') == ASYNCIO and self._runtime is None:
+                self._runtime = AsyncRuntime()
+
+            # Settings may have changed (e.g. after an import); resolve them again.
+            self._device_config = None
+
+            # Additional devices each get their own connection and supervisor.
+            if self._devices is None:
+                self._devices = DeviceRegistry(self)
+            try:
+                self._devices.load()
+            except Exception as e:
+                 self.logger.error(f"Error loading additional devices: {e}", exc_info=True)
+
             # Check if device is configured and trigger open
             device_type = Setting.get_by_name('device_type').value
             if device_type:
@@ -266,112 +490,102 @@ class Decoder(object):
                  self.logger.info("No AlarmDecoder device configured yet.")
 
 
-    def open(self, no_reader_thread=False):
+    def open(self, no_reader_thread=False, reuse_config=False):
         """
         Opens the AlarmDecoder device based on settings.
+
+        :param no_reader_thread: open without the alarmdecoder reader thread
+        :type no_reader_thread: bool
+        :param reuse_config: use the device configuration and certificates
+                             resolved by the previous attempt instead of
+                             reading them from the database again
+        :type reuse_config: bool
         """
         # Ensure previous device is closed
         self.close()
+        self.last_open_error = None
+
+        try:
+            config = self._load_device_config(reload=not reuse_config)
+        except Exception as err:
+            self.last_open_error = str(err)
+            self.logger.error(f"Error loading device configuration: {err}", exc_info=True)
+            return
+
+        if config is None:
+            return
+
+        interface = config['interface']
+
+        # Create and open the device.
+        self.logger.info(f"Attempting to open {self._device_location} device: {interface}")
+        try:
+            # Create the top-level AlarmDecoder object
+            self.device = create_device(config, self._internal_address_mask)
+
+            # Bind events before opening
+            self.bind_events()
+
+            # Finally, open the connection
+            self.device.open(baudrate=self._device_baudrate, no_reader_thread=no_reader_thread)
+            # on_open event will set trigger_reopen_device to False
+
+        except NoDeviceError as nde:
+            self.last_open_error = str(nde)
+            self.logger.error(f'Device open failed: {nde}', exc_info=True)
+            self.device = None # Ensure device is None on failure
+            # Don't re-raise, allow thread to retry later
+        except SSL.Error as ssl_err:
+            self.last_open_error = str(ssl_err)
+            self.logger.error(f'SSL connection failed: {ssl_err}', exc_info=True)
+            self.device = None
+            # Don't re-raise
+        except Exception as err: # Catch other potential errors (permissions, config issues)
+             self.last_open_error = str(err)
+             self.logger.error(f"Unexpected error opening device {interface}: {err}", exc_info=True)
+             self.device = None
+             # Don't re-raise
+
+    def _load_device_config(self, reload=True):
+        """
+        Resolves the device class, interface and SSL certificate objects from
+        settings.  The result is cached for reconnect attempts.
+
+        :param reload: read the settings again even if a cached copy exists
+        :type reload: bool
+
+        :returns: dict, or None if the device is not configured
+        """
+        if not reload and self._device_config is not None:
+            return self._device_config
+
+        self._device_config = None
 
         with self.app.app_context():
-            self._device_type = Setting.get_by_name('device_type').value
-            self._device_location = Setting.get_by_name('device_location').value
-            address_mask_str = Setting.get_by_name('address_mask', 'FFFFFFFF').value
-            try:
-                 self._internal_address_mask = int(address_mask_str, 16)
-            except (ValueError, TypeError):
-                 self.logger.error(f"Invalid address mask '{address_mask_str}', using default FFFFFFFF.")
-                 self._internal_address_mask = 0xFFFFFFFF
+            config = Setting.get_many(['device_type', 'device_location', 'address_mask', 'device_path',
+                                       'device_baudrate', 'device_address', 'device_port', 'use_ssl'],
+                                      defaults={'address_mask': 'FFFFFFFF', 'use_ssl': False})
+
+            self._device_type = config['device_type']
+            self._device_location = config['device_location']
+            self._internal_address_mask = parse_address_mask(config['address_mask'])
 
             if not self._device_type or not self._device_location:
                  self.logger.warning("Cannot open device: Type or Location not configured.")
-                 return
+                 return None
 
-            interface = None
-            devicetype = None
-            use_ssl = False
-            self._device_baudrate = 115200 # Default
-
-            # Determine device type and interface based on settings
-            if self._device_location == 'local':
-                devicetype = SerialDevice
-                interface = Setting.get_by_name('device_path').value
-                baud_val = Setting.get_by_name('device_baudrate').value
-                if baud_val: self._device_baudrate = int(baud_val)
-                if not interface:
-                     self.logger.error("Cannot open local device: Path not set.")
-                     return
-
-            elif self._device_location == 'network':
-                devicetype = SocketDevice
-                addr = Setting.get_by_name('device_address').value
-                port = Setting.get_by_name('device_port').value
-                if not addr or not port:
-                     self.logger.error("Cannot open network device: Address or Port not set.")
-                     return
-                interface = (addr, int(port))
-                use_ssl = Setting.get_by_name('use_ssl', False).value
-
-            else: # Includes ser2sock type or others
-                 devicetype = SocketDevice # Assume socket for others like ser2sock
-                 addr = Setting.get_by_name('device_address').value or 'localhost'
-                 port = Setting.get_by_name('device_port').value or 10000
-                 interface = (addr, int(port))
-                 use_ssl = Setting.get_by_name('use_ssl', False).value
-
-
-            # Create and open the device.
-            self.logger.info(f"Attempting to open {self._device_location} device: {interface}")
-            try:
-                device_instance = devicetype(interface=interface)
-
-                if use_ssl:
-                    self.logger.info("Attempting SSL connection.")
-                    try:
-                        # Use session.get for primary key lookup if possible, else filter
-                        ca_cert = db.session.query(Certificate).filter_by(name='AlarmDecoder CA').one()
-                        internal_cert = db.session.query(Certificate).filter_by(name='AlarmDecoder Internal').one()
-
-                        # Ensure cert objects are loaded (they should be by reconstructor)
-                        if not ca_cert.certificate_obj or not internal_cert.certificate_obj or not internal_cert.key_obj:
-                             raise ValueError("Required certificate objects not loaded.")
-
-                        device_instance.ssl = True
-                        device_instance.ssl_ca = ca_cert.certificate_obj
-                        device_instance.ssl_certificate = internal_cert.certificate_obj
-                        device_instance.ssl_key = internal_cert.key_obj
-                        self.logger.info("SSL parameters configured.")
-
-                    except NoResultFound:
-                        self.logger.error('Required SSL certificates (AlarmDecoder CA, AlarmDecoder Internal) not found in database.', exc_info=True)
-                        raise # Re-raise to prevent opening without SSL when configured
-                    except ValueError as verr:
-                         self.logger.error(f'Error loading SSL certificate objects: {verr}', exc_info=True)
-                         raise # Re-raise
-
-                # Create the top-level AlarmDecoder object
-                self.device = AlarmDecoder(device_instance)
-                self.device.internal_address_mask = self._internal_address_mask
+            device_config = resolve_device_config(config)
 
-                # Bind events before opening
-                self.bind_events()
+        if device_config is None:
+            return None
 
-                # Finally, open the connection
-                self.device.open(baudrate=self._device_baudrate, no_reader_thread=no_reader_thread)
-                # on_open event will set trigger_reopen_device to False
+        self._device_baudrate = device_config['baudrate']
+        if self._runtime is not None:
+            device_config['device_class'] = functools.partial(self._runtime.device, serial=device_config['serial'])
 
-            except NoDeviceError as nde:
-                self.logger.error(f'Device open failed: {nde}', exc_info=True)
-                self.device = None # Ensure device is None on failure
-                # Don't re-raise, allow thread to retry later
-            except SSL.Error as ssl_err:
-                self.logger.error(f'SSL connection failed: {ssl_err}', exc_info=True)
-                self.device = None
-                # Don't re-raise
-            except Exception as err: # Catch other potential errors (permissions, config issues)
-                 self.logger.error(f"Unexpected error opening device {interface}: {err}", exc_info=True)
-                 self.device = None
-                 # Don't re-raise
+        self._device_config = device_config
+
+        return self._device_config
 
     def close(self):
         """Closes the AlarmDecoder device if open."""
@@ -385,69 +599,88 @@ class Decoder(object):
             finally:
                  self.device = None # Ensure device is cleared
 
-    def bind_events(self):
-        """Binds the internal event handlers to the AlarmDecoder instance."""
-        if not self.device: return
+    def bind_events(self, source=None):
+        """
+        Binds the internal event handlers to the AlarmDecoder instance of a
+        device, the primary one by default.
+
+        :param source: the decoder or a :py:class:`DeviceConnection`
+        """
+        source = source or self
+        device = source.device
+        if not device: return
 
         self.logger.debug("Binding AlarmDecoder events.")
         # Use lambdas to ensure 'self' context is passed correctly
-        build_event_handler = lambda event_type: lambda sender, **kwargs: self._handle_event(event_type, sender, **kwargs)
-        build_message_handler = lambda msg_type: lambda sender, **kwargs: self._on_message(msg_type, sender, **kwargs)
+        build_event_handler = lambda event_type: lambda sender, **kwargs: self._handle_event(event_type, sender, source=source, **kwargs)
+        build_message_handler = lambda msg_type: lambda sender, **kwargs: self._on_message(msg_type, sender, source=source, **kwargs)
 
         # Basic message handlers
-        self.device.on_message += build_message_handler('panel')
-        self.device.on_lrr_message += build_message_handler('lrr')
-        self.device.on_ready_changed += build_message_handler('ready')
-        self.device.on_chime_changed += build_message_handler('chime')
-        self.device.on_rfx_message += build_message_handler('rfx')
-        self.device.on_expander_message += build_message_handler('exp')
+        device.on_message += build_message_handler('panel')
+        device.on_lrr_message += build_message_handler('lrr')
+        device.on_ready_changed += build_message_handler('ready')
+        device.on_chime_changed += build_message_handler('chime')
+        device.on_rfx_message += build_message_handler('rfx')
+        device.on_expander_message += build_message_handler('exp')
         try: # AUI might not be in older alarmdecoder versions
-            self.device.on_aui_message += build_message_handler('aui')
+            device.on_aui_message += build_message_handler('aui')
         except AttributeError:
             self.logger.warning('Could not bind event "on_aui_message": alarmdecoder library might be out of date.')
 
         # Open/Close handlers
-        self.device.on_open += self._on_device_open
-        self.device.on_close += self._on_device_close
+        device.on_open += functools.partial(self._on_device_open, source=source)
+        device.on_close += functools.partial(self._on_device_close, source=source)
+
+        # Raw lines, before parsing; only the primary device is captured
+        if self._capture is not None and source is self:
+            device.on_read += self._on_device_read
 
         # Mapped event handlers
         for event, device_event_name in EVENT_MAP.items(): # Use items()
             try:
-                device_handler = getattr(self.device, device_event_name)
+                device_handler = getattr(device, device_event_name)
                 device_handler += build_event_handler(event)
             except AttributeError:
                 self.logger.warning(f'Could not bind event "{device_event_name}": alarmdecoder library might be out of date.')
 
-    def remove_events(self):
-        """Clears internal event handlers from the AlarmDecoder instance."""
-        if not self.device: return
+    def remove_events(self, source=None):
+        """
+        Clears internal event handlers from the AlarmDecoder instance of a
+        device, the primary one by default.
+
+        :param source: the decoder or a :py:class:`DeviceConnection`
+        """
+        device = (source or self).device
+        if not device: return
 
         self.logger.debug("Removing AlarmDecoder event bindings.")
         try:
             # Use try-except for each clear in case device state is unusual
-            try: self.device.on_message.clear()
+            try: device.on_message.clear()
             except AttributeError: pass
-            try: self.device.on_lrr_message.clear()
+            try: device.on_lrr_message.clear()
             except AttributeError: pass
-            try: self.device.on_ready_changed.clear()
+            try: device.on_ready_changed.clear()
             except AttributeError: pass
-            try: self.device.on_chime_changed.clear()
+            try: device.on_chime_changed.clear()
             except AttributeError: pass
-            try: self.device.on_rfx_message.clear()
+            try: device.on_rfx_message.clear()
             except AttributeError: pass
-            try: self.device.on_expander_message.clear()
+            try: device.on_expander_message.clear()
             except AttributeError: pass
-            try: self.device.on_aui_message.clear()
+            try: device.on_aui_message.clear()
             except AttributeError: pass # Ignore if AUI doesn't exist
-            try: self.device.on_open.clear()
+            try: device.on_open.clear()
+            except AttributeError: pass
+            try: device.on_close.clear()
             except AttributeError: pass
-            try: self.device.on_close.clear()
+            try: device.on_read.clear()
             except AttributeError: pass
 
             # Clear mapped events
             for event, device_event_name in EVENT_MAP.items(): # Use items()
                 try:
-                    device_handler = getattr(self.device, device_event_name)
+                    device_handler = getattr(device, device_event_name)
                     device_handler.clear()
                 except AttributeError:
                      # Warning was already given in bind_events, no need to repeat
@@ -468,56 +701,89 @@ class Decoder(object):
              return self._notifier_system.test_notifier(notifier_id)
         return False # Or raise error
 
-    def _on_device_open(self, sender):
+    def _on_device_open(self, sender, source=None):
         """Internal handler for device open events."""
-        self.logger.info('AlarmDecoder device connection opened.')
-        self.trigger_reopen_device = False
+        source = source or self
+        self.logger.info(f'AlarmDecoder device {source.device_id} connection opened.')
+        source.trigger_reopen_device = False
+        source.panel_state.reset()
         # Use the new broadcast method
-        self.emit_event('device_open')
+        self.emit_event('device_open', device_id=source.device_id)
 
-    def _on_device_close(self, sender):
+    def _on_device_close(self, sender, source=None):
         """Internal handler for device close events."""
-        self.logger.info('AlarmDecoder device connection closed.')
-        self.trigger_reopen_device = True
+        source = source or self
+        self.logger.info(f'AlarmDecoder device {source.device_id} connection closed.')
+        source.trigger_reopen_device = True
         # Use the new broadcast method
-        self.emit_event('device_close')
+        self.emit_event('device_close', device_id=source.device_id)
 
-    def _on_message(self, ftype, sender, **kwargs):
+    def _on_device_read(self, sender, **kwargs):
+        """Internal handler appending raw device lines to the capture journal."""
+        self._capture.write(READ, kwargs.get('data', None))
+
+    def capture_keypress(self, keys):
+        """Appends keys sent to the device to the capture journal, if enabled."""
+        if self._capture is not None:
+            self._capture.write(KEYPRESS, keys)
+
+    def _on_message(self, ftype, sender, source=None, **kwargs):
         """Internal handler for raw messages from the device."""
         message = kwargs.get('message', None)
         if message is None: return # Ignore if no message content
 
-        self.last_message_received = str(message) # Store raw message
-        self._last_message_timestamp = time.time() # Update timestamp
+        source = source or self
+        source.last_message_received = str(message) # Store raw message
+        source._last_message_timestamp = time.time() # Update timestamp
 
-        # Use the new broadcast method
-        # Send raw message details
-        self.emit_event('message', {'message': str(message), 'message_type': ftype})
+        # Send the parsed message; the serializer flattens it using its schema.
+        self.emit_event('message', {'message': message, 'message_type': ftype}, device_id=source.device_id)
+        self._publish_panel_state(source)
 
 
-    def _handle_event(self, ftype, sender, **kwargs):
+    def _handle_event(self, ftype, sender, source=None, **kwargs):
         """Internal handler for specific AlarmDecoder events (arm, disarm, etc.)."""
-        self._last_message_timestamp = time.time()
+        source = source or self
+        source._last_message_timestamp = time.time()
         event_data = kwargs # The event arguments are passed as kwargs
 
+        # Refresh the panel state first so notifiers see the current state.
+        self._publish_panel_state(source)
+
         # Send notification via NotificationSystem (within app context)
         with self.app.app_context():
             try:
                 if self._notifier_system:
-                    errors = self._notifier_system.send(ftype, **event_data)
+                    errors = self._notifier_system.send(ftype, device_id=source.device_id,
+                                                        device_name=source.name, **event_data)
                     for e in errors:
                         self.logger.error(f"Notifier error: {e}")
             except Exception as e:
                  self.logger.error(f"Error during notification processing: {e}", exc_info=True)
 
         # Use the new broadcast method to send structured event data
-        self.emit_event('event', event_data)
+        self.emit_event('event', dict(event_data, event_type=ftype), device_id=source.device_id)
+
+    def _publish_panel_state(self, source=None):
+        """Broadcasts the fields of a device's panel state that changed, if any."""
+        source = source or self
+        try:
+            delta = source.panel_state.update_from_device(source.device, source.last_message_received)
+            if delta:
+                self.emit_event('panel_state', delta, device_id=source.device_id)
+        except Exception as e:
+            self.logger.error(f"Error updating panel state: {e}", exc_info=True)
 
 
     # --- NEW: Flask-SocketIO broadcast method ---
-    def emit_event(self, event_name, data=None, namespace='/alarmdecoder'):
+    def emit_event(self, event_name, data=None, namespace='/alarmdecoder', device_id=None):
          """
-         Emits an event to all connected Socket.IO clients in a namespace.
+         Emits an event to all connected Socket.IO clients in a namespace,
+         or for device events to the clients in that device's room.
+
+         Frames are handed to the broadcast queue so the reader thread never
+         waits on websocket clients; they are emitted inline only if the queue
+         is not running yet.
 
          :param event_name: Name of the Socket.IO event.
          :type event_name: str
@@ -525,24 +791,80 @@ class Decoder(object):
          :type data: dict, optional
          :param namespace: The Socket.IO namespace to emit to.
          :type namespace: str, optional
+         :param device_id: device the event came from; tags the payload
+         :type device_id: int, optional
          """
          if data is None:
               data = {}
 
+         room = None
+         if device_id is not None:
+              data = dict(data, device_id=device_id)
+              room = device_room(device_id)
+
          try:
-              # Use jsonpickle to handle complex types like datetime, then let emit handle final encoding
-              # NOTE: Consider if jsonpickle is truly needed or if simpler dicts suffice.
-              # If using complex objects directly, ensure they are JSON serializable.
-              pickled_data = jsonpickle.encode(data, unpicklable=False)
-
-              # Emit using the imported socketio instance
-              # The 'broadcast=True' flag sends to all clients in the namespace
-              socketio.emit(event_name, pickled_data, namespace=namespace, broadcast=True)
+              if self._broadcast_thread and self._broadcast_thread.is_alive():
+                   # Serialized by the sender thread; superseded keypad frames never are.
+                   self._broadcast_thread.put(event_name, data, namespace, room=room)
+              else:
+                   # Flatten messages/datetimes into plain JSON types. The resulting dict
+                   # is encoded exactly once, by Flask-SocketIO.
+                   payload = serializer.serialize(data)
+                   socketio.emit(event_name, payload, namespace=namespace, to=room)
               logger.debug(f"Emitted event '{event_name}' to namespace '{namespace}'") # Data not logged by default
 
          except Exception as e:
               self.logger.error(f"Error emitting socket event '{event_name}': {e}", exc_info=True)
 
+    def broadcast_stats(self):
+         """Returns the broadcast queue depth, drop and coalesce counters."""
+         return self._broadcast_thread.stats() if self._broadcast_thread else {}
+
+    def reconnect_stats(self):
+         """Returns the reconnect supervisor's attempt and time-to-reconnect counters."""
+         return self._event_thread.stats() if self._event_thread else {}
+
+    def runtime_stats(self):
+         """Returns the runtime mode, and with asyncio its scheduled check timings."""
+         if self._runtime is None:
+              return {'mode': 'threads'}
+
+         stats = self._runtime.stats()
+         stats['mode'] = ASYNCIO
+         return stats
+
+    def capture_stats(self):
+         """Returns the device capture counters."""
+         return self._capture.stats() if self._capture else {'enabled': False}
+
+    def source(self, device_id=PRIMARY_DEVICE):
+         """
+         Returns the decoder for the primary device or the connection of an
+         additional one, None if there is no such device.
+
+         :param device_id: device id, see :py:mod:`ad2web.devices`
+         :type device_id: int
+         """
+         if device_id is None or device_id == PRIMARY_DEVICE:
+              return self
+
+         return self._devices.get(device_id) if self._devices is not None else None
+
+    def device_stats(self):
+         """Returns the connection state of every device, the primary one first."""
+         devices = [dict(self._event_thread.stats(), id=self.device_id, name=self.name)]
+         if self._devices is not None:
+              devices.extend(self._devices.stats())
+
+         return devices
+
+    def event_log_stats(self):
+         """Returns the event log writer and retention counters."""
+         return {
+              'writer': self._event_log_writer.stats() if self._event_log_writer else {},
+              'retention': self._event_log_maintenance.stats() if self._event_log_maintenance else {},
+         }
+
 
     # --- REMOVED OLD BROADCAST METHODS ---
     # def broadcast(self, channel, data={}): ... REMOVED ...
@@ -556,15 +878,74 @@ class Decoder(object):
 # They should call self._decoder.emit_event instead.
 
 class DecoderThread(threading.Thread):
-    TIMEOUT = 5
+    """
+    Reconnect supervisor.  Sleeps until the device closes or a restart is
+    requested (:py:meth:`wake`, called when ``trigger_reopen_device`` or
+    ``trigger_restart`` is set) instead of polling.
+
+    The first attempt after a close is immediate and reads the device
+    settings again; failed attempts are retried with capped exponential
+    backoff and jitter, reusing the resolved configuration and
+    certificates.  A connection that closes again within ``STABLE_AFTER``
+    seconds counts as a failure, so a flapping device backs off too.
+    """
+    BACKOFF_INITIAL = 1.0
+    BACKOFF_MAX = 60.0
+    BACKOFF_FACTOR = 2.0
+    STABLE_AFTER = 30.0
+
     def __init__(self, decoder):
         threading.Thread.__init__(self)
         self.daemon = True # Ensure thread exits with main app
         self._decoder = decoder
         self._running = False
+        self._cond = threading.Condition()
+        self._woken = False
+        self._connected_at = None
+        self._failures = 0
+
+        self.next_attempt = None
+        self.down_since = None
+        self.attempts = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.reconnect_time_last = None
+        self.reconnect_time_sum = 0.0
+        self.reconnect_time_max = 0.0
+
+    def wake(self):
+        with self._cond:
+            self._woken = True
+            self._cond.notify()
 
     def stop(self):
         self._running = False
+        self.wake()
+
+    def backoff(self, failures):
+        """
+        Returns the delay before the next attempt after ``failures``
+        consecutive failures: between half and all of a capped exponential.
+        """
+        ceiling = min(self.BACKOFF_MAX, self.BACKOFF_INITIAL * self.BACKOFF_FACTOR ** (failures - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {
+                'connected': self._decoder.device is not None and not self._decoder.trigger_reopen_device,
+                'down_seconds': now - self.down_since if self.down_since is not None else None,
+                'next_attempt_in': max(0.0, self.next_attempt - now) if self.next_attempt is not None else None,
+                'consecutive_failures': self._failures,
+                'attempts': self.attempts,
+                'failures': self.failures,
+                'reconnects': self.reconnects,
+                'last_error': self._decoder.last_open_error,
+                'reconnect_ms_last': self.reconnect_time_last * 1000 if self.reconnect_time_last is not None else None,
+                'reconnect_ms_avg': self.reconnect_time_sum * 1000 / self.reconnects if self.reconnects else None,
+                'reconnect_ms_max': self.reconnect_time_max * 1000,
+            }
 
     def run(self):
         self._running = True
@@ -572,46 +953,265 @@ class DecoderThread(threading.Thread):
         self.logger.info("DecoderThread started.")
 
         while self._running:
-            reopened = False
-            try:
-                with self._decoder.app.app_context(): # Ensure context for DB access
-                    # Handle reopen events
-                    if self._decoder.trigger_reopen_device:
-                        self.logger.info('Attempting to reconnect to the AlarmDecoder')
-                        try:
-                            # Pass no_reader_thread=False unless specifically needed
-                            self._decoder.open(no_reader_thread=False)
-                            # If open succeeds, the on_open handler sets trigger_reopen_device to False
-                            if self._decoder.device: # Check if open actually succeeded
-                                 reopened = True
-                                 self.logger.info('Successfully reconnected to AlarmDecoder.')
-                            else:
-                                 self.logger.warning('Reconnect attempt failed, will retry.')
-
-                        except NoDeviceError as err:
-                            self.logger.error(f'Device not found during reconnect: {err}')
-                        except Exception as err: # Catch broader errors during open
-                             self.logger.error(f'Error during reconnect attempt: {err}', exc_info=True)
-
-
-                    # Handle service restart events
-                    if self._decoder.trigger_restart:
-                        self.logger.info('Restart triggered.')
-                        self._running = False # Signal thread to stop
-                        self._decoder.stop(restart=True) # Call decoder stop with restart
-                        return # Exit thread run loop immediately
+            with self._cond:
+                while self._running and not self._woken:
+                    timeout = None
+                    if self.next_attempt is not None:
+                        timeout = self.next_attempt - time.time()
+                        if timeout <= 0:
+                            break
+
+                    self._cond.wait(timeout)
 
+                self._woken = False
+
+            if not self._running:
+                break
+
+            try:
+                # Handle service restart events
+                if self._decoder.trigger_restart:
+                    self.logger.info('Restart triggered.')
+                    self._running = False # Signal thread to stop
+                    self._decoder.stop(restart=True) # Call decoder stop with restart
+                    return # Exit thread run loop immediately
+
+                if self._decoder.trigger_reopen_device:
+                    self._reconnect()
+                else:
+                    self.next_attempt = None
 
             except Exception as err:
                 # Catch errors in the main loop logic itself
                 self.logger.error(f'Error in DecoderThread run loop: {err}', exc_info=True)
 
-            # Wait before next check, sleep longer if just tried to reopen
-            sleep_time = self.TIMEOUT * 2 if self._decoder.trigger_reopen_device and not reopened else self.TIMEOUT
-            time.sleep(sleep_time)
-
         self.logger.info("DecoderThread stopped.")
 
+    def _reconnect(self):
+        now = time.time()
+
+        if self.next_attempt is None:
+            # A new outage.
+            if self._connected_at is not None:
+                if now - self._connected_at >= self.STABLE_AFTER:
+                    self._failures = 0
+                else:
+                    self._failures += 1
+                self._connected_at = None
+
+            if self.down_since is None:
+                self.down_since = now
+
+            if self._failures:
+                self.next_attempt = now + self.backoff(self._failures)
+                return
+
+        elif now < self.next_attempt:
+            # Woken again during the backoff; keep waiting.
+            return
+
+        self.logger.info('Attempting to reconnect to the AlarmDecoder')
+        self.attempts += 1
+
+        # Only the first attempt of an outage reads the settings again.
+        with self._decoder.app.app_context():
+            self._decoder.open(no_reader_thread=False, reuse_config=self.next_attempt is not None)
+
+        now = time.time()
+        if self._decoder.device is not None:
+            elapsed = now - self.down_since
+            with self._cond:
+                self.reconnects += 1
+                self.reconnect_time_last = elapsed
+                self.reconnect_time_sum += elapsed
+                self.reconnect_time_max = max(self.reconnect_time_max, elapsed)
+                self.down_since = None
+                self.next_attempt = None
+            self._connected_at = now
+            self.logger.info(f'Successfully reconnected to AlarmDecoder after {elapsed:.1f}s.')
+        else:
+            self.failures += 1
+            self._failures += 1
+            self.next_attempt = now + self.backoff(self._failures)
+            self.logger.warning(f'Reconnect attempt failed, retrying in {self.next_attempt - now:.1f}s.')
+
+
+
+class DeviceConnection(object):
+    """
+    An additional AlarmDecoder device: its connection, panel state and
+    reconnect supervisor.  Events are handled by the decoder, tagged with
+    the device id.
+    """
+    def __init__(self, decoder, config):
+        """
+        Constructor
+
+        :param decoder: the application decoder
+        :type decoder: :py:class:`Decoder`
+        :param config: the device's configuration row
+        :type config: :py:class:`~ad2web.devices.models.DeviceConfig`
+        """
+        self.app = decoder.app
+        self.device_id = config.id
+        self.name = config.name
+        self.device = None
+        self.panel_state = PanelState()
+        self.last_message_received = None
+        self.last_open_error = None
+        self.trigger_restart = False # Restarts are for the whole application
+
+        self._decoder = decoder
+        self._settings = config.settings()
+        self._device_config = None
+        self._last_message_timestamp = None
+        self._trigger_reopen_device = False
+        self._internal_address_mask = parse_address_mask(self._settings['address_mask'])
+        self._event_thread = DecoderThread(self)
+
+    @property
+    def trigger_reopen_device(self):
+        return self._trigger_reopen_device
+
+    @trigger_reopen_device.setter
+    def trigger_reopen_device(self, value):
+        self._trigger_reopen_device = value
+        if value:
+            self._event_thread.wake()
+
+    def start(self):
+        """Starts the reconnect supervisor and requests the first open."""
+        if not self._event_thread.is_alive():
+            self._event_thread.start()
+        self.trigger_reopen_device = True
+
+    def stop(self):
+        """Stops the supervisor and closes the device."""
+        self._event_thread.stop()
+        self.close()
+
+    def join(self, timeout=None):
+        try:
+            self._event_thread.join(timeout)
+        except RuntimeError:
+            pass # Never started
+
+    def open(self, no_reader_thread=False, reuse_config=False):
+        """
+        Opens the device; called by the reconnect supervisor.
+
+        :param no_reader_thread: open without the alarmdecoder reader thread
+        :type no_reader_thread: bool
+        :param reuse_config: reuse the configuration and certificates
+                             resolved by the previous attempt
+        :type reuse_config: bool
+        """
+        self.close()
+        self.last_open_error = None
+
+        try:
+            if not reuse_config or self._device_config is None:
+                self._device_config = self._resolve()
+            config = self._device_config
+            if config is None:
+                return
+
+            logger.info(f"Attempting to open device {self.device_id} ({self.name}): {config['interface']}")
+            self.device = create_device(config, self._internal_address_mask)
+            self._decoder.bind_events(self)
+            self.device.open(baudrate=config['baudrate'], no_reader_thread=no_reader_thread)
+
+        except (NoDeviceError, SSL.Error) as err:
+            self.last_open_error = str(err)
+            logger.error(f'Device {self.device_id} open failed: {err}')
+            self.device = None
+        except Exception as err:
+            self.last_open_error = str(err)
+            logger.error(f'Unexpected error opening device {self.device_id}: {err}', exc_info=True)
+            self.device = None
+
+    def _resolve(self):
+        with self.app.app_context():
+            config = resolve_device_config(self._settings)
+
+        runtime = self._decoder._runtime
+        if config is not None and runtime is not None:
+            config['device_class'] = functools.partial(runtime.device, serial=config['serial'])
+
+        return config
+
+    def close(self):
+        """Closes the device if open."""
+        if self.device:
+            try:
+                self._decoder.remove_events(self)
+                self.device.close()
+            except Exception as e:
+                logger.error(f"Error closing device {self.device_id}: {e}", exc_info=True)
+            finally:
+                self.device = None
+
+    def stats(self):
+        return dict(self._event_thread.stats(), id=self.device_id, name=self.name)
+
+
+class DeviceRegistry(object):
+    """
+    The enabled devices from the devices table, keyed by id.
+    """
+    def __init__(self, decoder):
+        """
+        Constructor
+
+        :param decoder: the application decoder
+        :type decoder: :py:class:`Decoder`
+        """
+        self._decoder = decoder
+        self._connections = {}
+        self._running = False
+
+    def load(self):
+        """
+        Reads the devices table, replacing the connections.  Called by
+        :py:meth:`Decoder.init`, which runs again when the device settings
+        are saved; the new connections are started if the registry is.
+        """
+        with self._decoder.app.app_context():
+            configs = db.session.query(DeviceConfig).filter_by(enabled=True).order_by(DeviceConfig.id).all()
+            connections = dict((config.id, DeviceConnection(self._decoder, config)) for config in configs)
+
+        previous, self._connections = self._connections, connections
+        for connection in previous.values():
+            connection.stop()
+
+        if self._running:
+            for connection in connections.values():
+                connection.start()
+
+    def start(self):
+        self._running = True
+        for connection in self._connections.values():
+            connection.start()
+
+    def stop(self):
+        self._running = False
+        for connection in self._connections.values():
+            connection.stop()
+        for connection in self._connections.values():
+            connection.join(2)
+
+    def get(self, device_id):
+        return self._connections.get(device_id)
+
+    def __iter__(self):
+        return iter(list(self._connections.values()))
+
+    def __len__(self):
+        return len(self._connections)
+
+    def stats(self):
+        return [connection.stats() for connection in self]
+
 
 class VersionChecker(threading.Thread):
     TIMEOUT = 60 # Default internal loop sleep
@@ -648,45 +1248,50 @@ class VersionChecker(threading.Thread):
         self.logger.info(f'Updating version check enable/disable to: {status}')
         self.disable_version_checker = disable
 
+    def poll_interval(self):
+        # Use a shorter internal sleep and check time logic in check()
+        # This makes stop() more responsive
+        return min(self.TIMEOUT, max(1, self.version_checker_timeout / 10.0))
+
+    def check(self):
+        """Checks for updates if the check interval has passed."""
+        if not self.disable_version_checker:
+            try:
+                check_time = time.time()
+                # Check if it's time to look for updates
+                if check_time > self.last_check_time + self.version_checker_timeout:
+                     self.logger.info(f'Checking for version updates - last check at: {datetime.datetime.fromtimestamp(self.last_check_time).strftime("%Y-%m-%d %H:%M:%S") if self.last_check_time > 0 else "Never"}')
+                     with self._decoder.app.app_context(): # Need context for DB and potentially updater
+                         try:
+                             self._decoder.updates = self._updater.check_updates()
+                             # Use items() for Python 3, handle potential None in value tuple
+                             update_available = any(comp_info and comp_info[0] for comp_info in self._decoder.updates.values())
+
+                             # Update Jinja globals (might need lock if accessed concurrently?)
+                             current_app.jinja_env.globals['update_available'] = update_available
+                             current_app.jinja_env.globals['firmware_update_available'] = self._updater.check_firmware()
+
+                             # Save last check time to DB
+                             self.last_check_time = check_time
+                             last_check_setting = db.session.merge(Setting(name='version_checker_last_check_time', value=str(self.last_check_time)))
+                             # db.session.add(last_check_setting) # Merge handles add
+                             db.session.commit()
+                             self.logger.info(f"Update check complete. Update available: {update_available}")
+
+                         except Exception as err_inner:
+                             self.logger.error(f'Error during update check: {err_inner}', exc_info=True)
+                             db.session.rollback() # Rollback DB changes on error
+
+            except Exception as err_outer:
+                 self.logger.error(f'Error in VersionChecker run loop: {err_outer}', exc_info=True)
+
     def run(self):
         self._running = True
         self.logger.info("VersionChecker thread started.")
         while self._running:
-            if not self.disable_version_checker:
-                try:
-                    check_time = time.time()
-                    # Check if it's time to look for updates
-                    if check_time > self.last_check_time + self.version_checker_timeout:
-                         self.logger.info(f'Checking for version updates - last check at: {datetime.datetime.fromtimestamp(self.last_check_time).strftime("%Y-%m-%d %H:%M:%S") if self.last_check_time > 0 else "Never"}')
-                         with self._decoder.app.app_context(): # Need context for DB and potentially updater
-                             try:
-                                 self._decoder.updates = self._updater.check_updates()
-                                 # Use items() for Python 3, handle potential None in value tuple
-                                 update_available = any(comp_info and comp_info[0] for comp_info in self._decoder.updates.values())
-
-                                 # Update Jinja globals (might need lock if accessed concurrently?)
-                                 current_app.jinja_env.globals['update_available'] = update_available
-                                 current_app.jinja_env.globals['firmware_update_available'] = self._updater.check_firmware()
-
-                                 # Save last check time to DB
-                                 self.last_check_time = check_time
-                                 last_check_setting = db.session.merge(Setting(name='version_checker_last_check_time', value=str(self.last_check_time)))
-                                 # db.session.add(last_check_setting) # Merge handles add
-                                 db.session.commit()
-                                 self.logger.info(f"Update check complete. Update available: {update_available}")
-
-                             except Exception as err_inner:
-                                 self.logger.error(f'Error during update check: {err_inner}', exc_info=True)
-                                 db.session.rollback() # Rollback DB changes on error
-
-                except Exception as err_outer:
-                     self.logger.error(f'Error in VersionChecker run loop: {err_outer}', exc_info=True)
-
+            self.check()
             # Sleep regardless of whether check was performed or disabled
-            # Use a shorter internal sleep and check time logic above
-            # This makes stop() more responsive
-            sleep_duration = min(self.TIMEOUT, max(1, self.version_checker_timeout / 10.0))
-            time.sleep(sleep_duration)
+            time.sleep(self.poll_interval())
 
         self.logger.info("VersionChecker thread stopped.")
 
@@ -706,24 +1311,30 @@ class CameraChecker(threading.Thread):
     def stop(self):
         self._running = False
 
+    def poll_interval(self):
+        return self.TIMEOUT
+
+    def check(self):
+        """Refreshes the camera list and saves an image from each camera."""
+        try:
+            with self._decoder.app.app_context(): # Context likely needed for DB access
+                self._cameras.refresh_camera_ids() # Assumes this uses current_app or db
+                active_ids = self._cameras.get_camera_ids()
+                if active_ids:
+                     self.logger.debug(f"Checking active camera IDs: {active_ids}")
+                     for cam_id in active_ids:
+                          # This probably writes image to disk, ensure paths are correct
+                          self._cameras.write_image(cam_id)
+
+        except Exception as err:
+            self.logger.error(f'Error in CameraChecker: {err}', exc_info=True)
+
     def run(self):
         self._running = True
         self.logger.info("CameraChecker thread started.")
         while self._running:
-            try:
-                with self._decoder.app.app_context(): # Context likely needed for DB access
-                    self._cameras.refresh_camera_ids() # Assumes this uses current_app or db
-                    active_ids = self._cameras.get_camera_ids()
-                    if active_ids:
-                         self.logger.debug(f"Checking active camera IDs: {active_ids}")
-                         for cam_id in active_ids:
-                              # This probably writes image to disk, ensure paths are correct
-                              self._cameras.write_image(cam_id)
-
-            except Exception as err:
-                self.logger.error(f'Error in CameraChecker: {err}', exc_info=True)
-
-            time.sleep(self.TIMEOUT)
+            self.check()
+            time.sleep(self.poll_interval())
         self.logger.info("CameraChecker thread stopped.")
 
 
@@ -744,8 +1355,11 @@ class ExportChecker(threading.Thread):
         self.email_enable = False
         self.local_storage = False
         self.days_to_keep = 7
+        self.incremental = False
+        self.full_every = IncrementalBackup.FULL_EVERY
         self._mailer = None
         self._exporter = None
+        self._backup = None
         self.send_from = None
         self.to = []
         self.subject = "AlarmDecoder Settings Database Backup"
@@ -762,27 +1376,52 @@ class ExportChecker(threading.Thread):
         """Loads/reloads parameters from DB settings (requires app context)."""
         self.logger.debug("Loading/reloading export parameters.")
         # Email settings
-        server = Setting.get_by_name('system_email_server', default='localhost').value
-        port = Setting.get_by_name('system_email_port', default=25).value
-        tls = Setting.get_by_name('system_email_tls', default=False).value
-        auth_required = Setting.get_by_name('system_email_auth',default=False).value
-        username = Setting.get_by_name('system_email_username', default=None).value
-        password = Setting.get_by_name('system_email_password', default=None).value
-        self.send_from = Setting.get_by_name('system_email_from',default='root@alarmdecoder').value
-        mailer_to_addr = Setting.get_by_name('export_mailer_to', default=None).value
+        config = Setting.get_many(['system_email_server', 'system_email_port', 'system_email_tls',
+                                   'system_email_auth', 'system_email_username', 'system_email_password',
+                                   'system_email_from', 'export_mailer_to', 'export_frequency',
+                                   'enable_local_file_storage', 'export_local_path', 'export_email_enable',
+                                   'days_to_keep', 'export_last_check_time', 'export_incremental',
+                                   'export_full_every'],
+                                  defaults={
+                                      'system_email_server': 'localhost',
+                                      'system_email_port': 25,
+                                      'system_email_tls': False,
+                                      'system_email_auth': False,
+                                      'system_email_from': 'root@alarmdecoder',
+                                      'export_frequency': 0,
+                                      'enable_local_file_storage': False,
+                                      'export_local_path': os.path.join(INSTANCE_FOLDER_PATH, 'exports'),
+                                      'export_email_enable': False,
+                                      'days_to_keep': 7,
+                                      'export_last_check_time': 0,
+                                      'export_incremental': False,
+                                      'export_full_every': IncrementalBackup.FULL_EVERY,
+                                  })
+
+        server = config['system_email_server']
+        port = config['system_email_port']
+        tls = config['system_email_tls']
+        auth_required = config['system_email_auth']
+        username = config['system_email_username']
+        password = config['system_email_password']
+        self.send_from = config['system_email_from']
+        mailer_to_addr = config['export_mailer_to']
         self.to = [mailer_to_addr] if mailer_to_addr else []
 
         # Export settings
-        self.export_frequency = int(Setting.get_by_name('export_frequency', default=0).value) # Stored as int
-        self.local_storage = Setting.get_by_name('enable_local_file_storage', default=False).value
-        self.local_path = Setting.get_by_name('export_local_path', default=os.path.join(INSTANCE_FOLDER_PATH, 'exports')).value
-        self.email_enable = Setting.get_by_name('export_email_enable', default=False).value
-        self.days_to_keep = int(Setting.get_by_name('days_to_keep', default=7).value)
-        self.last_check_time = int(Setting.get_by_name('export_last_check_time', default=0).value)
+        self.export_frequency = int(config['export_frequency']) # Stored as int
+        self.local_storage = config['enable_local_file_storage']
+        self.local_path = config['export_local_path']
+        self.email_enable = config['export_email_enable']
+        self.days_to_keep = int(config['days_to_keep'])
+        self.last_check_time = int(config['export_last_check_time'])
+        self.incremental = config['export_incremental']
+        self.full_every = int(config['export_full_every'])
 
         # Initialize helpers
         self._mailer = Mailer(server, port, tls, auth_required, username, password)
         self._exporter = Exporter() # Exporter now uses config for path
+        self._backup = IncrementalBackup(self._exporter, self.full_every)
 
         self.logger.info(f'Export parameters set: Freq={self.export_frequency}s, Email={self.email_enable}, Local={self.local_storage}')
 
@@ -794,80 +1433,93 @@ class ExportChecker(threading.Thread):
     # def updateFrequency(self, frequency): ... REMOVE ...
     # ... (remove other update methods) ...
 
-    def run(self):
-        self._running = True
-        self.logger.info("ExportChecker thread started.")
-        while self._running:
-            try:
-                # Reload params periodically in case settings changed in UI
-                # Or implement a signaling mechanism
-                with self._decoder.app.app_context():
-                     self.prepParams() # Reload settings
-
-                if self.export_frequency > 0: # Only run if frequency is set
-                    now = time.time()
-                    # Check if it's time to export
-                    if now > self.last_check_time + self.export_frequency:
-                        self.logger.info(f'Scheduled export check - last run at: {datetime.datetime.fromtimestamp(self.last_check_time).strftime("%Y-%m-%d %H:%M:%S") if self.last_check_time > 0 else "Never"}')
-
-                        if not self.first_run:
-                             with self._decoder.app.app_context(): # Need context for exporter/mailer
-                                  try:
-                                       self._exporter.exportSettings() # Creates archive in memory
-                                       full_path = self._exporter.writeFile() # Writes to disk
-                                       self.logger.info(f"Settings exported to {full_path}")
-
-                                       files_to_attach = [full_path] if full_path else []
-
-                                       # Send email if enabled and file created
-                                       if self.email_enable and files_to_attach and self.to:
-                                            self.logger.info(f'Sending export email to: {self.to}')
-                                            # Ensure mailer parameters are up-to-date (handled by prepParams)
-                                            self._mailer.send_mail(self.send_from, self.to, self.subject, self.body, files_to_attach)
-                                            self.logger.info("Export email sent.")
-
-                                       # Remove file if local storage disabled AND email was attempted (or not enabled)
-                                       if not self.local_storage and full_path:
-                                            self.logger.info(f'Removing non-persisted export file: {full_path}')
-                                            self._exporter.removeFile()
-
-                                       # Clean up old files regardless
-                                       self.logger.info(f"Cleaning up export files older than {self.days_to_keep} days.")
-                                       self._exporter.removeOldFiles(self.days_to_keep)
-
-                                       # Update last check time in DB
-                                       self.last_check_time = now
-                                       last_check_setting = db.session.merge(Setting(name='export_last_check_time', value=str(int(self.last_check_time))))
-                                       # db.session.add(last_check_setting) # Merge handles add
-                                       db.session.commit()
-
-                                  except Exception as export_err:
-                                       self.logger.error(f"Error during settings export/send: {export_err}", exc_info=True)
-                                       db.session.rollback() # Rollback DB changes on error
-
-                        else: # End of first_run check
-                             self.logger.info("Skipping export on first run.")
-                             self.first_run = False
-                             # Still update time to prevent immediate run next cycle if frequency is short
-                             self.last_check_time = now
-                             with self._decoder.app.app_context():
+    def poll_interval(self):
+        # Optionally adjust sleep based on export_frequency if > 0
+        # if self.export_frequency > 0:
+        #      return min(self.TIMEOUT, max(60, self.export_frequency / 10.0))
+        return self.TIMEOUT
+
+    def check(self):
+        """Exports the settings if the export frequency has passed."""
+        try:
+            # Reload params periodically in case settings changed in UI
+            # Or implement a signaling mechanism
+            with self._decoder.app.app_context():
+                 self.prepParams() # Reload settings
+
+            if self.export_frequency > 0: # Only run if frequency is set
+                now = time.time()
+                # Check if it's time to export
+                if now > self.last_check_time + self.export_frequency:
+                    self.logger.info(f'Scheduled export check - last run at: {datetime.datetime.fromtimestamp(self.last_check_time).strftime("%Y-%m-%d %H:%M:%S") if self.last_check_time > 0 else "Never"}')
+
+                    if not self.first_run:
+                         with self._decoder.app.app_context(): # Need context for exporter/mailer
+                              try:
+                                   if self.incremental:
+                                        # Full or delta archive, None if nothing changed
+                                        full_path = self._backup.run()
+                                   else:
+                                        self._exporter.exportSettings() # Names the archive
+                                        full_path = self._exporter.writeFile() # Streams it to disk
+                                   self.logger.info(f"Settings exported to {full_path}")
+
+                                   files_to_attach = [full_path] if full_path else []
+
+                                   # Send email if enabled and file created
+                                   if self.email_enable and files_to_attach and self.to:
+                                        self.logger.info(f'Sending export email to: {self.to}')
+                                        # Ensure mailer parameters are up-to-date (handled by prepParams)
+                                        self._mailer.send_mail(self.send_from, self.to, self.subject, self.body, files_to_attach)
+                                        self.logger.info("Export email sent.")
+
+                                   # Remove file if local storage disabled AND email was attempted (or not enabled)
+                                   if not self.local_storage and full_path:
+                                        self.logger.info(f'Removing non-persisted export file: {full_path}')
+                                        if self.incremental:
+                                             os.remove(full_path)
+                                             self._backup.forget()
+                                        else:
+                                             self._exporter.removeFile()
+
+                                   # Clean up old files regardless
+                                   self.logger.info(f"Cleaning up export files older than {self.days_to_keep} days.")
+                                   self._exporter.removeOldFiles(self.days_to_keep)
+                                   self._backup.prune(self.days_to_keep)
+
+                                   # Update last check time in DB
+                                   self.last_check_time = now
                                    last_check_setting = db.session.merge(Setting(name='export_last_check_time', value=str(int(self.last_check_time))))
+                                   # db.session.add(last_check_setting) # Merge handles add
                                    db.session.commit()
 
+                              except Exception as export_err:
+                                   self.logger.error(f"Error during settings export/send: {export_err}", exc_info=True)
+                                   db.session.rollback() # Rollback DB changes on error
 
-                else: # export_frequency <= 0
-                     # If frequency is 0, maybe sleep longer?
-                     pass
+                    else: # End of first_run check
+                         self.logger.info("Skipping export on first run.")
+                         self.first_run = False
+                         # Still update time to prevent immediate run next cycle if frequency is short
+                         self.last_check_time = now
+                         with self._decoder.app.app_context():
+                               last_check_setting = db.session.merge(Setting(name='export_last_check_time', value=str(int(self.last_check_time))))
+                               db.session.commit()
 
-            except Exception as err_outer:
-                self.logger.error(f'Error in ExportChecker run loop: {err_outer}', exc_info=True)
 
-            # Sleep based on configured timeout or a default
-            sleep_duration = self.TIMEOUT
-            # Optionally adjust sleep based on export_frequency if > 0
-            # if self.export_frequency > 0:
-            #      sleep_duration = min(self.TIMEOUT, max(60, self.export_frequency / 10.0))
-            time.sleep(sleep_duration)
+            else: # export_frequency <= 0
+                 # If frequency is 0, maybe sleep longer?
+                 pass
+
+        except Exception as err_outer:
+            self.logger.error(f'Error in ExportChecker run loop: {err_outer}', exc_info=True)
+
+    def run(self):
+        self._running = True
+        self.logger.info("ExportChecker thread started.")
+        while self._running:
+            self.check()
+            time.sleep(self.poll_interval())
 
         self.logger.info("ExportChecker thread stopped.")
 
@@ -917,9 +1569,16 @@ class DecoderNamespace(Namespace):
                       # from flask_socketio import session as sio_session # Alias if needed
                       # sio_session['authenticated'] = True
 
+                      # Clients follow the primary device until they ask for another one
+                      join_room(device_room(PRIMARY_DEVICE))
+
+                      # Full panel state; deltas with a higher seq follow over 'panel_state'
+                      if decoder:
+                           self.emit('panel_state', dict(decoder.panel_state.snapshot(), device_id=PRIMARY_DEVICE), room=sid)
+
                       # Example: Send current status immediately on connect
                       if decoder and decoder.device and decoder.device.last_message:
-                           self.emit('message', {'message': str(decoder.device.last_message.raw), 'message_type': 'panel'}, room=sid) # Send only to connecting client
+                           self.emit('message', serializer.serialize({'message': decoder.device.last_message, 'message_type': 'panel'}), room=sid) # Send only to connecting client
                  else:
                       logger.warning(f"Client {sid} not authorized for '/alarmdecoder' namespace (Setup Stage: {setup_stage}, UserID: {user_id}). Disconnecting.")
                       # Disconnect unauthorized clients
@@ -937,18 +1596,75 @@ class DecoderNamespace(Namespace):
     def on_disconnect(self):
         """Handles Socket.IO client disconnections."""
         logger.info(f'SocketIO client disconnected: {request.sid}')
-        # Perform any cleanup related to this session if needed
+        log_follow.unsubscribe(request.sid)
+
+
+    @socketio.on('panel_state_resync', namespace='/alarmdecoder')
+    def on_panel_state_resync(self, last_seq=None, device_id=PRIMARY_DEVICE):
+        """Sends a full panel state snapshot to a client that detected a sequence gap."""
+        decoder = current_app.decoder
+        source = decoder.source(device_id) if decoder else None
+        if source:
+            logger.debug(f"Client {request.sid} resyncing device {device_id} panel state from seq {last_seq}.")
+            emit('panel_state', dict(source.panel_state.snapshot(), device_id=source.device_id), room=request.sid)
+
+
+    @socketio.on('devices', namespace='/alarmdecoder')
+    def on_devices(self, *args):
+        """Returns the configured devices to the client's acknowledgement callback."""
+        decoder = current_app.decoder
+        if not decoder:
+            return []
+
+        return [{'id': d['id'], 'name': d['name'], 'connected': d['connected']} for d in decoder.device_stats()]
+
+
+    @socketio.on('device_subscribe', namespace='/alarmdecoder')
+    def on_device_subscribe(self, device_id=PRIMARY_DEVICE):
+        """Joins a device's room and sends its panel state snapshot."""
+        decoder = current_app.decoder
+        source = decoder.source(device_id) if decoder else None
+        if source is None:
+            logger.warning(f"Client {request.sid} subscribed to unknown device {device_id}.")
+            return
+
+        join_room(device_room(source.device_id))
+        emit('panel_state', dict(source.panel_state.snapshot(), device_id=source.device_id), room=request.sid)
+
+
+    @socketio.on('device_unsubscribe', namespace='/alarmdecoder')
+    def on_device_unsubscribe(self, device_id=PRIMARY_DEVICE):
+        """Leaves a device's room."""
+        leave_room(device_room(device_id))
+
+
+    @socketio.on('log_follow', namespace='/alarmdecoder')
+    def on_log_follow(self, *args):
+        """Starts pushing new application log lines to an admin client."""
+        if not current_user.is_authenticated or not current_user.is_admin():
+            logger.warning(f"Client {request.sid} is not allowed to follow the logs.")
+            return
+
+        join_room(log_follow.subscribe(request.sid))
+
+
+    @socketio.on('log_unfollow', namespace='/alarmdecoder')
+    def on_log_unfollow(self, *args):
+        """Stops pushing application log lines to a client."""
+        leave_room(log_follow.room(log_follow.log_folder()))
+        log_follow.unsubscribe(request.sid)
 
 
     # Keep other event handlers, ensure they use current_app.decoder or similar
     @socketio.on('keypress', namespace='/alarmdecoder')
-    def on_keypress(self, key):
+    def on_keypress(self, key, device_id=PRIMARY_DEVICE):
         """Handles websocket keypress events."""
         try:
             # Access decoder via current_app
             decoder = current_app.decoder
-            if not decoder or not decoder.device:
-                 logger.warning("Keypress received but no device available.")
+            source = decoder.source(device_id) if decoder else None
+            if not source or not source.device:
+                 logger.warning(f"Keypress received but device {device_id} is not available.")
                  return
 
             # Use a mapping or cleaner structure?
@@ -957,11 +1673,15 @@ class DecoderNamespace(Namespace):
                        5: AlarmDecoder.KEY_PANIC} # Panic key mapping? Check AlarmDecoder consts
 
             if key in key_map:
-                 decoder.device.send(key_map[key])
+                 keys = key_map[key]
             else: # Assume direct key press character/string
-                 decoder.device.send(str(key)) # Ensure it's a string
+                 keys = str(key) # Ensure it's a string
+
+            source.device.send(keys)
+            if source is decoder:
+                decoder.capture_keypress(keys)
 
-            logger.debug(f"Sent keypress '{key}' to device.")
+            logger.debug(f"Sent keypress '{key}' to device {device_id}.")
 
         except (CommError, AttributeError):
             logger.error('Error sending keypress to device', exc_info=True)
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from .constants import PRIMARY_DEVICE, device_room
+from .models import DeviceConfig
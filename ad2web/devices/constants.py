@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+# Id of the device configured through the device_* settings.  Devices in the
+# devices table are numbered from 1.
+PRIMARY_DEVICE = 0
+
+
+def device_room(device_id):
+    """Returns the Socket.IO room that receives a device's events."""
+    return 'device:{0}'.format(device_id)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import Column
+
+from ..extensions import db
+
+
+class DeviceConfig(db.Model):
+    """
+    An AlarmDecoder device in addition to the primary one, which keeps its
+    configuration in the ``device_*`` settings.
+    """
+    __tablename__ = 'devices'
+
+    id = Column(db.Integer, primary_key=True)
+    name = Column(db.String(64), unique=True, nullable=False)
+    enabled = Column(db.Boolean, default=True, nullable=False)
+    device_type = Column(db.String(32), nullable=False)
+    device_location = Column(db.String(32), nullable=False)
+    device_path = Column(db.String(255))
+    device_baudrate = Column(db.Integer)
+    device_address = Column(db.String(255))
+    device_port = Column(db.Integer)
+    use_ssl = Column(db.Boolean, default=False, nullable=False)
+    address_mask = Column(db.String(8), default='FFFFFFFF', nullable=False)
+
+    def settings(self):
+        """
+        Returns the configuration keyed like the primary device's settings.
+
+        :returns: dict
+        """
+        return {
+            'device_type': self.device_type,
+            'device_location': self.device_location,
+            'device_path': self.device_path,
+            'device_baudrate': self.device_baudrate,
+            'device_address': self.device_address,
+            'device_port': self.device_port,
+            'use_ssl': self.use_ssl,
+            'address_mask': self.address_mask or 'FFFFFFFF',
+        }
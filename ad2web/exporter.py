@@ -1,48 +1,125 @@
+"""
+Settings export archives.
+
+The archive is a gzipped tarball with one JSON Lines file per table in
+:py:func:`~ad2web.settings.constants.get_export_map` under the
+``alarmdecoder-export`` directory.  It is produced as a stream: rows are read
+with ``yield_per`` cursors, each table is spooled to a temporary file (kept in
+memory while small) so its size is known for the tar header, and the
+compressed output is handed on in chunks as it is written.  Peak memory does
+not depend on the size of the tables.
+"""
+
 import os
 import io
 import tarfile
 import json
-#import compiler
 import time
+import tempfile
 
 from sqlalchemy.orm import class_mapper
-from .utils import tar_add_directory, tar_add_textfile
+from .utils import tar_add_directory, tar_add_fileobj
 from .settings import Setting
 from .settings.constants import get_export_map # Import the function instead
 from datetime import datetime
 from .utils import INSTANCE_FOLDER_PATH # Add a dot before utils
-from flask import Response
+from flask import Response, stream_with_context
+
+EXPORT_SUFFIX = '.jsonl'
+
+
+def export_name(name):
+    """Returns the archive member name for an export map entry."""
+    return os.path.splitext(name)[0] + EXPORT_SUFFIX
+
+
+def encode_row(row):
+    """Returns a row as one UTF-8 encoded JSON line."""
+    return (json.dumps(row, sort_keys=True, skipkeys=True) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only sink whose contents are taken after each write to the tarball.
+    """
+    def __init__(self):
+        self._data = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._data.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        data = b''.join(self._data)
+        self._data = []
+        return data
+
 
 class Exporter(object):
     EXPORT_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'exports')
     DAY_SECONDS = 86400
-    WRITE_MODE = 'w:gz'
+    WRITE_MODE = 'w|gz'
+    # Rows fetched per round trip.
+    BATCH_SIZE = 500
+    # Table data above this size is spooled to disk instead of memory.
+    SPOOL_SIZE = 1024 * 1024
 
     def __init__(self):
         self.prefix = 'alarmdecoder-export'
         self.export_path = Setting.get_by_name('export_local_path',default=self.EXPORT_PATH).value
         self.full_path = None
-        self.fileobj = None
         self.filename = None
 
         if self.export_path != '' and not os.path.exists(self.export_path):
             os.makedirs(self.export_path)
 
     def exportSettings(self):
-        self.fileobj = io.BytesIO()
+        """
+        Names a new archive.  Its contents are produced by
+        :py:meth:`iter_archive` when it is written or returned.
+        """
         self.filename = '{0}-{1}.tar.gz'.format(self.prefix, datetime.now().strftime('%Y%m%d%H%M%S'))
         self.full_path = os.path.join(self.export_path, self.filename)
-        # ---> ADD THIS LINE TO GET THE MAP <---
+
+    def iter_archive(self):
+        """
+        Builds the archive table by table.
+
+        :returns: generator of compressed bytes
+        """
         EXPORT_MAP = get_export_map()
-        with tarfile.open(name=bytes(self.filename), mode=self.WRITE_MODE, fileobj=self.fileobj) as tar:
+        sink = _ChunkSink()
+
+        with tarfile.open(mode=self.WRITE_MODE, fileobj=sink) as tar:
             tar_add_directory(tar, self.prefix)
 
-            for export_file, model in EXPORT_MAP.iteritems():
-                tar_add_textfile(tar, export_file, bytes(self._export_model(model)), self.prefix)
+            for export_file, model in EXPORT_MAP.items():
+                self._add_model(tar, export_name(export_file), model)
+
+                data = sink.take()
+                if data:
+                    yield data
+
+        yield sink.take()
 
     def writeFile(self):
-        with open(self.full_path, self.WRITE_MODE) as out:
-            out.write(self.fileobj.getvalue())
+        if self.filename is None:
+            self.exportSettings()
+
+        # Written under a temporary name so a failed export never looks complete.
+        partial = self.full_path + '.part'
+        try:
+            with open(partial, 'wb') as out:
+                for data in self.iter_archive():
+                    out.write(data)
+            os.replace(partial, self.full_path)
+        except Exception:
+            if os.path.isfile(partial):
+                os.remove(partial)
+            raise
 
         return self.full_path
 
@@ -70,13 +147,32 @@ class Exporter(object):
                         os.remove(fullpath)
 
     def ReturnResponse(self):
-        return Response(self.fileobj.getvalue(), mimetype='application/x-gzip', headers= { 'Content-Type': 'application/x-gzip', 'Content-Disposition': 'attachment; filename=' + self.filename } )
+        if self.filename is None:
+            self.exportSettings()
 
-    def _export_model(self, model):
-        data = []
-        for res in model.query.all():
+        return Response(stream_with_context(self.iter_archive()), mimetype='application/x-gzip', headers= { 'Content-Type': 'application/x-gzip', 'Content-Disposition': 'attachment; filename=' + self.filename } )
+
+    def _add_model(self, tar, name, model):
+        with tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE) as spool:
+            for line in self._export_model(model):
+                spool.write(line)
+            spool.seek(0)
+
+            tar_add_fileobj(tar, name, spool, self.prefix)
+
+    @classmethod
+    def iter_rows(cls, model):
+        """
+        Reads a table in primary key order, ``BATCH_SIZE`` rows at a time.
+
+        :returns: generator of dicts keyed by column, ready for JSON
+        """
+        columns = class_mapper(model).columns
+        query = model.query.order_by(*class_mapper(model).primary_key).yield_per(cls.BATCH_SIZE)
+
+        for res in query:
             res_dict = {}
-            for c in class_mapper(res.__class__).columns:
+            for c in columns:
                 value = getattr(res, c.key)
 
                 if isinstance(value, datetime):
@@ -86,5 +182,13 @@ class Exporter(object):
 
                 res_dict[c.key] = value
 
-            data.append(res_dict)
-        return json.dumps(data, sort_keys=True, indent=4, separators=(',', ': '), skipkeys=True)
+            yield res_dict
+
+    def _export_model(self, model):
+        """
+        Serializes a table one row per line.
+
+        :returns: generator of UTF-8 encoded JSON lines
+        """
+        for res_dict in self.iter_rows(model):
+            yield encode_row(res_dict)
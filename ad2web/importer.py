@@ -0,0 +1,269 @@
+"""
+Settings archive import.
+
+The counterpart of :py:mod:`ad2web.exporter`.  The uploaded archive is read
+as a stream twice, one tar member at a time, and never held in memory:
+
+1. Validation reads every row and checks it against the table schema
+   (unknown or missing columns, bad timestamps, duplicate primary keys) and
+   compares it with the rows already in the database.  Nothing is written
+   if any row is invalid.  A dry run stops here and returns the report.
+2. The import replaces each table inside its own savepoint with batched
+   ``executemany`` inserts, bypassing the ORM.  A table that fails is
+   rolled back to its previous contents and reported; the others are kept.
+
+Both JSON Lines members and the JSON arrays of older archives are read.
+Progress is reported through an optional callback, which the import view
+forwards over Socket.IO.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tarfile
+from datetime import datetime
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .extensions import db
+from .exporter import Exporter, encode_row
+from .settings import Setting
+from .settings.constants import get_export_map
+from .zones import Zone
+
+logger = logging.getLogger(__name__)
+
+READ_MODE = 'r|gz'
+PREFIX = 'alarmdecoder-export'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+VALIDATE = 'validate'
+IMPORT = 'import'
+DONE = 'done'
+
+# Row errors kept in a report before the rest are only counted.
+MAX_ERRORS = 20
+
+
+def _row_hash(row):
+    return hashlib.sha1(encode_row(row)).digest()
+
+
+def _key(row, primary_key):
+    return tuple(row.get(c) for c in primary_key)
+
+
+def _iter_member(fileobj, name):
+    if name.endswith('.jsonl'):
+        for line in fileobj:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        # Archives written before JSON Lines hold one array per table.
+        for row in json.loads(fileobj.read()):
+            yield row
+
+
+class Importer(object):
+    """
+    Validates and imports a settings archive.
+    """
+    BATCH_SIZE = 500
+
+    def __init__(self, fileobj, progress=None):
+        """
+        Constructor
+
+        :param fileobj: seekable gzipped tar archive
+        :type fileobj: file
+        :param progress: called with a dict after each batch, see
+                         :py:meth:`run`
+        :type progress: callable
+        """
+        self.fileobj = fileobj
+        self.progress = progress
+        self.models = get_export_map()
+
+    def run(self, dry_run=False):
+        """
+        Validates the archive and, unless ``dry_run``, imports it.  A dry run
+        returns the row errors in the report instead of raising.
+
+        Progress dicts hold ``stage`` (``validate``, ``import`` or ``done``),
+        ``table``, ``rows`` and ``total``.
+
+        :param dry_run: only validate and report
+        :type dry_run: bool
+
+        :returns: dict with ``tables`` (per table ``rows``, ``new``,
+                  ``changed``, ``unchanged``, ``removed`` and, after an
+                  import, ``imported``) and ``errors``
+        :raises ValueError: if the archive is not valid
+        """
+        report = self.validate()
+        if dry_run:
+            self._progress(DONE, None, 0, 0)
+            return report
+
+        if report['errors']:
+            raise ValueError('{0} (and {1} more)'.format(report['errors'][0], len(report['errors']) - 1)
+                             if len(report['errors']) > 1 else report['errors'][0])
+
+        self._import(report)
+
+        self._progress(DONE, None, 0, 0)
+
+        return report
+
+    def validate(self):
+        """
+        Checks every row of the archive without writing anything.
+
+        :returns: the report described in :py:meth:`run`
+        :raises ValueError: if the file is not a settings archive
+        """
+        report = {'tables': {}, 'errors': []}
+
+        for name, model, rows in self._members():
+            table = model.__table__
+            stats = report['tables'][name] = self._check(name, table, rows, report['errors'])
+
+            existing = self._existing(model)
+            for key, row_hash in stats.pop('_hashes').items():
+                current = existing.pop(key, None)
+                if current is None:
+                    stats['new'] += 1
+                elif current == row_hash:
+                    stats['unchanged'] += 1
+                else:
+                    stats['changed'] += 1
+            stats['removed'] = len(existing)
+
+        if not report['tables']:
+            raise ValueError('Not a valid AlarmDecoder archive.')
+
+        return report
+
+    def _check(self, name, table, rows, errors):
+        columns = dict((c.key, c) for c in table.columns)
+        primary_key = [c.key for c in table.primary_key.columns]
+        required = [c.key for c in table.columns
+                    if not c.nullable and c.default is None and c.server_default is None and not c.primary_key]
+
+        stats = {'rows': 0, 'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, '_hashes': {}}
+
+        def error(message):
+            if len(errors) < MAX_ERRORS:
+                errors.append('{0} row {1}: {2}'.format(name, stats['rows'], message))
+
+        for row in rows:
+            stats['rows'] += 1
+
+            if not isinstance(row, dict):
+                error('not an object')
+                continue
+
+            unknown = [k for k in row if k not in columns]
+            if unknown:
+                error('unknown column(s) {0}'.format(', '.join(sorted(unknown))))
+
+            missing = [k for k in required if row.get(k) is None]
+            if missing:
+                error('missing column(s) {0}'.format(', '.join(missing)))
+
+            for key, column in columns.items():
+                if isinstance(column.type, db.DateTime) and row.get(key) is not None:
+                    try:
+                        datetime.strptime(row[key], DATETIME_FORMAT)
+                    except (TypeError, ValueError):
+                        error('bad timestamp in {0}'.format(key))
+
+            key = _key(row, primary_key)
+            if None not in key:
+                if key in stats['_hashes']:
+                    error('duplicate key {0}'.format(list(key)))
+                stats['_hashes'][key] = _row_hash(row)
+
+            if stats['rows'] % self.BATCH_SIZE == 0:
+                self._progress(VALIDATE, name, stats['rows'], None)
+
+        self._progress(VALIDATE, name, stats['rows'], stats['rows'])
+
+        return stats
+
+    def _existing(self, model):
+        primary_key = [c.key for c in model.__table__.primary_key.columns]
+
+        return dict((_key(row, primary_key), _row_hash(row)) for row in Exporter.iter_rows(model))
+
+    def _import(self, report):
+        for name, model, rows in self._members():
+            stats = report['tables'][name]
+            table = model.__table__
+            datetimes = [c.key for c in table.columns if isinstance(c.type, db.DateTime)]
+
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(table.delete())
+
+                    imported = 0
+                    batch = []
+                    for row in rows:
+                        for key in datetimes:
+                            if row.get(key) is not None:
+                                row[key] = datetime.strptime(row[key], DATETIME_FORMAT)
+                        batch.append(row)
+
+                        if len(batch) >= self.BATCH_SIZE:
+                            imported += self._insert(table, batch)
+                            batch = []
+                            self._progress(IMPORT, name, imported, stats['rows'])
+
+                    if batch:
+                        imported += self._insert(table, batch)
+
+                stats['imported'] = imported
+                self._progress(IMPORT, name, imported, stats['rows'])
+            except SQLAlchemyError as err:
+                # The savepoint is rolled back; this table keeps its old rows.
+                stats['imported'] = 0
+                report['errors'].append('{0}: {1}'.format(name, err))
+                logger.error('Error importing {0}: {1}'.format(name, err))
+
+        db.session.commit()
+        # Bulk statements skip the mapper events that keep the caches current.
+        Setting.cache.invalidate()
+        Zone.index.invalidate()
+
+    @staticmethod
+    def _insert(table, batch):
+        db.session.execute(table.insert(), batch)
+        return len(batch)
+
+    def _members(self):
+        self.fileobj.seek(0)
+
+        try:
+            with tarfile.open(mode=READ_MODE, fileobj=self.fileobj) as tar:
+                for member in tar:
+                    if not member.isfile() or not member.name.startswith(PREFIX + '/'):
+                        continue
+
+                    filename = os.path.basename(member.name)
+                    model = self.models.get(os.path.splitext(filename)[0] + '.json')
+                    if model is None:
+                        continue
+
+                    yield os.path.splitext(filename)[0], model, _iter_member(tar.extractfile(member), filename)
+        except (tarfile.TarError, EOFError, OSError) as err:
+            raise ValueError('Not a valid AlarmDecoder archive: {0}'.format(err))
+
+    def _progress(self, stage, table, rows, total):
+        if self.progress is None:
+            return
+
+        try:
+            self.progress({'stage': stage, 'table': table, 'rows': rows, 'total': total})
+        except Exception as err:
+            logger.error('Error reporting import progress: {0}'.format(err))
@@ -3,5 +3,5 @@
 from .constants import ARM, DISARM, POWER_CHANGED, ALARM, FIRE, BYPASS, BOOT, \
                         CONFIG_RECEIVED, ZONE_FAULT, ZONE_RESTORE, LOW_BATTERY, \
                         PANIC, EVENT_TYPES, LRR, READY, CHIME, RFX, EXP, AUI
-from .models import EventLogEntry
+from .models import EventLogEntry, EventLogHourly, EventLogDaily
 from .views import log
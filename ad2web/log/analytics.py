@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar export and aggregate queries over the event log.
+
+The log is read in time windows of ``CHUNK`` (one day by default) straight
+into column arrays, never into ORM objects.  Each window becomes one record
+batch of an Arrow IPC stream or one row group of a Parquet file when
+``pyarrow`` is installed, so an export of years of history streams with
+bounded memory.  ``npz`` (compressed numpy arrays) works without it but is
+built in memory.
+
+The aggregates:
+
+* :py:func:`zone_faults` - zone faults per zone per hour
+* :py:func:`arm_timeline` - armed/disarmed intervals
+* :py:func:`alarm_counts` - ALARM, FIRE and PANIC events per day
+
+The counts come from the ``event_log_hourly`` and ``event_log_daily``
+rollups for the periods they cover; only the rest of the requested window
+(partial periods at the edges, hours older than the hourly rollup keeps,
+rows not yet rolled up) is read from the log, a ``CHUNK`` at a time, and
+counted with numpy.  The timeline needs the individual events, so it is
+computed from the log.
+
+Zone is -1 for events without a zone, as in the rollups.
+"""
+
+import io
+import datetime
+from collections import Counter
+
+import numpy as np
+from sqlalchemy import select, func
+
+from ..extensions import db
+from .constants import ARM, DISARM, ALARM, FIRE, PANIC, ZONE_FAULT, EVENT_TYPES
+from . import rollup
+from .models import EventLogEntry
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+    have_pyarrow = True
+except ImportError:
+    have_pyarrow = False
+
+# Time window read per query and written per batch / row group.
+CHUNK = datetime.timedelta(days=1)
+
+FORMATS = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+    'npz': 'application/octet-stream',
+}
+
+COLUMNS = ('id', 'timestamp', 'type', 'zone', 'message')
+
+ALARM_EVENTS = (ALARM, FIRE, PANIC)
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _text(timestamp):
+    # Compare as text like the pager does: stored timestamps come in two formats.
+    return db.literal(timestamp.strftime(_TIMESTAMP_FORMAT), db.String)
+
+
+def time_range(since=None, until=None):
+    """
+    Fills in missing bounds from the oldest row and the current time.
+
+    :returns: ``(since, until)`` datetimes, since is None if the log is empty
+    """
+    if until is None:
+        until = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(seconds=1)
+
+    if since is None:
+        oldest = db.session.query(func.min(EventLogEntry.timestamp)).scalar()
+        since = oldest.replace(microsecond=0) if oldest is not None else None
+
+    return since, until
+
+
+def read_columns(since, until, types=None, with_messages=True):
+    """
+    Reads the rows in ``[since, until)`` as numpy arrays, oldest first.
+
+    :param since: first timestamp included
+    :type since: datetime
+    :param until: first timestamp excluded
+    :type until: datetime
+    :param types: event types to include, all if None
+    :type types: list
+    :param with_messages: include the ``message`` column
+    :type with_messages: bool
+
+    :returns: dict of column name to array
+    """
+    table = EventLogEntry.__table__
+    columns = [table.c.id, table.c.timestamp, table.c.type, func.coalesce(table.c.zone, -1)]
+    if with_messages:
+        columns.append(table.c.message)
+
+    query = select(*columns) \
+                .where(table.c.timestamp >= _text(since), table.c.timestamp < _text(until)) \
+                .order_by(table.c.timestamp, table.c.id)
+    if types:
+        query = query.where(table.c.type.in_(types))
+
+    rows = db.session.execute(query).all()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+
+    result = {
+        'id': np.array(values[0], dtype=np.int64),
+        'timestamp': np.array(values[1], dtype='datetime64[us]'),
+        'type': np.array(values[2], dtype=np.int16),
+        'zone': np.array(values[3], dtype=np.int16),
+    }
+    if with_messages:
+        result['message'] = np.array(values[4], dtype=object)
+
+    return result
+
+
+def iter_chunks(since=None, until=None, chunk=CHUNK, types=None, with_messages=True):
+    """
+    Reads the log one time window at a time.
+
+    :returns: generator of column dicts, empty windows skipped
+    """
+    since, until = time_range(since, until)
+    if since is None:
+        return
+
+    start = since
+    while start < until:
+        end = min(start + chunk, until)
+        columns = read_columns(start, end, types, with_messages)
+        if len(columns['id']):
+            yield columns
+
+        start = end
+
+
+def _record_batch(columns):
+    return pa.record_batch([
+        pa.array(columns['id'], type=pa.int64()),
+        pa.array(columns['timestamp'], type=pa.timestamp('us')),
+        pa.array(columns['type'], type=pa.int16()),
+        pa.array(columns['zone'], type=pa.int16()),
+        pa.array(columns['message'], type=pa.string()),
+    ], names=list(COLUMNS))
+
+
+def _schema():
+    return pa.schema([('id', pa.int64()), ('timestamp', pa.timestamp('us')), ('type', pa.int16()),
+                      ('zone', pa.int16()), ('message', pa.string())])
+
+
+class _Buffer(io.RawIOBase):
+    """
+    Write-only sink whose contents are taken as each chunk is written.
+    """
+    def __init__(self):
+        self._data = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        data = bytes(b)
+        self._data.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._data)
+        self._data = []
+        return data
+
+
+def export(format='arrow', since=None, until=None, chunk=CHUNK, types=None):
+    """
+    Streams the event log in a columnar format.
+
+    :param format: ``arrow``, ``parquet`` or ``npz``
+    :type format: str
+    :param since: first timestamp included, defaults to the oldest row
+    :type since: datetime
+    :param until: first timestamp excluded, defaults to now
+    :type until: datetime
+    :param chunk: time window per record batch / row group
+    :type chunk: :py:class:`datetime.timedelta`
+    :param types: event types to include, all if None
+    :type types: list
+
+    :returns: generator of bytes
+    :raises ValueError: if the format is unknown or needs pyarrow
+    """
+    if format not in FORMATS:
+        raise ValueError('Unknown export format: {0}'.format(format))
+    if format in ('arrow', 'parquet') and not have_pyarrow:
+        raise ValueError('The {0} format requires pyarrow; use "pip install pyarrow" or the npz format.'.format(format))
+
+    chunks = iter_chunks(since, until, chunk, types)
+
+    if format == 'npz':
+        return _export_npz(chunks)
+
+    return _export_arrow(chunks, format)
+
+
+def _export_arrow(chunks, format):
+    sink = _Buffer()
+    if format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, _schema(), compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(sink, _schema())
+
+    for columns in chunks:
+        writer.write_batch(_record_batch(columns))
+
+        data = sink.take()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.take()
+
+
+def _export_npz(chunks):
+    parts = list(chunks)
+    columns = dict((name, np.concatenate([p[name] for p in parts]) if parts else np.array([]))
+                   for name in COLUMNS)
+    # Fixed width text keeps the archive loadable without allow_pickle.
+    columns['message'] = columns['message'].astype(str)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+
+    yield buffer.getvalue()
+
+
+def _hours(timestamps):
+    return timestamps.astype('datetime64[h]')
+
+
+def _days(timestamps):
+    return timestamps.astype('datetime64[D]')
+
+
+def _count(period, since, until, types, row_key, column_keys):
+    """
+    Counts events per key, from the rollup for the whole periods it covers
+    and from the log for the rest of ``[since, until)``.
+
+    :param row_key: returns the key of a rollup row
+    :param column_keys: returns the keys of a column dict as a record array
+
+    :returns: :py:class:`collections.Counter` of key to count
+    """
+    covered = rollup.coverage(period, since, until)
+    since, until = time_range(since, until)
+    counts = Counter()
+
+    windows = [(since, until)]
+    if covered is not None:
+        start, end = covered
+        windows = [(since, start), (end, until)]
+
+        model = rollup.PERIODS[period]
+        rows = db.session.query(model) \
+                    .filter(model.period >= start, model.period < end, model.type.in_(types))
+        for row in rows:
+            counts[row_key(row)] += row.count
+
+    for start, end in windows:
+        if start is None or start >= end:
+            continue
+
+        for columns in iter_chunks(start, end, types=types, with_messages=False):
+            unique, totals = np.unique(column_keys(columns), return_counts=True)
+            for key, total in zip(unique.tolist(), totals.tolist()):
+                counts[key] += total
+
+    return counts
+
+
+def zone_faults(since=None, until=None):
+    """
+    Counts zone faults per zone per hour.
+
+    :returns: list of dicts with ``hour``, ``zone`` and ``count``
+    """
+    counts = _count('hour', since, until, [ZONE_FAULT],
+                    lambda row: (row.period, row.zone),
+                    lambda columns: np.rec.fromarrays([_hours(columns['timestamp']), columns['zone']],
+                                                      names='hour,zone'))
+
+    return [{'hour': hour.isoformat(), 'zone': int(zone), 'count': count}
+            for (hour, zone), count in sorted(counts.items())]
+
+
+def arm_timeline(since=None, until=None):
+    """
+    Collapses ARM/DISARM events into intervals.  Repeated events in the same
+    state (e.g. arming again while armed) do not start a new interval.
+
+    :returns: list of dicts with ``state``, ``start``, ``end`` and ``seconds``;
+              the last interval is open (``end`` None)
+    """
+    since, until = time_range(since, until)
+    if since is None:
+        return []
+
+    columns = read_columns(since, until, types=[ARM, DISARM], with_messages=False)
+    timestamps = columns['timestamp']
+    armed = columns['type'] == ARM
+    if not len(armed):
+        return []
+
+    # Indexes where the state differs from the previous event.
+    changes = np.flatnonzero(np.concatenate(([True], armed[1:] != armed[:-1])))
+    starts = timestamps[changes]
+    ends = np.concatenate((starts[1:], np.array(['NaT'], dtype=starts.dtype)))
+    seconds = (ends - starts) / np.timedelta64(1, 's')
+
+    return [{
+        'state': 'armed' if is_armed else 'disarmed',
+        'start': start.tolist().isoformat(),
+        'end': None if np.isnat(end) else end.tolist().isoformat(),
+        'seconds': None if np.isnan(duration) else float(duration),
+    } for is_armed, start, end, duration in zip(armed[changes], starts, ends, seconds)]
+
+
+def alarm_counts(since=None, until=None):
+    """
+    Counts ALARM, FIRE and PANIC events per day.
+
+    :returns: list of dicts with ``day``, ``type``, ``type_name`` and ``count``
+    """
+    counts = _count('day', since, until, list(ALARM_EVENTS),
+                    lambda row: (row.period.date(), row.type),
+                    lambda columns: np.rec.fromarrays([_days(columns['timestamp']), columns['type']],
+                                                      names='day,type'))
+
+    return [{'day': day.isoformat(), 'type': int(type), 'type_name': EVENT_TYPES.get(int(type), str(type)), 'count': count}
+            for (day, type), count in sorted(counts.items())]
+
+
+AGGREGATES = {
+    'zone_faults': zone_faults,
+    'arm_timeline': arm_timeline,
+    'alarm_counts': alarm_counts,
+}
@@ -41,3 +41,25 @@ EVENT_TYPES = {
     EXP: 'EXP',
     AUI: 'AUI'
 }
+
+# Days each event type is kept in the event log; None keeps it forever.
+# Override per type with the 'event_log_retention' setting, a JSON object
+# keyed by type name, e.g. {"ZONE FAULT": 7, "LRR": null}.
+DEFAULT_RETENTION_DAYS = 365
+
+EVENT_RETENTION_DAYS = {
+    ZONE_FAULT: 30,
+    ZONE_RESTORE: 30,
+    READY: 30,
+    CHIME: 30,
+    RFX: 30,
+    EXP: 30,
+    AUI: 30,
+    ALARM: None,
+    ALARM_RESTORED: None,
+    FIRE: None,
+    PANIC: None,
+}
+
+# Days hourly rollups are kept; daily rollups are kept forever.
+HOURLY_ROLLUP_RETENTION_DAYS = 90
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Live follow of the application log files.
+
+One :py:class:`LogFollower` runs per log directory for as long as at least
+one Socket.IO client follows it.  It wraps a
+:py:class:`~ad2web.logwatch.LogWatcher`, which handles rotation and blocks
+on inotify where available, and pushes new lines as ``log_lines`` frames to
+the followers' room instead of every client re-reading the file on a timer.
+"""
+
+import os
+import logging
+import threading
+
+from ..extensions import socketio
+from ..logwatch import LogWatcher
+from ..utils import INSTANCE_FOLDER_PATH
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/alarmdecoder'
+
+
+def log_folder():
+    """Returns the directory the application logs are written to."""
+    return os.path.join(INSTANCE_FOLDER_PATH, 'logs')
+
+
+def room(folder):
+    """Returns the Socket.IO room for followers of a log directory."""
+    return 'log:' + os.path.realpath(folder)
+
+
+class _Watcher(LogWatcher):
+    def log(self, line):
+        logger.debug(line)
+
+
+class LogFollower(threading.Thread):
+    """
+    Pushes lines appended to the log files in a directory to Socket.IO.
+    """
+    INTERVAL = 0.5
+
+    def __init__(self, folder, emitter=None, interval=None):
+        """
+        Constructor
+
+        :param folder: log directory to follow
+        :type folder: str
+        :param emitter: callable taking ``(event_name, data, room)``,
+                        defaults to a Socket.IO emit
+        :type emitter: callable
+        :param interval: polling interval used when inotify is not available
+        :type interval: float
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.folder = os.path.realpath(folder)
+        self.room = room(folder)
+        self.interval = interval or self.INTERVAL
+        self._emitter = emitter or self._socketio_emit
+        # Opened here so only lines written after the first follow are sent.
+        self._watcher = _Watcher(self.folder, self._on_lines)
+
+        self.lines = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            'folder': self.folder,
+            'inotify': self._watcher.uses_inotify,
+            'lines': self.lines,
+            'errors': self.errors,
+        }
+
+    def stop(self):
+        """Makes the thread exit without waiting for the next change."""
+        self._watcher.stop()
+
+    def poll(self):
+        """Sends the lines appended since the last pass, without waiting."""
+        self._watcher.loop(blocking=False)
+
+    def run(self):
+        try:
+            self._watcher.loop(interval=self.interval)
+        except Exception as err:
+            self.errors += 1
+            logger.error('Error following logs in {0}: {1}'.format(self.folder, err), exc_info=True)
+        finally:
+            self._watcher.close()
+
+    def _on_lines(self, filename, lines):
+        lines = [l.decode('utf-8', 'replace').rstrip('\r\n') for l in lines]
+        self.lines += len(lines)
+
+        try:
+            self._emitter('log_lines', {'file': os.path.basename(filename), 'lines': lines}, self.room)
+        except Exception as err:
+            self.errors += 1
+            logger.error('Error sending log lines: {0}'.format(err))
+
+    @staticmethod
+    def _socketio_emit(event_name, data, room):
+        socketio.emit(event_name, data, namespace=NAMESPACE, to=room)
+
+
+_followers = {}
+_subscribers = {}
+_lock = threading.Lock()
+
+
+def subscribe(sid, folder=None):
+    """
+    Adds a follower of a log directory, starting its watcher if needed.
+
+    :param sid: Socket.IO session id
+    :type sid: str
+    :param folder: log directory, defaults to :py:func:`log_folder`
+
+    :returns: the room to join
+    """
+    folder = os.path.realpath(folder or log_folder())
+
+    with _lock:
+        sids = _subscribers.setdefault(folder, set())
+        sids.add(sid)
+
+        follower = _followers.get(folder)
+        if follower is None or not follower.is_alive():
+            follower = _followers[folder] = LogFollower(folder)
+            follower.start()
+
+        return follower.room
+
+
+def unsubscribe(sid, folder=None):
+    """
+    Removes a follower, stopping the watcher when none are left.
+
+    :param folder: log directory, all directories if None
+    """
+    folders = [os.path.realpath(folder)] if folder else None
+
+    with _lock:
+        for name in folders or list(_subscribers):
+            sids = _subscribers.get(name)
+            if not sids:
+                continue
+
+            sids.discard(sid)
+            if not sids:
+                del _subscribers[name]
+                follower = _followers.pop(name, None)
+                if follower is not None:
+                    follower.stop()
+
+
+def stats():
+    """Returns the running followers and their subscriber counts."""
+    with _lock:
+        return [dict(f.stats(), subscribers=len(_subscribers.get(name, ()))) for name, f in _followers.items()]
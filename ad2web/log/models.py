@@ -6,8 +6,36 @@ from ..extensions import db
 
 class EventLogEntry(db.Model):
     __tablename__ = 'event_log'
+    __table_args__ = (db.Index('ix_event_log_type_timestamp', 'type', 'timestamp'),)
 
     id = Column(db.Integer, primary_key=True)
     type = Column(db.SmallInteger, nullable=False)
     timestamp = Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), index=True)
     message = Column(db.Text, nullable=False)
+    zone = Column(db.SmallInteger, nullable=True)
+    # Device id, see ad2web.devices; NULL for rows written before multiple devices.
+    device = Column(db.SmallInteger, nullable=True)
+
+
+class EventLogHourly(db.Model):
+    """
+    Event counts per hour, type and zone (-1 for events without a zone).
+    """
+    __tablename__ = 'event_log_hourly'
+
+    period = Column(db.DateTime, primary_key=True)
+    type = Column(db.SmallInteger, primary_key=True)
+    zone = Column(db.SmallInteger, primary_key=True, default=-1)
+    count = Column(db.Integer, nullable=False, default=0)
+
+
+class EventLogDaily(db.Model):
+    """
+    Event counts per day, type and zone (-1 for events without a zone).
+    """
+    __tablename__ = 'event_log_daily'
+
+    period = Column(db.DateTime, primary_key=True)
+    type = Column(db.SmallInteger, primary_key=True)
+    zone = Column(db.SmallInteger, primary_key=True, default=-1)
+    count = Column(db.Integer, nullable=False, default=0)
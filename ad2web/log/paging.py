@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+"""
+Keyset (seek) pagination over the event log.
+
+Pages are ordered newest first on ``(timestamp, id)`` and continued from an
+opaque cursor token holding the last row of the previous page, so fetching
+page 5000 costs the same as page 1.  Total counts come from
+:py:class:`EventLogCounter`, which counts once and then follows inserts and
+deletes through mapper events instead of re-running ``COUNT(*)`` per request.
+Searches go through :py:mod:`.search`.
+
+The ``timestamp`` index covers the ordering on SQLite because the integer
+primary key is the rowid and is stored in every index entry.  Cursors carry
+the timestamp exactly as stored: rows written by ``CURRENT_TIMESTAMP`` and by
+SQLAlchemy use different text formats, and comparing against a re-rendered
+datetime would skip or repeat rows.
+"""
+
+import json
+import base64
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import and_, or_, event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from .constants import EVENT_TYPES
+from .models import EventLogEntry
+from . import search
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 500
+
+# Timestamp as stored, without the DateTime type's bind/result processing.
+_raw_timestamp = db.cast(EventLogEntry.timestamp, db.String)
+
+
+def encode_cursor(raw_timestamp, id):
+    """
+    Builds the cursor token for an event log row.
+
+    :param raw_timestamp: the row's timestamp as stored
+    :type raw_timestamp: str
+    :param id: the row's id
+    :type id: int
+
+    :returns: URL safe token
+    """
+    payload = json.dumps([raw_timestamp, id])
+
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Parses a cursor token.
+
+    :param token: token from :py:func:`encode_cursor`
+    :type token: str
+
+    :returns: ``(timestamp, id)``
+    :raises ValueError: if the token is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, id = json.loads(payload.decode('utf-8'))
+        if not isinstance(timestamp, str):
+            raise TypeError('timestamp is not a string')
+
+        return timestamp, int(id)
+    except (TypeError, ValueError, UnicodeDecodeError) as err:
+        raise ValueError('Invalid cursor: {0}'.format(err))
+
+
+def _older_than(token):
+    timestamp, id = decode_cursor(token)
+    timestamp = db.literal(timestamp, db.String)
+
+    return or_(EventLogEntry.timestamp < timestamp,
+               and_(EventLogEntry.timestamp == timestamp, EventLogEntry.id < id))
+
+
+def _newer_than(token):
+    timestamp, id = decode_cursor(token)
+    timestamp = db.literal(timestamp, db.String)
+
+    return or_(EventLogEntry.timestamp > timestamp,
+               and_(EventLogEntry.timestamp == timestamp, EventLogEntry.id > id))
+
+
+class EventLogCounter(object):
+    """
+    Cached total and per-filter row counts for the event log.
+    """
+    MAX_FILTERS = 32
+
+    def __init__(self):
+        self._total = None
+        self._filtered = OrderedDict()
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def total(self):
+        with self._lock:
+            self._check_engine()
+            if self._total is None:
+                self._total = EventLogEntry.query.count()
+
+            return self._total
+
+    def filtered(self, filter):
+        """
+        Returns the number of rows matching the search ``filter``.
+        """
+        criterion = search.message_filter(filter)
+        if criterion is None:
+            return self.total()
+
+        key = filter.lower()
+        with self._lock:
+            self._check_engine()
+
+            cached = self._filtered.get(key)
+            if cached is None:
+                # Only FTS matching can be mirrored by search.matches();
+                # LIKE counts are recounted after writes instead.
+                terms = search.parse(filter) if search.available() else None
+                cached = [EventLogEntry.query.filter(criterion).count(), terms]
+                self._filtered[key] = cached
+                while len(self._filtered) > self.MAX_FILTERS:
+                    self._filtered.popitem(last=False)
+            else:
+                self._filtered.move_to_end(key)
+
+            return cached[0]
+
+    def added(self, message, delta=1):
+        """
+        Follows a row inserted (or, with ``delta=-1``, deleted) with ``message``.
+        """
+        with self._lock:
+            if self._total is not None:
+                self._total += delta
+
+            for key, cached in list(self._filtered.items()):
+                if cached[1] is None:
+                    del self._filtered[key]
+                elif search.matches(cached[1], message):
+                    cached[0] += delta
+
+    def invalidate(self):
+        """
+        Drops the cached counts; needed after bulk deletes, which bypass
+        the mapper events.
+        """
+        with self._lock:
+            self._total = None
+            self._filtered.clear()
+
+    def _check_engine(self):
+        engine = db.engine
+        if self._engine is not engine:
+            self._total = None
+            self._filtered.clear()
+            self._engine = engine
+
+
+counter = EventLogCounter()
+
+
+@event.listens_for(EventLogEntry, 'after_insert')
+def _count_insert(mapper, connection, target):
+    counter.added(target.message)
+
+
+@event.listens_for(EventLogEntry, 'after_delete')
+def _count_delete(mapper, connection, target):
+    counter.added(target.message, -1)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _invalidate_counts(session):
+    counter.invalidate()
+
+
+def fetch_page(limit=DEFAULT_PAGE_SIZE, cursor=None, before=None, filter=None, offset=None):
+    """
+    Fetches one page of the event log, newest first.
+
+    :param limit: rows per page
+    :type limit: int
+    :param cursor: continue after this token (older rows)
+    :type cursor: str
+    :param before: continue before this token (newer rows)
+    :type before: str
+    :param filter: search text, see :py:mod:`.search`
+    :type filter: str
+    :param offset: legacy row offset, used only without a cursor
+    :type offset: int
+
+    :returns: dict with ``events``, ``next``, ``prev``, ``total`` and ``filtered``
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+    query = db.session.query(EventLogEntry, _raw_timestamp)
+    criterion = search.message_filter(filter)
+    if criterion is not None:
+        query = query.filter(criterion)
+
+    newest_first = (EventLogEntry.timestamp.desc(), EventLogEntry.id.desc())
+
+    if before:
+        rows = query.filter(_newer_than(before)) \
+                    .order_by(EventLogEntry.timestamp.asc(), EventLogEntry.id.asc()) \
+                    .limit(limit + 1).all()
+        has_more_newer = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_more_older = True
+    else:
+        query = query.order_by(*newest_first)
+        if cursor:
+            query = query.filter(_older_than(cursor))
+        elif offset:
+            query = query.offset(offset)
+
+        rows = query.limit(limit + 1).all()
+        has_more_older = len(rows) > limit
+        rows = rows[:limit]
+        has_more_newer = bool(cursor or offset)
+
+    return {
+        'events': [{
+            'id': row.id,
+            'timestamp': str(row.timestamp),
+            'type': row.type,
+            'type_name': EVENT_TYPES.get(row.type, str(row.type)),
+            'message': row.message,
+            'device': row.device,
+        } for row, raw_timestamp in rows],
+        'next': encode_cursor(rows[-1][1], rows[-1][0].id) if rows and has_more_older else None,
+        'prev': encode_cursor(rows[0][1], rows[0][0].id) if rows and has_more_newer else None,
+        'total': counter.total(),
+        'filtered': counter.filtered(filter),
+    }
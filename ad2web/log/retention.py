@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per event type retention for the event log.
+
+Each event type is kept for the number of days in
+:py:data:`~ad2web.log.constants.EVENT_RETENTION_DAYS` (or
+``DEFAULT_RETENTION_DAYS``), overridable with the ``event_log_retention``
+setting.  :py:class:`EventLogMaintenance` expires old rows in the background
+in small batches, each its own short transaction with a pause in between,
+so the event log writer and page requests never wait long on the SQLite
+write lock.  Counts for expired rows live on in the rollups.
+"""
+
+import json
+import time
+import logging
+import datetime
+import threading
+
+from sqlalchemy import select
+
+from ..extensions import db
+from ..settings.models import Setting
+from .constants import EVENT_TYPES, EVENT_RETENTION_DAYS, DEFAULT_RETENTION_DAYS
+from .models import EventLogEntry
+from .paging import counter
+from . import rollup
+
+logger = logging.getLogger(__name__)
+
+_TYPES_BY_NAME = dict((name, type) for type, name in EVENT_TYPES.items())
+
+
+def policies():
+    """
+    Returns the retention in days for every event type, None meaning forever.
+
+    :returns: dict keyed by event type
+    """
+    retention = dict((type, EVENT_RETENTION_DAYS.get(type, DEFAULT_RETENTION_DAYS)) for type in EVENT_TYPES)
+
+    overrides = Setting.get_many(['event_log_retention']).get('event_log_retention')
+    if overrides:
+        try:
+            if isinstance(overrides, str):
+                overrides = json.loads(overrides)
+
+            for key, days in overrides.items():
+                type = _TYPES_BY_NAME.get(key.upper(), None) if not key.isdigit() else int(key)
+                if type is None:
+                    logger.warning('Unknown event type in event_log_retention: {0}'.format(key))
+                    continue
+
+                retention[type] = int(days) if days is not None else None
+        except (ValueError, TypeError, AttributeError) as err:
+            logger.error('Invalid event_log_retention setting: {0}'.format(err))
+
+    return retention
+
+
+def expire_batch(type, cutoff, batch_size):
+    """
+    Deletes up to ``batch_size`` rows of one type older than ``cutoff`` in
+    its own transaction.
+
+    :param type: event type
+    :type type: int
+    :param cutoff: rows before this are deleted
+    :type cutoff: datetime
+    :param batch_size: maximum rows deleted
+    :type batch_size: int
+
+    :returns: number of rows deleted
+    """
+    table = EventLogEntry.__table__
+    # Compare as text like the pager does: stored timestamps come in two formats.
+    cutoff = db.literal(cutoff.strftime('%Y-%m-%d %H:%M:%S'), db.String)
+
+    oldest = select(table.c.id) \
+                .where(table.c.type == type, table.c.timestamp < cutoff) \
+                .limit(batch_size)
+
+    with db.engine.begin() as connection:
+        return connection.execute(table.delete().where(table.c.id.in_(oldest))).rowcount
+
+
+class EventLogMaintenance(threading.Thread):
+    """
+    Background job that expires event log rows and prunes hourly rollups.
+    """
+    INTERVAL = 600
+    BATCH_SIZE = 500
+    BATCH_PAUSE = 0.1
+    MAX_BATCHES = 200
+
+    def __init__(self, app, interval=None, batch_size=None, batch_pause=None, max_batches=None):
+        """
+        Constructor
+
+        :param app: application whose event log is maintained
+        :type app: :py:class:`flask.Flask`
+        :param interval: seconds between passes
+        :type interval: float
+        :param batch_size: rows deleted per transaction
+        :type batch_size: int
+        :param batch_pause: seconds slept between batches
+        :type batch_pause: float
+        :param max_batches: batches per pass, the rest waits for the next pass
+        :type max_batches: int
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.app = app
+        self.interval = interval or self.INTERVAL
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.batch_pause = self.BATCH_PAUSE if batch_pause is None else batch_pause
+        self.max_batches = max_batches or self.MAX_BATCHES
+        self._stopped = threading.Event()
+
+        self.passes = 0
+        self.expired = {}
+        self.pruned = 0
+        self.errors = 0
+        self.last_run = None
+        self.last_duration = None
+
+    def stats(self):
+        """
+        Returns the expiry counters.
+
+        :returns: dict
+        """
+        return {
+            'passes': self.passes,
+            'expired': dict((EVENT_TYPES.get(t, str(t)), n) for t, n in self.expired.items()),
+            'pruned_rollups': self.pruned,
+            'errors': self.errors,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+        }
+
+    def run_once(self, now=None):
+        """
+        Runs one maintenance pass.
+
+        :param now: current time, for tests
+        :type now: datetime
+
+        :returns: number of event log rows deleted
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        started = time.time()
+        deleted = 0
+        batches = 0
+
+        with self.app.app_context():
+            try:
+                for type, days in sorted(policies().items()):
+                    if days is None:
+                        continue
+
+                    cutoff = now - datetime.timedelta(days=days)
+                    while batches < self.max_batches and not self._stopped.is_set():
+                        count = expire_batch(type, cutoff, self.batch_size)
+                        batches += 1
+                        if count:
+                            deleted += count
+                            self.expired[type] = self.expired.get(type, 0) + count
+                        if count < self.batch_size:
+                            break
+
+                        # Let the writer and readers in between batches.
+                        self._stopped.wait(self.batch_pause)
+
+                with db.engine.begin() as connection:
+                    self.pruned += rollup.prune(connection, now)
+            except Exception as err:
+                self.errors += 1
+                logger.error('Error expiring event log rows: {0}'.format(err), exc_info=True)
+            finally:
+                if deleted:
+                    counter.invalidate()
+
+        self.passes += 1
+        self.last_run = time.time()
+        self.last_duration = self.last_run - started
+
+        return deleted
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hourly and daily event counts.
+
+``event_log_hourly`` and ``event_log_daily`` hold the number of events per
+period, type and zone.  The event log writer adds every batch to them in the
+same transaction as the rows themselves, so history charts read a few
+hundred rollup rows instead of scanning the log, and the counts survive
+retention expiry of the raw rows.
+"""
+
+import datetime
+from collections import Counter
+
+from sqlalchemy import select, and_, func
+
+from ..extensions import db
+from .constants import EVENT_TYPES, HOURLY_ROLLUP_RETENTION_DAYS
+from .models import EventLogEntry, EventLogHourly, EventLogDaily
+
+# Zone recorded for events that are not about a zone.
+NO_ZONE = -1
+
+# Rows read per chunk by rebuild().
+REBUILD_CHUNK = 10000
+
+PERIODS = {
+    'hour': EventLogHourly,
+    'day': EventLogDaily,
+}
+
+
+def _hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Truncation and length of each period.
+STEPS = {
+    'hour': (_hour, datetime.timedelta(hours=1)),
+    'day': (_day, datetime.timedelta(days=1)),
+}
+
+
+def record(connection, rows):
+    """
+    Adds event log rows to the rollups.
+
+    :param connection: SQLAlchemy connection, inside the transaction that
+                       wrote the rows
+    :param rows: dicts with ``type``, ``timestamp`` (datetime) and ``zone``
+    :type rows: list
+    """
+    hourly = Counter()
+    daily = Counter()
+    for row in rows:
+        zone = row.get('zone')
+        key = (row['type'], NO_ZONE if zone is None else zone)
+
+        hourly[(_hour(row['timestamp']),) + key] += 1
+        daily[(_day(row['timestamp']),) + key] += 1
+
+    for model, counts in ((EventLogHourly, hourly), (EventLogDaily, daily)):
+        table = model.__table__
+
+        for (period, type, zone), count in counts.items():
+            match = and_(table.c.period == period, table.c.type == type, table.c.zone == zone)
+
+            result = connection.execute(table.update().where(match).values(count=table.c.count + count))
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(period=period, type=type, zone=zone, count=count))
+
+
+def rebuild(connection, chunk=REBUILD_CHUNK):
+    """
+    Recomputes both rollups from the rows currently in the event log.
+
+    :returns: number of event log rows counted
+    """
+    connection.execute(EventLogHourly.__table__.delete())
+    connection.execute(EventLogDaily.__table__.delete())
+
+    table = EventLogEntry.__table__
+    counted = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.type, table.c.timestamp, table.c.zone)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(chunk)).all()
+        if not rows:
+            return counted
+
+        record(connection, [row._asdict() for row in rows if row.timestamp is not None])
+        counted += len(rows)
+        last_id = rows[-1].id
+
+
+def prune(connection, now=None):
+    """
+    Drops hourly rollups older than ``HOURLY_ROLLUP_RETENTION_DAYS``.
+
+    :returns: number of rows removed
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    cutoff = _day(now - datetime.timedelta(days=HOURLY_ROLLUP_RETENTION_DAYS))
+    table = EventLogHourly.__table__
+
+    return connection.execute(table.delete().where(table.c.period < cutoff)).rowcount
+
+
+def clear(connection):
+    """
+    Empties both rollups, used when the whole event log is deleted.
+    """
+    connection.execute(EventLogHourly.__table__.delete())
+    connection.execute(EventLogDaily.__table__.delete())
+
+
+def coverage(period, since=None, until=None):
+    """
+    Finds the whole periods in ``[since, until)`` that a rollup holds counts
+    for: from its oldest period (hourly rows are pruned) to the end of its
+    newest one.
+
+    :param period: ``'hour'`` or ``'day'``
+    :type period: str
+    :param since: first timestamp of interest
+    :type since: datetime
+    :param until: first timestamp not of interest
+    :type until: datetime
+
+    :returns: ``(start, end)`` datetimes, or None if nothing is covered
+    """
+    model = PERIODS[period]
+    truncate, step = STEPS[period]
+
+    start, end = db.session.query(func.min(model.period), func.max(model.period)).one()
+    if start is None:
+        return None
+
+    end += step
+    if since is not None:
+        first = truncate(since)
+        start = max(start, first if first == since else first + step)
+    if until is not None:
+        end = min(end, truncate(until))
+
+    return (start, end) if start < end else None
+
+
+def history(period='day', since=None, until=None, types=None, zone=None):
+    """
+    Reads event counts from a rollup.
+
+    :param period: ``'hour'`` or ``'day'``
+    :type period: str
+    :param since: first period to include
+    :type since: datetime
+    :param until: periods before this are included
+    :type until: datetime
+    :param types: event types to include, all if None
+    :type types: list
+    :param zone: only events for this zone
+    :type zone: int
+
+    :returns: list of dicts with ``period``, ``type``, ``type_name``, ``zone``
+              and ``count``, oldest first
+    :raises ValueError: if the period is unknown
+    """
+    model = PERIODS.get(period)
+    if model is None:
+        raise ValueError('Unknown period: {0}'.format(period))
+
+    query = db.session.query(model)
+    if since is not None:
+        query = query.filter(model.period >= since)
+    if until is not None:
+        query = query.filter(model.period < until)
+    if types:
+        query = query.filter(model.type.in_(types))
+    if zone is not None:
+        query = query.filter(model.zone == zone)
+
+    return [{
+        'period': row.period.isoformat(),
+        'type': row.type,
+        'type_name': EVENT_TYPES.get(row.type, str(row.type)),
+        'zone': None if row.zone == NO_ZONE else row.zone,
+        'count': row.count,
+    } for row in query.order_by(model.period, model.type, model.zone)]
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+Full-text search over event log messages.
+
+On SQLite an FTS5 table, ``event_log_fts``, indexes ``event_log.message``
+as external content.  Triggers keep it in sync with every insert, update and
+delete, including the bulk paths that bypass the ORM.  The table is created
+with ``event_log`` by ``db.create_all()`` and by an alembic migration for
+existing databases.
+
+Search text is translated into an FTS5 query:
+
+* ``front door``     both words, each as a prefix (``front* AND door*``)
+* ``"front door"``   the exact phrase
+* ``fron*``          explicit prefix
+* ``zone:3``         the name of zone 3 as a phrase, ``zone:"back door"``
+                     or ``zone:garage`` for a name
+
+Without FTS5 the same terms fall back to ``LIKE`` matching.
+"""
+
+import re
+import threading
+
+from sqlalchemy import event, text, and_
+
+from ..extensions import db
+from .models import EventLogEntry
+
+FTS_TABLE = 'event_log_fts'
+
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS event_log_fts USING fts5("
+    "message, content='event_log', content_rowid='id', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_insert AFTER INSERT ON event_log BEGIN "
+    "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END",
+
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_delete AFTER DELETE ON event_log BEGIN "
+    "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_update AFTER UPDATE OF message ON event_log BEGIN "
+    "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+    "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END",
+)
+
+FTS_DROP = (
+    "DROP TRIGGER IF EXISTS event_log_fts_update",
+    "DROP TRIGGER IF EXISTS event_log_fts_delete",
+    "DROP TRIGGER IF EXISTS event_log_fts_insert",
+    "DROP TABLE IF EXISTS event_log_fts",
+)
+
+# Rows indexed per statement when building the index for existing rows.
+BACKFILL_CHUNK = 10000
+
+_TERM_RE = re.compile(r'(zone:)?(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = {}
+_lock = threading.Lock()
+
+
+def backfill(connection, chunk=BACKFILL_CHUNK, up_to=None):
+    """
+    Indexes existing ``event_log`` rows in chunks of ``chunk`` rows.
+
+    :param connection: SQLAlchemy connection
+    :param chunk: rows per statement
+    :type chunk: int
+    :param up_to: highest id to index, defaults to the current maximum
+    :type up_to: int
+
+    :returns: number of rows indexed
+    """
+    if up_to is None:
+        up_to = connection.execute(text("SELECT MAX(id) FROM event_log")).scalar() or 0
+
+    indexed = 0
+    last_id = 0
+    while last_id < up_to:
+        next_id = connection.execute(text(
+            "SELECT MAX(id) FROM (SELECT id FROM event_log WHERE id > :last AND id <= :up_to ORDER BY id LIMIT :chunk)"),
+            {'last': last_id, 'up_to': up_to, 'chunk': chunk}).scalar()
+        if next_id is None:
+            break
+
+        result = connection.execute(text(
+            "INSERT INTO event_log_fts(rowid, message) SELECT id, message FROM event_log WHERE id > :last AND id <= :next"),
+            {'last': last_id, 'next': next_id})
+        indexed += result.rowcount
+        last_id = next_id
+
+    return indexed
+
+
+def create_index(connection):
+    """
+    Creates the FTS table and triggers if this is SQLite with FTS5, and
+    indexes any rows already present.
+
+    :returns: True if the index exists afterwards
+    """
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {'name': FTS_TABLE}).scalar()
+    if exists:
+        return True
+
+    try:
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+    except Exception:
+        # SQLite built without FTS5.
+        return False
+
+    backfill(connection)
+
+    return True
+
+
+@event.listens_for(EventLogEntry.__table__, 'after_create')
+def _create_index(target, connection, **kw):
+    create_index(connection)
+    _available.clear()
+
+
+def available():
+    """
+    Returns True if the current database has the FTS index.
+    """
+    engine = db.engine
+
+    with _lock:
+        found = _available.get(engine)
+        if found is None:
+            found = False
+            if engine.dialect.name == 'sqlite':
+                found = bool(db.session.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"), {'name': FTS_TABLE}).scalar())
+
+            _available[engine] = found
+
+        return found
+
+
+def parse(search):
+    """
+    Splits search text into terms.
+
+    :param search: text typed into the search box
+    :type search: str
+
+    :returns: list of ``(kind, value)`` with kind ``'prefix'`` or ``'phrase'``
+    """
+    terms = []
+    for zone, quoted, word in _TERM_RE.findall(search or ''):
+        if zone:
+            name = quoted or word
+            if name.isdigit():
+                from ..zones import Zone
+                name = Zone.get_name(int(name)) or 'zone {0}'.format(name)
+
+            terms.append(('phrase', name))
+        elif quoted:
+            terms.append(('phrase', quoted))
+        elif word:
+            terms.append(('prefix', word.rstrip('*')))
+
+    return [(kind, value) for kind, value in terms if _TOKEN_RE.search(value)]
+
+
+def match_expression(terms):
+    """
+    Builds an FTS5 MATCH expression.  Every term is quoted so user input can
+    never be read as FTS5 syntax.
+    """
+    parts = []
+    for kind, value in terms:
+        quoted = '"{0}"'.format(' '.join(_TOKEN_RE.findall(value)))
+        parts.append(quoted + '*' if kind == 'prefix' else quoted)
+
+    return ' AND '.join(parts)
+
+
+def matches(terms, message):
+    """
+    Python version of the FTS match, used to keep cached counts current.
+    The ``LIKE`` fallback matches substrings instead, so it has no
+    equivalent here.
+    """
+    tokens = [t.lower() for t in _TOKEN_RE.findall(message or '')]
+
+    for kind, value in terms:
+        words = [t.lower() for t in _TOKEN_RE.findall(value)]
+        n = len(words)
+
+        for i in range(len(tokens) - n + 1):
+            if tokens[i:i + n - 1] == words[:-1] and \
+                    (tokens[i + n - 1].startswith(words[-1]) if kind == 'prefix' else tokens[i + n - 1] == words[-1]):
+                break
+        else:
+            return False
+
+    return True
+
+
+def message_filter(search):
+    """
+    Returns the SQL criterion for a search, or None if it has no terms.
+
+    :param search: text typed into the search box
+    :type search: str
+    """
+    terms = parse(search)
+    if not terms:
+        return None
+
+    if available():
+        fts = text("SELECT rowid FROM event_log_fts WHERE event_log_fts MATCH :match") \
+                .bindparams(match=match_expression(terms)) \
+                .columns(rowid=db.Integer)
+
+        return EventLogEntry.id.in_(fts)
+
+    return and_(*[EventLogEntry.message.like('%' + value + '%') for kind, value in terms])
@@ -1,9 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import os
-import cgi
 
-from flask import Blueprint, render_template, request, url_for, redirect
+from flask import Blueprint, render_template, request, url_for, redirect, jsonify, Response, stream_with_context
 from flask import current_app as APP
 from flask_login import login_required
 
@@ -13,10 +12,13 @@ from .constants import ARM, DISARM, POWER_CHANGED, ALARM, FIRE, BYPASS, BOOT, \
                         CONFIG_RECEIVED, ZONE_FAULT, ZONE_RESTORE, LOW_BATTERY, \
                         PANIC, EVENT_TYPES, LRR, READY, RFX, EXP, AUI
 from .models import EventLogEntry
+from .paging import fetch_page, counter, DEFAULT_PAGE_SIZE
+from . import rollup, analytics, follow
 from ..logwatch import LogWatcher
-from ..utils import INSTANCE_FOLDER_PATH
+from .. import logstore
 
 import json
+import datetime
 import collections
 
 log = Blueprint('log', __name__, url_prefix='/log')
@@ -63,7 +65,9 @@ def live():
 @admin_required
 def delete():
     events = EventLogEntry.query.delete()
+    rollup.clear(db.session.connection())
     db.session.commit()
+    counter.invalidate()
     return redirect(url_for('log.events'))
 
 @log.route('/alarmdecoder')
@@ -76,7 +80,7 @@ def alarmdecoder_logfile():
 @login_required
 @admin_required
 def get_log_data(lines):
-    log_file = os.path.join(INSTANCE_FOLDER_PATH, 'logs', 'info.log')
+    log_file = os.path.join(follow.log_folder(), 'info.log')
 
     try:
         log_text = LogWatcher.tail(log_file, lines)
@@ -85,6 +89,111 @@ def get_log_data(lines):
 
     return json.dumps(log_text)
 
+@log.route('/alarmdecoder/records', methods=['GET'])
+@login_required
+@admin_required
+def get_log_records():
+    """
+    Structured application log records, newest first.  Accepts ISO
+    ``since``/``until``, a minimum ``level``, a ``logger`` name (children
+    included), ``q`` message text and ``limit``.
+    """
+    folder = os.path.join(APP.config.get('LOG_FOLDER', follow.log_folder()), 'records')
+
+    try:
+        since, until = _time_bounds()
+        result = logstore.query(folder, since=since, until=until,
+                                level=request.args.get('level') or None,
+                                logger=request.args.get('logger') or None,
+                                text=request.args.get('q') or None,
+                                limit=max(1, min(request.args.get('limit', 200, type=int), 2000)))
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+
+    return jsonify(result)
+
+@log.route('/events/page')
+@login_required
+def events_page():
+    """
+    Keyset paginated event log.  Pass ``next`` or ``prev`` from a previous
+    response as ``cursor`` or ``before`` to move through the log.
+    """
+    try:
+        page = fetch_page(limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                          cursor=request.args.get('cursor'),
+                          before=request.args.get('before'),
+                          filter=request.args.get('filter') or None)
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+
+    return jsonify(page)
+
+@log.route('/events/history')
+@login_required
+def events_history():
+    """
+    Event counts per hour or day from the rollup tables.  Accepts ``period``
+    (``hour`` or ``day``), ``days`` of history, repeated ``type`` and ``zone``.
+    """
+    days = request.args.get('days', 30, type=int)
+    since = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - datetime.timedelta(days=days)
+
+    try:
+        counts = rollup.history(period=request.args.get('period', 'day'),
+                                since=since,
+                                types=request.args.getlist('type', type=int),
+                                zone=request.args.get('zone', type=int))
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+
+    return jsonify(counts)
+
+def _time_bounds():
+    since = request.args.get('since')
+    until = request.args.get('until')
+
+    return (datetime.datetime.fromisoformat(since) if since else None,
+            datetime.datetime.fromisoformat(until) if until else None)
+
+@log.route('/events/export')
+@login_required
+@admin_required
+def events_export():
+    """
+    Streams the event log as Arrow IPC, Parquet or npz, see
+    :py:mod:`.analytics`.  Accepts ``format``, ISO ``since``/``until`` and
+    repeated ``type``.
+    """
+    format = request.args.get('format', 'arrow')
+
+    try:
+        since, until = _time_bounds()
+        chunks = analytics.export(format, since, until, types=request.args.getlist('type', type=int))
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+
+    return Response(stream_with_context(chunks), mimetype=analytics.FORMATS[format],
+                    headers={'Content-Disposition': 'attachment; filename=event_log.{0}'.format(format)})
+
+@log.route('/events/analytics/<name>')
+@login_required
+def events_analytics(name):
+    """
+    Aggregates over the event log: ``zone_faults``, ``arm_timeline`` or
+    ``alarm_counts``, bounded by ISO ``since``/``until``.
+    """
+    aggregate = analytics.AGGREGATES.get(name)
+    if aggregate is None:
+        return jsonify(error='Unknown aggregate: {0}'.format(name)), 404
+
+    try:
+        since, until = _time_bounds()
+    except ValueError as err:
+        return jsonify(error=str(err)), 400
+
+    return jsonify(aggregate(since, until))
+
 #XHR for retrieving event log data server side
 @log.route('/retrieve_events_paging_data')
 @login_required
@@ -94,16 +203,24 @@ def get_events_paging_data():
     try:
         #get results from datatable via XHR
         results = DataTablesServer(request).output_result()
-    except TypeError as ex:
+    except (TypeError, ValueError, KeyError) as ex:
         APP.logger.warning("Error processing datatables request: {0}".format(ex))
 
     return json.dumps(results)
 
 class DataTablesServer:
+    """
+    Compatibility shim translating DataTables requests onto :py:func:`fetch_page`.
+
+    DataTables pages by row offset.  The client sends back the ``sCursor``
+    returned with the previous page so sequential paging uses the keyset
+    query; jumps to arbitrary pages fall back to an offset.
+    """
     def __init__( self, request ):
         #values specified by datatable for filtering, sorting, paging etc
         self.request_values = request.values
         self.result_data = None
+        self.next_cursor = None
 
         #total in table unfiltered
         self.cardinality = 0
@@ -114,18 +231,19 @@ class DataTablesServer:
 
     def output_result(self):
         output = {}
-        output['sEcho'] = cgi.escape(str(int(self.request_values['sEcho'])))
+        output['sEcho'] = str(int(self.request_values['sEcho']))
         output['iTotalRecords'] = int(self.cardinality)
-        output['iTotalDisplayRecords'] = int(self.cardinality)
+        output['iTotalDisplayRecords'] = int(self.cardinality_filtered)
+        output['sCursor'] = self.next_cursor
 
         aaData_rows = []
 
         #iterate the result and append data rows
         for row in self.result_data:
             aaData_row = []
-            aaData_row.append(str(row.timestamp))
-            aaData_row.append(EVENT_TYPES[row.type])
-            aaData_row.append(row.message)
+            aaData_row.append(row['timestamp'])
+            aaData_row.append(row['type_name'])
+            aaData_row.append(row['message'])
 
             aaData_rows.append(aaData_row)
 
@@ -139,7 +257,7 @@ class DataTablesServer:
         #page to start on
         start = 0
         #number of records to return
-        limit = 10
+        limit = DEFAULT_PAGE_SIZE
 
         #non-default values chosen from the UI
         if pages.start is not None:
@@ -147,38 +265,33 @@ class DataTablesServer:
         if pages.length is not None:
             limit = pages.length
 
-        #if filtered, cardinality based off filter, otherwise all rows
-        if filter is not None:
-            try:
-                self.result_data = EventLogEntry.query.filter(EventLogEntry.message.like('%' + filter + '%')).order_by(EventLogEntry.timestamp.desc()).limit(limit).offset(start)
-                self.cardinality_filtered = self.result_data.count()
-                self.cardinality = EventLogEntry.query.filter(EventLogEntry.message.like('%' + filter + '%')).count()
-            except Exception:
-                pass
-        else:
-            try:
-                self.result_data = EventLogEntry.query.order_by(EventLogEntry.timestamp.desc()).limit(limit).offset(start)
-                self.cardinality_filtered = self.result_data.count()
-                self.cardinality = EventLogEntry.query.order_by(EventLogEntry.timestamp.desc()).count()
-            except Exception:
-                pass
+        cursor = self.request_values.get('sCursor') or None
+
+        try:
+            page = fetch_page(limit=limit, cursor=cursor, filter=filter, offset=None if cursor else start)
+        except ValueError:
+            # Stale or mangled cursor; the offset is still valid.
+            page = fetch_page(limit=limit, filter=filter, offset=start)
+
+        self.result_data = page['events']
+        self.next_cursor = page['next']
+        self.cardinality = page['total']
+        self.cardinality_filtered = page['filtered']
 
     #here we determine the filter value for the search box and apply to the queries
     def filtering(self):
         filter = None
-        if( self.request_values.has_key('sSearch')) and (self.request_values['sSearch'] != "" ):
-            filter = cgi.escape(str(self.request_values['sSearch']))
+        if ('sSearch' in self.request_values) and (self.request_values['sSearch'] != "" ):
+            filter = str(self.request_values['sSearch'])
 
         return filter
 
     #determine what page we're on, as well as how many to show per page
     def paging(self):
-        pages = collections.namedtuple('pages', ['start', 'length'])
-        if( self.request_values['iDisplayStart'] != "" ) and (self.request_values['iDisplayLength'] != -1 ):
-            if self.request_values['iDisplayStart'].isdigit() is False or self.request_values['iDisplayLength'].isdigit() is False:
-                return pages
-
-            pages.start = int(cgi.escape(self.request_values['iDisplayStart']))
-            pages.length = int(cgi.escape(self.request_values['iDisplayLength']))
+        pages = collections.namedtuple('pages', ['start', 'length'])(None, None)
+        start = self.request_values.get('iDisplayStart', '')
+        length = self.request_values.get('iDisplayLength', '')
+        if start.isdigit() and length.isdigit():
+            pages = pages._replace(start=int(start), length=int(length))
 
         return pages
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+"""
+Batched, asynchronous event log writer.
+
+:py:class:`~ad2web.notifications.types.LogNotification` runs on the
+alarmdecoder reader thread.  Instead of opening a transaction per event, it
+hands rows to this writer, which inserts them in batches with a single
+``executemany`` per transaction once ``batch_size`` rows are pending or
+``flush_interval`` seconds have passed since the first of them was queued.
+An arming burst of zone and keypad events therefore costs one commit and
+never blocks serial reading.
+
+Rows for urgent events (``ALARM``, ``FIRE`` and ``PANIC``) wake the writer
+at once and are committed without waiting for the window, together with
+anything queued before them.  Timestamps are taken when the row is queued,
+not when it is written.  Each batch is added to the hourly and daily
+rollups (:py:mod:`.rollup`) in the same transaction.
+
+Each :py:class:`~ad2web.decoder.Decoder` owns one writer and starts and stops
+it with its other threads.
+"""
+
+import time
+import logging
+import datetime
+import threading
+from collections import deque
+
+from ..extensions import db
+from ..devices import PRIMARY_DEVICE
+from .constants import ALARM, FIRE, PANIC
+from .models import EventLogEntry
+from .paging import counter
+from . import rollup
+
+logger = logging.getLogger(__name__)
+
+# Event types written without waiting for the batch window.
+URGENT_EVENTS = (ALARM, FIRE, PANIC)
+
+# Upper bounds (rows) of the batch size histogram buckets.
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500)
+
+
+class EventLogWriter(threading.Thread):
+    """
+    Bounded event log queue drained in batches by its own writer thread.
+    """
+    MAX_DEPTH = 10000
+    BATCH_SIZE = 100
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, app=None, max_depth=None, batch_size=None, flush_interval=None):
+        """
+        Constructor
+
+        :param app: application whose database is written, see :py:meth:`init_app`
+        :type app: :py:class:`flask.Flask`
+        :param max_depth: maximum number of rows held at once
+        :type max_depth: int
+        :param batch_size: rows that trigger a flush before the window closes
+        :type batch_size: int
+        :param flush_interval: maximum seconds a row waits before it is written
+        :type flush_interval: float
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.app = app
+        self.max_depth = max_depth or self.MAX_DEPTH
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.flush_interval = self.FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._running = False
+        self._urgent = False
+        self._first_queued = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.flush_time_sum = 0.0
+        self.flush_time_max = 0.0
+        self.last_flush_time = 0.0
+        self.max_depth_seen = 0
+        self._batch_histogram = [0] * (len(BATCH_BUCKETS) + 1)
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        """
+        Returns the queue depth, batch size and flush latency counters.
+
+        :returns: dict
+        """
+        with self._cond:
+            batches = self.batches
+
+            return {
+                'depth': self.depth,
+                'max_depth': self.max_depth,
+                'max_depth_seen': self.max_depth_seen,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'batches': batches,
+                'batch_size_last': self.last_batch_size,
+                'batch_size_max': self.max_batch_size,
+                'batch_size_avg': self.written / batches if batches else None,
+                'batch_size_histogram': dict(zip([str(b) for b in BATCH_BUCKETS] + ['+Inf'], self._batch_histogram)),
+                'flush_ms_last': self.last_flush_time * 1000,
+                'flush_ms_avg': self.flush_time_sum * 1000 / batches if batches else None,
+                'flush_ms_max': self.flush_time_max * 1000,
+            }
+
+    def put(self, type, message, zone=None, device=None):
+        """
+        Queues an event log row.  Never blocks on the database.
+
+        Rows are written inline if the writer thread is not running.
+
+        :param type: event type, see :py:mod:`ad2web.log.constants`
+        :type type: int
+        :param message: event text
+        :type message: str
+        :param zone: zone the event is about, if any
+        :type zone: int
+        :param device: device the event came from, see :py:mod:`ad2web.devices`;
+                       None for the primary device
+        :type device: int
+        """
+        row = {
+            'type': type,
+            'message': message,
+            'zone': zone,
+            'device': PRIMARY_DEVICE if device is None else device,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None),
+        }
+
+        if not self._running:
+            with self._cond:
+                self.enqueued += 1
+                self._pending.append(row)
+            self.flush()
+            return
+
+        with self._cond:
+            self.enqueued += 1
+
+            if len(self._pending) >= self.max_depth and not self._drop_oldest():
+                if type not in URGENT_EVENTS:
+                    self.dropped += 1
+                    return
+
+            if not self._pending:
+                self._first_queued = time.time()
+
+            self._pending.append(row)
+            self.max_depth_seen = max(self.max_depth_seen, len(self._pending))
+
+            if type in URGENT_EVENTS:
+                self._urgent = True
+                self._cond.notify()
+            elif len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """
+        Writes everything currently pending in batches of ``batch_size``.
+
+        :returns: number of rows written
+        """
+        written = 0
+
+        # Serialize flushes so rows are committed in the order they were queued.
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                    self._urgent = False
+                    self._first_queued = time.time() if self._pending else None
+
+                if not batch:
+                    return written
+
+                written += self._write(batch)
+
+    def start(self):
+        # Set before the thread runs so rows queued in between are batched
+        # rather than written inline by put().
+        self._running = True
+        threading.Thread.start(self)
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+
+    def run(self):
+        while self._running:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+
+                # Let rows accumulate until the batch is full, the window
+                # closes or an urgent event arrives.
+                while self._running and not self._urgent and len(self._pending) < self.batch_size:
+                    remaining = self._first_queued + self.flush_interval - time.time()
+                    if remaining <= 0:
+                        break
+
+                    self._cond.wait(remaining)
+
+            self.flush()
+
+        # Write anything left so events are not lost on shutdown.
+        self.flush()
+
+    def _write(self, batch):
+        started = time.time()
+
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self._execute(batch)
+            else:
+                self._execute(batch)
+        except Exception as err:
+            with self._cond:
+                self.errors += 1
+            logger.error('Error writing {0} event log rows: {1}'.format(len(batch), err), exc_info=True)
+            return 0
+
+        elapsed = time.time() - started
+        with self._cond:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.last_flush_time = elapsed
+            self.flush_time_sum += elapsed
+            self.flush_time_max = max(self.flush_time_max, elapsed)
+            self._batch_histogram[_bucket(len(batch))] += 1
+
+        for row in batch:
+            counter.added(row['message'])
+
+        return len(batch)
+
+    @staticmethod
+    def _execute(batch):
+        # One transaction, one executemany; bypasses the ORM unit of work.
+        with db.engine.begin() as connection:
+            connection.execute(EventLogEntry.__table__.insert(), batch)
+            rollup.record(connection, batch)
+
+    def _drop_oldest(self):
+        for row in self._pending:
+            if row['type'] not in URGENT_EVENTS:
+                self._pending.remove(row)
+                self.dropped += 1
+                return True
+
+        return False
+
+
+def _bucket(size):
+    for i, bound in enumerate(BATCH_BUCKETS):
+        if size <= bound:
+            return i
+
+    return len(BATCH_BUCKETS)
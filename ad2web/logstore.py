@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+"""
+Structured, segmented application log store.
+
+:py:class:`SegmentedLogHandler` writes every record as one JSON line to an
+append-only segment file.  When a segment reaches ``max_bytes`` it is closed
+and a small index is written next to it (``<segment>.idx``) holding its time
+range, record count per level and the logger names seen.  :py:func:`query`
+reads the indexes first and only opens segments that can contain matching
+records; the segment still being written has no index yet and is always
+read.
+
+Segments are named ``<first record time in ms>-<sequence>.jsonl`` so the
+directory listing is in time order.  The oldest segments beyond
+``max_segments`` are removed.
+"""
+
+import os
+import json
+import logging
+import datetime
+import traceback
+
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+
+# Logger names kept per segment index before it stops narrowing queries.
+MAX_INDEXED_LOGGERS = 64
+
+LEVELS = {
+    'CRITICAL': logging.CRITICAL,
+    'ERROR': logging.ERROR,
+    'WARNING': logging.WARNING,
+    'INFO': logging.INFO,
+    'DEBUG': logging.DEBUG,
+}
+
+
+def _index_path(segment):
+    return segment[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+class _SegmentIndex(object):
+    def __init__(self, data=None):
+        data = data or {}
+        self.start = data.get('start')
+        self.end = data.get('end')
+        self.count = data.get('count', 0)
+        self.levels = data.get('levels', {})
+        loggers = data.get('loggers', [])
+        self.loggers = set(loggers) if loggers is not None else None
+
+    def add(self, record):
+        ts = record['ts']
+        self.start = ts if self.start is None else min(self.start, ts)
+        self.end = ts if self.end is None else max(self.end, ts)
+        self.count += 1
+        self.levels[record['level']] = self.levels.get(record['level'], 0) + 1
+
+        if self.loggers is not None:
+            self.loggers.add(record['logger'])
+            if len(self.loggers) > MAX_INDEXED_LOGGERS:
+                # Too many to be useful; the segment is always scanned.
+                self.loggers = None
+
+    def to_dict(self):
+        return {
+            'start': self.start,
+            'end': self.end,
+            'count': self.count,
+            'levels': self.levels,
+            'loggers': sorted(self.loggers) if self.loggers is not None else None,
+        }
+
+    def may_match(self, since=None, until=None, level=None, logger=None):
+        if self.count == 0:
+            return False
+        if since is not None and self.end < since:
+            return False
+        if until is not None and self.start >= until:
+            return False
+        if level is not None and not any(LEVELS.get(name, 0) >= level for name in self.levels):
+            return False
+        if logger is not None and self.loggers is not None \
+                and not any(name == logger or name.startswith(logger + '.') for name in self.loggers):
+            return False
+
+        return True
+
+
+def _write_index(segment, index):
+    tmp = _index_path(segment) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index.to_dict(), f)
+    os.replace(tmp, _index_path(segment))
+
+
+def _read_records(segment):
+    with open(segment, 'rb') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Partial line from a crash mid-write.
+                continue
+
+
+def _reindex(segment):
+    index = _SegmentIndex()
+    for record in _read_records(segment):
+        index.add(record)
+    _write_index(segment, index)
+
+    return index
+
+
+def segments(folder):
+    """Returns the segment paths in a store, oldest first."""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+
+    def key(name):
+        start, _, seq = name[:-len(SEGMENT_SUFFIX)].partition('-')
+        return (int(start), int(seq or 0)) if start.isdigit() else (0, 0)
+
+    return [os.path.join(folder, n) for n in sorted((n for n in names if n.endswith(SEGMENT_SUFFIX)), key=key)]
+
+
+class SegmentedLogHandler(logging.Handler):
+    """
+    Logging handler writing JSON records into an indexed segmented store.
+    """
+    MAX_BYTES = 1024 * 1024
+    MAX_SEGMENTS = 50
+
+    def __init__(self, folder, max_bytes=None, max_segments=None, level=logging.NOTSET):
+        """
+        Constructor
+
+        :param folder: directory holding the segments
+        :type folder: str
+        :param max_bytes: size at which a segment is closed
+        :type max_bytes: int
+        :param max_segments: segments kept before the oldest are removed
+        :type max_segments: int
+        """
+        logging.Handler.__init__(self, level)
+
+        self.folder = folder
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        self.max_segments = max_segments or self.MAX_SEGMENTS
+        self._stream = None
+        self._segment = None
+        self._index = None
+        self._size = 0
+        self._seq = 0
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        # Segments left open by a previous run never got their index.
+        for segment in segments(folder):
+            if not os.path.exists(_index_path(segment)):
+                _reindex(segment)
+
+    def emit(self, record):
+        try:
+            data = self.to_dict(record)
+            line = (json.dumps(data, default=str) + '\n').encode('utf-8')
+
+            if self._stream is None or self._size + len(line) > self.max_bytes:
+                self._rotate(data['ts'])
+
+            self._stream.write(line)
+            self._stream.flush()
+            self._size += len(line)
+            self._index.add(data)
+        except Exception:
+            self.handleError(record)
+
+    def to_dict(self, record):
+        data = {
+            'ts': record.created,
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = ''.join(traceback.format_exception(*record.exc_info))
+
+        return data
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_segment()
+        finally:
+            self.release()
+
+        logging.Handler.close(self)
+
+    def _close_segment(self):
+        if self._stream is None:
+            return
+
+        self._stream.close()
+        self._stream = None
+        _write_index(self._segment, self._index)
+
+    def _rotate(self, ts):
+        self._close_segment()
+
+        self._seq += 1
+        self._segment = os.path.join(self.folder, '{0}-{1}{2}'.format(int(ts * 1000), self._seq, SEGMENT_SUFFIX))
+        self._stream = open(self._segment, 'ab')
+        self._index = _SegmentIndex()
+        self._size = 0
+
+        for old in segments(self.folder)[:-self.max_segments]:
+            for path in (old, _index_path(old)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+
+    return value.timestamp()
+
+
+def query(folder, since=None, until=None, level=None, logger=None, text=None, limit=500):
+    """
+    Reads matching records from a store, newest first.
+
+    :param folder: directory holding the segments
+    :type folder: str
+    :param since: first time included
+    :type since: datetime or epoch seconds
+    :param until: first time excluded
+    :type until: datetime or epoch seconds
+    :param level: minimum level name, e.g. ``'WARNING'``
+    :type level: str
+    :param logger: logger name, children included
+    :type logger: str
+    :param text: case-insensitive substring of the message
+    :type text: str
+    :param limit: maximum records returned
+    :type limit: int
+
+    :returns: dict with ``records``, ``segments`` (total) and ``scanned``
+    :raises ValueError: if the level is unknown
+    """
+    since, until = _to_epoch(since), _to_epoch(until)
+    if level is not None:
+        levelno = LEVELS.get(level.upper())
+        if levelno is None:
+            raise ValueError('Unknown level: {0}'.format(level))
+        level = levelno
+    text = text.lower() if text else None
+
+    found = []
+    paths = segments(folder)
+    scanned = 0
+    for segment in reversed(paths):
+        if len(found) >= limit:
+            break
+
+        index_path = _index_path(segment)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path) as f:
+                    index = _SegmentIndex(json.load(f))
+            except (OSError, ValueError):
+                index = None
+
+            if index is not None and not index.may_match(since, until, level, logger):
+                continue
+
+        scanned += 1
+        matches = []
+        for record in _read_records(segment):
+            ts = record.get('ts', 0)
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts >= until:
+                continue
+            if level is not None and LEVELS.get(record.get('level'), 0) < level:
+                continue
+            name = record.get('logger', '')
+            if logger is not None and name != logger and not name.startswith(logger + '.'):
+                continue
+            if text is not None and text not in record.get('message', '').lower():
+                continue
+            matches.append(record)
+
+        found.extend(reversed(matches))
+
+    return {
+        'records': found[:limit],
+        'segments': len(paths),
+        'scanned': scanned,
+    }
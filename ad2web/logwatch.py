@@ -9,9 +9,91 @@ License: MIT
 """
 
 import os
-import time
+import mmap
 import errno
 import stat
+import select
+import threading
+import ctypes
+import ctypes.util
+
+
+class _Inotify(object):
+    """Minimal inotify binding (Linux) used to block until the watched
+    directory changes instead of polling it.
+    """
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+
+    MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, 'inotify_add_watch failed')
+
+        # Written to by wake() so a waiting loop can be stopped at once.
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+
+    @classmethod
+    def create(cls, folder):
+        """Returns a watch on *folder*, or None where inotify is not
+        available."""
+        try:
+            return cls(folder)
+        except (OSError, AttributeError):
+            return None
+
+    def wait(self, timeout):
+        """Blocks until something in the folder changed or *timeout*
+        seconds passed. Uses select() so it cooperates with gevent."""
+        readable, _, _ = select.select([self.fd, self._wake_r], [], [], timeout)
+        if self._wake_r in readable:
+            self._drain(self._wake_r)
+            return False
+        if not readable:
+            return False
+
+        # Drain the queued events; which file changed doesn't matter.
+        self._drain(self.fd)
+        return True
+
+    def wake(self):
+        """Makes a pending or the next wait() return immediately."""
+        try:
+            if self.fd >= 0:
+                os.write(self._wake_w, b'x')
+        except OSError:
+            # Closed by the loop in the meantime.
+            pass
+
+    @staticmethod
+    def _drain(fd):
+        while True:
+            try:
+                if not os.read(fd, 4096):
+                    break
+            except BlockingIOError:
+                break
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self.fd = -1
 
 
 class LogWatcher(object):
@@ -29,7 +111,7 @@ class LogWatcher(object):
     """
 
     def __init__(self, folder, callback, extensions=["log"], tail_lines=0,
-                       sizehint=1048576):
+                       sizehint=1048576, use_inotify=True):
         """Arguments:
 
         (str) @folder:
@@ -50,14 +132,22 @@ class LogWatcher(object):
             approximation of the maximum number of bytes to read from
             a file on every ieration (as opposed to load the entire
             file in memory until EOF is reached). Defaults to 1MB.
+
+        (bool) @use_inotify:
+            block on inotify between iterations of loop() where it is
+            available instead of sleeping *interval* seconds
         """
         self.folder = os.path.realpath(folder)
         self.extensions = extensions
         self._files_map = {}
         self._callback = callback
         self._sizehint = sizehint
+        self._stopped = threading.Event()
+        self._inotify = None
         assert os.path.isdir(self.folder), self.folder
         assert callable(callback), repr(callback)
+        if use_inotify:
+            self._inotify = _Inotify.create(self.folder)
         self.update_files()
         for id, file in self._files_map.items():
             file.seek(os.path.getsize(file.name))  # EOF
@@ -80,21 +170,44 @@ class LogWatcher(object):
     def __del__(self):
         self.close()
 
+    # Longest inotify wait; stop() wakes it, this is only a backstop.
+    INOTIFY_TIMEOUT = 1.0
+
+    @property
+    def uses_inotify(self):
+        return self._inotify is not None
+
     def loop(self, interval=0.1, blocking=True):
-        """Start a busy loop checking for file changes every *interval*
-        seconds. If *blocking* is False make one loop then return.
+        """Start a loop checking for file changes until stop() is called.
+        Between iterations it blocks on inotify where available, otherwise
+        it sleeps *interval* seconds. If *blocking* is False make one loop
+        then return.
         """
-        # May be overridden in order to use pyinotify lib and block
-        # until the directory being watched is updated.
         # Note that directly calling readlines() as we do is faster
         # than first checking file's last modification times.
-        while True:
+        while not self._stopped.is_set():
             self.update_files()
             for fid, file in list(self._files_map.items()):
                 self.readlines(file)
             if not blocking:
                 return
-            time.sleep(interval)
+            self.wait(interval)
+
+    def wait(self, interval):
+        """Wait for the next iteration of loop()."""
+        inotify = self._inotify
+        if inotify is not None:
+            inotify.wait(self.INOTIFY_TIMEOUT)
+        else:
+            self._stopped.wait(interval)
+
+    def stop(self):
+        """Make loop() return, interrupting its wait. A loop() started
+        afterwards returns at once."""
+        self._stopped.set()
+        inotify = self._inotify
+        if inotify is not None:
+            inotify.wake()
 
     def log(self, line):
         """Log when a file is un/watched"""
@@ -133,31 +246,35 @@ class LogWatcher(object):
         if window <= 0:
             raise ValueError('invalid window value %r' % window)
         with cls.open(fname) as f:
-            BUFSIZ = 1024
             # True if open() was overridden and file was opened in text
             # mode. In that case readlines() will return unicode strings
             # instead of bytes.
             encoded = getattr(f, 'encoding', False)
-            CR = '\n' if encoded else b'\n'
-            data = '' if encoded else b''
-            f.seek(0, os.SEEK_END)
-            fsize = f.tell()
-            block = -1
-            exit = False
-            while not exit:
-                step = (block * BUFSIZ)
-                if abs(step) >= fsize:
-                    f.seek(0)
-                    newdata = f.read(BUFSIZ - (abs(step) - fsize))
-                    exit = True
-                else:
-                    f.seek(step, os.SEEK_END)
-                    newdata = f.read(BUFSIZ)
-                data = newdata + data
-                if data.count(CR) >= window:
-                    break
+            fsize = os.fstat(f.fileno()).st_size
+            if fsize == 0:
+                return []
+            # Map the file and search backward for newlines; only the
+            # pages holding the last *window* lines are ever read.
+            mm = mmap.mmap(f.fileno(), fsize, access=mmap.ACCESS_READ)
+            try:
+                end = fsize
+                # A trailing newline ends the last line, it doesn't start one.
+                if mm[end - 1:end] == b'\n':
+                    end -= 1
+                start = end
+                for _ in range(window):
+                    pos = mm.rfind(b'\n', 0, start)
+                    if pos < 0:
+                        start = 0
+                        break
+                    start = pos
                 else:
-                    block -= 1
+                    start += 1
+                data = mm[start:fsize]
+            finally:
+                mm.close()
+            if encoded:
+                data = data.decode(f.encoding, getattr(f, 'errors', None) or 'strict')
             return data.splitlines()[-window:]
 
     def update_files(self):
@@ -238,3 +355,6 @@ class LogWatcher(object):
         for id, file in self._files_map.items():
             file.close()
         self._files_map.clear()
+        if getattr(self, '_inotify', None) is not None:
+            self._inotify.close()
+            self._inotify = None
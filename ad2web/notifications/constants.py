@@ -223,3 +223,10 @@ XML_EVENT_PROPERTY = """  <e:property>
     <{0}>{1}</{0}>
   </e:property>
 """
+
+# Shared HTTP transport for the HTTP based notifiers.
+HTTP_POOL_MAX_PER_HOST = 4
+HTTP_POOL_IDLE_TIMEOUT = 60
+HTTP_TIMEOUT = 10
+HTTP_RETRIES = 2
+HTTP_RETRY_BACKOFF = 0.5
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ordered parallel fan-out of notification deliveries.
+
+Each key (e.g. a UPnP subscription id) gets its own FIFO queue that is
+drained by at most one worker at a time, so deliveries to different keys run
+in parallel on the notification thread pool while deliveries to the same key
+never overtake each other.  Tasks dropped from a full or discarded queue
+never run; their ``on_drop`` callback is called instead.
+"""
+
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class OrderedFanout(object):
+    """
+    Per-key serialized task queues drained on a shared executor.
+    """
+    MAX_PENDING = 100
+
+    def __init__(self, executor=None, max_pending=None):
+        """
+        Constructor
+
+        :param executor: executor to drain queues on, tasks run inline if None
+        :type executor: :py:class:`concurrent.futures.Executor`
+        :param max_pending: queued tasks kept per key before the oldest is dropped
+        :type max_pending: int
+        """
+        self._executor = executor
+        self.max_pending = max_pending or self.MAX_PENDING
+        self._queues = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def stats(self):
+        """
+        Returns the fan-out counters.
+
+        :returns: dict
+        """
+        with self._lock:
+            pending = sum(len(q) for q in self._queues.values())
+
+        return {
+            'keys': len(self._queues),
+            'pending': pending,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+    def submit(self, key, task, on_drop=None):
+        """
+        Queues a task behind any pending tasks for the same key.
+
+        :param key: ordering key
+        :type key: hashable
+        :param task: callable taking no arguments
+        :type task: callable
+        :param on_drop: called with no arguments if the task is dropped unrun
+        :type on_drop: callable
+        """
+        dropped = None
+        with self._lock:
+            self.submitted += 1
+
+            queue = self._queues.get(key)
+            start = queue is None
+            if start:
+                queue = self._queues[key] = deque()
+
+            if len(queue) >= self.max_pending:
+                # An unreachable subscriber must not grow the queue forever.
+                dropped = queue.popleft()
+                self.dropped += 1
+
+            queue.append((task, on_drop))
+
+        if dropped is not None:
+            self._dropped([dropped])
+
+        if start:
+            if self._executor is not None:
+                self._executor.submit(self._drain, key)
+            else:
+                self._drain(key)
+
+    def discard(self, key):
+        """
+        Drops tasks still pending for a key.
+        """
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                return
+
+            dropped = list(queue)
+            self.dropped += len(dropped)
+            queue.clear()
+
+        self._dropped(dropped)
+
+    def _dropped(self, entries):
+        for task, on_drop in entries:
+            if on_drop is not None:
+                try:
+                    on_drop()
+                except Exception as err:
+                    logger.error('Error in drop callback: {0}'.format(err))
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+
+                task, _ = queue.popleft()
+
+            try:
+                task()
+                self.completed += 1
+            except Exception as err:
+                self.errors += 1
+                logger.error('Error delivering notification to {0}: {1}'.format(key, err))
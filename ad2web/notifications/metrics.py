@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""
+Delivery metrics for notifiers.
+
+Tracks how many deliveries are in flight and, per notifier, how many
+succeeded, failed or were dropped unsent and a latency histogram measured from submission to
+completion, so a slow notifier stands out.
+"""
+
+import time
+import bisect
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class NotifierMetrics(object):
+    """
+    In-flight gauge and per-notifier success/failure/latency histograms.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.in_flight = 0
+        self._notifiers = {}
+        self._lock = threading.Lock()
+
+    def track(self, name):
+        """
+        Marks a delivery as started.
+
+        :param name: notifier name
+        :type name: str
+
+        :returns: callable taking ``ok`` (bool) and optionally ``dropped``
+                  (bool) that records the outcome
+        """
+        started = time.time()
+        with self._lock:
+            self.in_flight += 1
+
+        def finish(ok, dropped=False):
+            self.record(name, time.time() - started, ok, dropped)
+
+        return finish
+
+    def record(self, name, latency, ok, dropped=False):
+        """
+        Records a finished delivery.
+
+        :param name: notifier name
+        :type name: str
+        :param latency: seconds from submission to completion
+        :type latency: float
+        :param ok: whether the delivery succeeded
+        :type ok: bool
+        :param dropped: the delivery was dropped without being attempted;
+                        counted apart and kept out of the latencies
+        :type dropped: bool
+        """
+        with self._lock:
+            self.in_flight -= 1
+
+            stats = self._notifiers.get(name)
+            if stats is None:
+                stats = self._notifiers[name] = {
+                    'success': 0,
+                    'failure': 0,
+                    'dropped': 0,
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    'histogram': [0] * (len(self.buckets) + 1),
+                }
+
+            if dropped:
+                stats['dropped'] += 1
+                return
+
+            stats['success' if ok else 'failure'] += 1
+            stats['latency_sum'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+            stats['histogram'][bisect.bisect_left(self.buckets, latency)] += 1
+
+    def stats(self):
+        """
+        Returns the gauge and per-notifier histograms.
+
+        :returns: dict
+        """
+        with self._lock:
+            notifiers = {}
+            for name, stats in self._notifiers.items():
+                count = stats['success'] + stats['failure']
+                notifiers[name] = {
+                    'success': stats['success'],
+                    'failure': stats['failure'],
+                    'dropped': stats['dropped'],
+                    'latency_avg': stats['latency_sum'] / count if count else None,
+                    'latency_max': stats['latency_max'],
+                    'histogram': dict(zip([str(b) for b in self.buckets] + ['+Inf'], stats['histogram'])),
+                }
+
+            return {
+                'in_flight': self.in_flight,
+                'notifiers': notifiers,
+            }
@@ -59,3 +59,15 @@ class NotificationMessage(db.Model):
 
     id = Column(db.Integer, primary_key=True)
     text = Column(db.Text, nullable=False)
+
+class DelayedNotification(db.Model):
+    __tablename__ = 'delayed_notifications'
+
+    id = Column(db.Integer, primary_key=True, autoincrement=True)
+    notification_id = Column(db.Integer, nullable=False)
+    device = Column(db.SmallInteger, nullable=True)
+    zone = Column(db.Integer, nullable=False)
+    type = Column(db.Integer, nullable=False)
+    send_time = Column(db.Float, nullable=False, index=True)
+    message = Column(db.Text)
+    raw = Column(db.Text)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler for delayed zone notifications.
+
+Pending notifications live in a heap ordered by send time and are indexed by
+``(notifier_id, device, zone, type)`` so that duplicates and zone suppression
+are resolved without scanning.  The same zone number on two devices is two
+different zones.  Entries are optionally mirrored to the
+``delayed_notifications`` table and reloaded on startup so they survive a
+restart; the table writes are queued and done by the consumer thread in
+:py:meth:`NotificationScheduler.flush`, never on the thread that schedules.  Consumers block in :py:meth:`NotificationScheduler.wait`, which
+returns as soon as the earliest entry is due or a new one is scheduled.
+"""
+
+import time
+import heapq
+import itertools
+import threading
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions import db
+from ..devices import PRIMARY_DEVICE
+from .constants import ZONE_FAULT, ZONE_RESTORE, BYPASS
+from .models import DelayedNotification
+
+
+class NotificationScheduler(object):
+    """
+    Heap of delayed notifications with a ``(notifier_id, device, zone, type)``
+    index.
+    """
+
+    def __init__(self, persist=True):
+        """
+        Constructor
+
+        :param persist: mirror pending entries to the database
+        :type persist: bool
+        """
+        self._persist = persist
+        self._heap = []
+        self._entries = {}
+        self._zones = {}
+        self._inserts = []
+        self._deletes = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def schedule(self, notification, type, zone, message, raw, send_time, device=None):
+        """
+        Queues a notification for later delivery.
+
+        A zone restore or bypass that follows a pending fault for the same zone
+        cancels everything pending for that zone when suppression is enabled.
+
+        :param notification: notifier that will send the message
+        :type notification: BaseNotification
+        :param type: event type
+        :type type: int
+        :param zone: zone number, -1 if none
+        :type zone: int
+        :param message: rendered message
+        :type message: str
+        :param raw: raw panel message
+        :type raw: str
+        :param send_time: epoch time to send at
+        :type send_time: float
+        :param device: id of the device that reported the event, None for
+                       :py:data:`~ad2web.devices.PRIMARY_DEVICE`
+        :type device: int
+
+        :returns: True if the entry was queued
+        """
+        device = PRIMARY_DEVICE if device is None else device
+        key = (notification.id, device, zone, type)
+
+        with self._cond:
+            if key in self._entries:
+                return False
+
+            if self._suppresses(notification, type, device, zone):
+                self._remove_zone(device, zone)
+                return False
+
+            entry = {
+                'notification': notification,
+                'message_send_time': send_time,
+                'message': message,
+                'raw': raw,
+                'type': type,
+                'zone': zone,
+                'device': device,
+                'row_id': None,
+            }
+            self._add(key, entry)
+
+            if self._persist:
+                self._inserts.append((key, entry))
+
+            self._cond.notify_all()
+
+        return True
+
+    def pop_due(self, now=None):
+        """
+        Removes and returns every entry whose send time has passed.
+
+        :param now: epoch time, defaults to the current time
+        :type now: float
+
+        :returns: list of entries in send time order
+        """
+        now = time.time() if now is None else now
+        due = []
+
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                send_time, _, key, entry = heapq.heappop(self._heap)
+                if self._entries.get(key) is entry:
+                    self._unindex(key)
+                    due.append(entry)
+
+            if self._persist and due:
+                self._forget(due)
+
+        return due
+
+    def next_deadline(self):
+        """
+        Returns the send time of the earliest pending entry, or None.
+        """
+        with self._cond:
+            self._discard_stale()
+
+            return self._heap[0][0] if self._heap else None
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the earliest entry is due, something new is scheduled,
+        :py:meth:`wake` is called or the timeout passes.
+
+        :param timeout: maximum seconds to wait
+        :type timeout: float
+        """
+        with self._cond:
+            deadline = self.next_deadline()
+            if deadline is not None:
+                remaining = max(deadline - time.time(), 0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+            if timeout is None or timeout > 0:
+                self._cond.wait(timeout)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def load(self, notifiers):
+        """
+        Restores persisted entries for the given notifiers.  Entries for
+        notifiers that no longer exist are discarded.
+
+        :param notifiers: active notifiers keyed by id
+        :type notifiers: dict
+        """
+        if not self._persist:
+            return
+
+        orphans = []
+        with self._cond:
+            for row in DelayedNotification.query.order_by(DelayedNotification.send_time).all():
+                notification = notifiers.get(row.notification_id)
+                # Rows written before multiple devices have no device.
+                device = PRIMARY_DEVICE if row.device is None else row.device
+                key = (row.notification_id, device, row.zone, row.type)
+
+                if notification is None or key in self._entries:
+                    orphans.append(row.id)
+                    continue
+
+                self._add(key, {
+                    'notification': notification,
+                    'message_send_time': row.send_time,
+                    'message': row.message,
+                    'raw': row.raw,
+                    'type': row.type,
+                    'zone': row.zone,
+                    'device': device,
+                    'row_id': row.id,
+                })
+
+            self._deletes.extend(orphans)
+
+            self._cond.notify_all()
+
+        self.flush()
+
+    def flush(self):
+        """
+        Writes the queued inserts and deletes to the database in one
+        transaction of its own.
+        """
+        if not self._persist:
+            return
+
+        with self._cond:
+            inserts = [(key, entry) for key, entry in self._inserts if self._entries.get(key) is entry]
+            deletes = self._deletes
+            self._inserts = []
+            self._deletes = []
+
+        if not inserts and not deletes:
+            return
+
+        table = DelayedNotification.__table__
+        row_ids = []
+        try:
+            # Not the caller's session, which may hold unrelated changes.
+            with db.engine.begin() as connection:
+                if deletes:
+                    connection.execute(table.delete().where(table.c.id.in_(deletes)))
+                for key, entry in inserts:
+                    result = connection.execute(table.insert(), {
+                        'notification_id': key[0], 'device': key[1], 'zone': key[2], 'type': key[3],
+                        'send_time': entry['message_send_time'],
+                        'message': entry['message'], 'raw': entry['raw'],
+                    })
+                    row_ids.append(result.inserted_primary_key[0])
+        except SQLAlchemyError as err:
+            current_app.logger.error('Error persisting delayed notifications: {0}'.format(err))
+            return
+
+        with self._cond:
+            for (key, entry), row_id in zip(inserts, row_ids):
+                entry['row_id'] = row_id
+                # Sent or cancelled while being written.
+                if self._entries.get(key) is not entry:
+                    self._deletes.append(row_id)
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        self._zones.setdefault((entry['device'], entry['zone']), set()).add(key)
+        heapq.heappush(self._heap, (entry['message_send_time'], next(self._sequence), key, entry))
+
+    def _unindex(self, key):
+        entry = self._entries.pop(key)
+
+        zone = (entry['device'], entry['zone'])
+        keys = self._zones.get(zone)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._zones[zone]
+
+        return entry
+
+    def _suppresses(self, notification, type, device, zone):
+        if type not in (ZONE_RESTORE, BYPASS) or not notification.suppress:
+            return False
+
+        # Only a pending fault from a suppressing notifier cancels the zone.
+        for key in self._zones.get((device, zone), ()):
+            if key[3] == ZONE_FAULT and self._entries[key]['notification'].suppress == 1:
+                return True
+
+        return False
+
+    def _remove_zone(self, device, zone):
+        if zone == -1:
+            return
+
+        removed = [self._unindex(key) for key in list(self._zones.get((device, zone), ()))]
+        if self._persist and removed:
+            self._forget(removed)
+
+        # Heap items for removed entries are skipped lazily.
+        self._discard_stale()
+
+    def _discard_stale(self):
+        while self._heap and self._entries.get(self._heap[0][2]) is not self._heap[0][3]:
+            heapq.heappop(self._heap)
+
+    def _forget(self, entries):
+        # Entries not written yet are skipped by flush().
+        self._deletes.extend(e['row_id'] for e in entries if e['row_id'] is not None)
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pooled keep-alive HTTP transport for the HTTP based notifiers.
+
+Connections are kept open per ``(scheme, host, port)`` and handed back to
+the pool once their response has been read, so consecutive notifications to
+the same endpoint skip the TCP connect and, for HTTPS, the TLS handshake.
+When a new HTTPS connection is needed the last TLS session for that host is
+offered for resumption.  Each host is limited to a fixed number of open
+connections; failed requests are retried with exponential backoff.
+Non-idempotent requests (POST, NOTIFY) are only resent when they never
+went out, so a server that received a notification is not sent it twice.
+"""
+
+import ssl
+import time
+import select
+import socket
+import threading
+from collections import deque, namedtuple
+
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+
+from .constants import (HTTP_POOL_MAX_PER_HOST, HTTP_POOL_IDLE_TIMEOUT, HTTP_TIMEOUT,
+                        HTTP_RETRIES, HTTP_RETRY_BACKOFF)
+
+HTTPResult = namedtuple('HTTPResult', ['status', 'reason', 'headers', 'data'])
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection to a host became available in time.
+    """
+    pass
+
+
+class _SessionHTTPSConnection(HTTPSConnection):
+    """
+    HTTPS connection that offers and records TLS sessions for resumption.
+    """
+    def __init__(self, host, port=None, timeout=None, context=None, session=None):
+        HTTPSConnection.__init__(self, host, port, timeout=timeout, context=context)
+
+        self.tls_session = session
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout, self.source_address)
+        if self._tunnel_host:
+            self.sock = sock
+            self._tunnel()
+            sock = self.sock
+
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(sock, server_hostname=server_hostname, session=self.tls_session)
+
+
+class _HostPool(object):
+    def __init__(self, max_connections):
+        self.idle = deque()
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.tls_session = None
+
+
+class ConnectionPool(object):
+    """
+    Per-host pool of keep-alive HTTP(S) connections.
+    """
+
+    def __init__(self, max_per_host=HTTP_POOL_MAX_PER_HOST, idle_timeout=HTTP_POOL_IDLE_TIMEOUT,
+                 timeout=HTTP_TIMEOUT, retries=HTTP_RETRIES, backoff=HTTP_RETRY_BACKOFF):
+        """
+        Constructor
+
+        :param max_per_host: maximum open connections per host
+        :type max_per_host: int
+        :param idle_timeout: seconds an idle connection is kept
+        :type idle_timeout: float
+        :param timeout: default socket timeout in seconds
+        :type timeout: float
+        :param retries: default number of retries after a failure
+        :type retries: int
+        :param backoff: base delay in seconds, doubled on each retry
+        :type backoff: float
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._contexts = {}
+
+        self.requests = 0
+        self.connects = 0
+        self.handshakes = 0
+        self.sessions_reused = 0
+        self.reused = 0
+        self.retried = 0
+        self.errors = 0
+
+    def stats(self):
+        """
+        Returns the pool counters.
+
+        :returns: dict
+        """
+        with self._lock:
+            idle = sum(len(h.idle) for h in self._hosts.values())
+
+        return {
+            'hosts': len(self._hosts),
+            'idle': idle,
+            'requests': self.requests,
+            'connects': self.connects,
+            'handshakes': self.handshakes,
+            'sessions_reused': self.sessions_reused,
+            'reused': self.reused,
+            'retried': self.retried,
+            'errors': self.errors,
+        }
+
+    def request(self, method, netloc, path='/', body=None, headers=None, use_ssl=False,
+                verify=True, timeout=None, retries=None):
+        """
+        Sends a request and reads the whole response.
+
+        :param method: HTTP method
+        :type method: str
+        :param netloc: ``host[:port]``
+        :type netloc: str
+        :param path: request path including any query string
+        :type path: str
+        :param body: request body
+        :type body: str or bytes
+        :param headers: request headers
+        :type headers: dict
+        :param use_ssl: use HTTPS
+        :type use_ssl: bool
+        :param verify: verify the server certificate
+        :type verify: bool
+        :param timeout: socket timeout, defaults to the pool timeout
+        :type timeout: float
+        :param retries: retries after a failure, defaults to the pool setting
+        :type retries: int
+
+        :returns: :py:class:`HTTPResult`
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        key = ('https' if use_ssl else 'http', netloc, verify)
+        host = self._host(key)
+
+        self.requests += 1
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            if not host.slots.acquire(timeout=timeout):
+                raise PoolTimeout('No connection to {0} available within {1}s'.format(netloc, timeout))
+
+            conn = None
+            sent = False
+            try:
+                conn, reused = self._checkout(key, host, timeout)
+                try:
+                    sent = self._send(conn, method, path, body, headers)
+                    result = self._read(conn)
+                except (HTTPException, OSError):
+                    if not reused or (sent and not idempotent):
+                        raise
+
+                    # The server closed an idle keep-alive connection; that
+                    # is expected and does not count against the retries.
+                    conn.close()
+                    conn, reused = self._connect(key, host, timeout), False
+                    sent = self._send(conn, method, path, body, headers)
+                    result = self._read(conn)
+
+                self._checkin(host, conn, result)
+                conn = None
+
+                return result[0]
+
+            except (HTTPException, OSError):
+                self.errors += 1
+                if conn is not None:
+                    conn.close()
+
+                # The server may have acted on it already.
+                if attempt >= retries or (sent and not idempotent):
+                    raise
+
+                self.retried += 1
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+
+            finally:
+                host.slots.release()
+
+            time.sleep(delay)
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        with self._lock:
+            hosts = list(self._hosts.values())
+            self._hosts = {}
+
+        for host in hosts:
+            while host.idle:
+                host.idle.popleft()[0].close()
+
+    def _host(self, key):
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None:
+                host = self._hosts[key] = _HostPool(self.max_per_host)
+
+            return host
+
+    def _checkout(self, key, host, timeout):
+        now = time.time()
+
+        with self._lock:
+            while host.idle:
+                conn, idle_since = host.idle.pop()
+                if now - idle_since < self.idle_timeout and conn.sock is not None and not _closed_by_peer(conn.sock):
+                    conn.timeout = timeout
+                    conn.sock.settimeout(timeout)
+                    self.reused += 1
+                    return conn, True
+
+                conn.close()
+
+        return self._connect(key, host, timeout), False
+
+    def _checkin(self, host, conn, result):
+        will_close = result[2]
+        if will_close or conn.sock is None:
+            conn.close()
+            return
+
+        if isinstance(conn, _SessionHTTPSConnection):
+            # TLS 1.3 sends the session ticket after the handshake, so it
+            # is only available once a response has been read.
+            host.tls_session = conn.sock.session or host.tls_session
+
+        with self._lock:
+            host.idle.append((conn, time.time()))
+
+    def _connect(self, key, host, timeout):
+        scheme, netloc, verify = key
+
+        if scheme == 'https':
+            conn = _SessionHTTPSConnection(netloc, timeout=timeout, context=self._context(verify),
+                                           session=host.tls_session)
+        else:
+            conn = HTTPConnection(netloc, timeout=timeout)
+
+        conn.connect()
+        self.connects += 1
+
+        if scheme == 'https':
+            self.handshakes += 1
+            if conn.sock.session_reused:
+                self.sessions_reused += 1
+            host.tls_session = conn.sock.session or host.tls_session
+
+        return conn
+
+    def _context(self, verify):
+        context = self._contexts.get(verify)
+        if context is None:
+            context = ssl.create_default_context() if verify else ssl._create_unverified_context()
+            self._contexts[verify] = context
+
+        return context
+
+    def _send(self, conn, method, path, body, headers):
+        """Sends the request; returns True once it went out."""
+        conn.request(method, path, body=body, headers=headers or {})
+        return True
+
+    def _read(self, conn):
+        response = conn.getresponse()
+        data = response.read()
+
+        result = HTTPResult(response.status, response.reason, dict(response.getheaders()), data)
+
+        return result, response, response.will_close
+
+
+def _closed_by_peer(sock):
+    """
+    An idle keep-alive socket is readable only if the server closed it (or
+    sent something unsolicited); either way it must not be reused.
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+
+    return bool(readable)
+
+
+pool = ConnectionPool()
@@ -2,7 +2,6 @@
 
 from flask import current_app
 import time
-import datetime
 import smtplib
 import threading
 from email.mime.text import MIMEText
@@ -11,14 +10,11 @@ from urllib.parse import urlparse
 
 import json
 import re
-import ssl
 import sys
 import base64
 import uuid
 import traceback
 import functools
-from alarmdecoder.panels import ADEMCO, DSC
-from alarmdecoder.zonetracking import Zone as ADZone
 
 try:
     from concurrent.futures import ThreadPoolExecutor
@@ -59,19 +55,6 @@ from xml.etree.ElementTree import Comment
 from xml.etree.ElementTree import tostring
 import ast
 
-#https connection support - used for prowl, Matrix, custom post notifiation, etc.
-try:
-    from http.client import HTTPSConnection
-except ImportError:
-    from httplib import HTTPSConnection
-
-
-#normal http connection support (future POST to custom url)
-try:
-    from http.client import HTTPConnection
-except ImportError:
-    from httplib import HTTPConnection
-
 try:
     from urllib.parse import urlencode, quote
 except ImportError:
@@ -92,12 +75,15 @@ from .constants import (EMAIL, DEFAULT_EVENT_MESSAGES, PUSHOVER, TWILIO, PROWL,
                         RAW_MESSAGE, EVENTID_MESSAGE, EVENTDESC_MESSAGE, POWER_CHANGED, BOOT, LOW_BATTERY, RFX, EXP, AUI)
 
 from .models import Notification, NotificationMessage
-from ..extensions import db
-from ..log.models import EventLogEntry
+from .scheduler import NotificationScheduler
+from .transport import pool
+from .fanout import OrderedFanout
+from .metrics import NotifierMetrics
 from ..zones import Zone
 from ..utils import user_is_authenticated
 from .util import check_time_restriction
 from ..settings import Setting
+from ..panelstate import read_panel_state
 
 '''
 Decorator for better logging of notification task exceptions.
@@ -130,39 +116,65 @@ def raise_with_stack(func):
 def threaded(func):
     def wrapper(*args, **kwargs):
         fcname = "%s.%s()" % (args[0].__class__.__name__, func.__name__)
+        notifier = current_app.decoder._notifier_system
+        finish = notifier.metrics.track(args[0].description)
 
         # If we have it use it.
-        if have_threadpoolexecutor:
-            notifier = current_app.decoder._notifier_system
-
+        if have_threadpoolexecutor and notifier._tpool:
             # pass in current app as var. Better way?
             myapp = current_app._get_current_object()
             future = notifier._tpool.submit(func, *args, app=myapp, **kwargs)
             future.fcname = fcname
-
-            with notifier._lock:
-                notifier._futures.append(future)
+            future.add_done_callback(functools.partial(_on_future_done, myapp, finish))
 
             myapp.logger.info('Background notification function {0} starting.'.format(future.fcname))
 
         else:
             # No threading so block and run it synchronously.
-            return func(*args, **kwargs)
+            try:
+                ret = func(*args, **kwargs)
+            except Exception:
+                finish(False)
+                raise
+
+            finish(True)
+            return ret
 
         return
     return wrapper
 
 
+def _on_future_done(app, finish, future):
+    if future.cancelled():
+        finish(False, dropped=True)
+        app.logger.info('Background notification function {0} was cancelled.'.format(future.fcname))
+        return
+
+    exc = future.exception()
+    finish(exc is None)
+
+    app.logger.info('Background notification function {0} finished with {1}.'.format(future.fcname, exc if exc is not None else 'no exceptions'))
+
+
 class NotificationSystem(object):
     def __init__(self):
         self._notifiers = {}
         self._messages = DEFAULT_EVENT_MESSAGES
-        self._wait_list = []
         self._tpool = None
         self._lock = threading.Lock()
-        self._futures = []
+        self._templates = {}
+        self._stats = {}
         self._init_notifiers()
 
+        '''
+        delayed zone notifications, restored from the database
+        '''
+        self._scheduler = NotificationScheduler()
+        try:
+            self._scheduler.load(self._notifiers)
+        except Exception as err:
+            current_app.logger.error('Error restoring delayed notifications: {0}'.format(err))
+
         '''
         subscribers to UPNPPushNotification
         '''
@@ -183,36 +195,88 @@ class NotificationSystem(object):
         else:
             current_app.logger.info('Library concurrent.futures.ThreadPoolExecutor not found. Use "sudo apt-get install python-concurrent.futures" to enable Threaded notifications.')
 
-    def send(self, type, **kwargs):
+        '''
+        per subscriber ordered delivery of UPnP NOTIFY events
+        '''
+        self._fanout = OrderedFanout(self._tpool)
+        self.metrics = NotifierMetrics()
+
+    def send(self, type, device_id=None, device_name=None, **kwargs):
         errors = []
+        started = time.time()
 
-        for id, n in self._notifiers.iteritems():
-            if n and n.subscribes_to(type, **kwargs):
-                try:
-                    message, rawmessage = self._build_message(type, **kwargs)
+        # Resolve subscribers first so the message is only built when needed.
+        subscribers = [n for n in self._notifiers.values() if n and n.subscribes_to(type, **kwargs)]
 
-                    if message:
-                        if n.delay > 0 and type in (ZONE_FAULT, ZONE_RESTORE, BYPASS):
-                            message_send_time = time.mktime((datetime.datetime.combine(datetime.date.today(), datetime.datetime.time(datetime.datetime.now())) + datetime.timedelta(minutes=delay)).timetuple())
+        stats = self._event_stats(type)
+        stats['events'] += 1
+        if not subscribers:
+            return errors
 
-                            notify = {}
-                            notify['notification'] = n
-                            notify['message_send_time'] = message_send_time
-                            notify['message'] = message
-                            notify['raw'] = rawmessage
-                            notify['type'] = type
-                            notify['zone'] = int(kwargs.get('zone', -1))
+        try:
+            message, rawmessage = self._build_message(type, **kwargs)
+        except Exception as err:
+            stats['errors'] += 1
+            errors.append('Exception building notification message for {0}: {1}'.format(type, str(err)))
+            message = None
+
+        if message and device_name:
+            # Only devices besides the primary one are named.
+            message = '[{0}] {1}'.format(device_name, message)
 
-                            if notify not in self._wait_list:
-                                self._wait_list.append(notify)
-                        else:
-                            n.send(type, message, rawmessage)
+        if message:
+            for n in subscribers:
+                try:
+                    if n.delay > 0 and type in (ZONE_FAULT, ZONE_RESTORE, BYPASS):
+                        message_send_time = time.time() + int(n.delay) * 60
+
+                        self._scheduler.schedule(n, type, int(kwargs.get('zone', -1)), message, rawmessage, message_send_time,
+                                                 device=device_id)
+                    else:
+                        n.send(type, message, rawmessage, zone=kwargs.get('zone'), device=device_id)
+
+                    stats['notifications'] += 1
 
                 except Exception as err:
+                    stats['errors'] += 1
                     errors.append('Exception in notification {0}.send(): {1}'.format(n.__class__.__name__,str(err)))
 
+        stats['processed'] += 1
+        stats['seconds'] += time.time() - started
+
         return errors
 
+    def stats(self):
+        """
+        Returns per event type counters: the event rate since the type was
+        first seen, and the mean time spent on events that had subscribers.
+
+        :returns: dict keyed by event type name
+        """
+        now = time.time()
+        ret = {}
+        for type, stats in list(self._stats.items()):
+            stats = dict(stats)
+            elapsed = now - stats.pop('since')
+            stats['events_per_second'] = stats['events'] / elapsed if elapsed > 0 else None
+            stats['ms_per_event'] = stats['seconds'] * 1000 / stats['processed'] if stats['processed'] else None
+            ret[EVENT_TYPES.get(type, str(type))] = stats
+
+        return ret
+
+    def invalidate_message(self, type=None):
+        """
+        Drops the compiled template for an event type, or all of them.
+
+        :param type: event type whose NotificationMessage changed
+        :type type: int
+        """
+        with self._lock:
+            if type is None:
+                self._templates.clear()
+            else:
+                self._templates.pop(type, None)
+
     def refresh_notifier(self, id):
         n = Notification.query.filter_by(id=id,enabled=1).first()
         if n:
@@ -280,30 +344,70 @@ class NotificationSystem(object):
 
         Remove subscriber if found our our dictionary
         """
-        found = self._subscribers.pop(subuudi, None)
+        found = self._subscribers.pop(subuuid, None)
+        self._fanout.discard(subuuid)
         if found:
             current_app.logger.info('remove_subscriber: found {0}'.format(subuuid))
         else:
             current_app.logger.info('remove_subscriber: not found {0}'.format(subuuid))
 
     def get_subscribers(self):
+        self.evict_expired_subscribers()
+
         return self._subscribers
 
+    def evict_expired_subscribers(self, now=None):
+        """
+        Removes subscribers whose subscription timeout has passed.
+
+        :returns: list of evicted subscription ids
+        """
+        now = time.time() if now is None else now
+
+        expired = [k for k, v in list(self._subscribers.items()) if v['timeout'] <= now]
+        for k in expired:
+            self._subscribers.pop(k, None)
+            self._fanout.discard(k)
+            current_app.logger.info('evict_subscriber: {0}'.format(k))
+
+        return expired
+
     def _init_notifiers(self):
         self._notifiers = {-1: LogNotification()}   # Force LogNotification to always be present
 
         for n in Notification.query.filter_by(enabled=1).all():
             self._notifiers[n.id] = TYPE_MAP[n.type](n)
 
-    def _build_message(self, type, **kwargs):
+    def _event_stats(self, type):
+        stats = self._stats.get(type)
+        if stats is None:
+            stats = self._stats.setdefault(type, {'events': 0, 'processed': 0, 'notifications': 0, 'errors': 0,
+                                                  'seconds': 0.0, 'since': time.time()})
+
+        return stats
+
+    def _get_template(self, type):
+        try:
+            return self._templates[type]
+        except KeyError:
+            pass
+
         message = NotificationMessage.query.filter_by(id=type).first()
-        if message:
-            message = message.text
+        template = message.text.format if message and message.text else None
+
+        with self._lock:
+            self._templates[type] = template
+
+        return template
+
+    def _build_message(self, type, **kwargs):
+        template = self._get_template(type)
 
         kwargs = self._fill_replacers(type, **kwargs)
 
-        if message:
-            message = message.format(**kwargs)
+        message = None
+        if template:
+            message = template(**kwargs)
 
         rawmessage = kwargs.get('message', None)
         if rawmessage:
@@ -367,51 +471,20 @@ class NotificationSystem(object):
     def process_wait_list(self):
         errors = []
 
-        for notifier in self._wait_list:
-            try:
-                if notifier['notification'].suppress > 0 and self._check_suppress(notifier):
-                    self._remove_suppressed_zone(notifier['zone'])
-
-            except Exception as err:
-                errors.append('Error sending notification for {0}: {1}'.format(notifier['notification'].description, str(err)))
-
-        for notifier in self._wait_list:
+        for notifier in self._scheduler.pop_due():
             try:
-                if time.time() >= notifier['message_send_time']:
-                    notifier['notification'].send(notifier['type'], notifier['message'], notifier['raw'])
-                    self._wait_list.remove(notifier)
+                notifier['notification'].send(notifier['type'], notifier['message'], notifier['raw'],
+                                              zone=notifier['zone'], device=notifier['device'])
 
             except Exception as err:
                 errors.append('Error sending notification for {0}: {1}'.format(notifier['notification'].description, str(err)))
 
         return errors
 
-    def _check_suppress(self, notifier):
-        if notifier['type'] in (ZONE_RESTORE, BYPASS):
-            zone = notifier['zone']
-
-            #check the first notifier that is a zone fault, get its id, see if there was a zone restore or bypass
-            #for the same zone.   If we're suppressed on the notifier, then we won't send it out.
-            for n in self._wait_list:
-                if n['zone'] == zone:
-                    if n['type'] == ZONE_FAULT and n['notification'].suppress == 1:
-                        return True
-
-        #right now only suppress zone spam
-        return False
-
-    def _remove_suppressed_zone(self, id):
-        to_remove = []
-
-        for n in self._wait_list:
-            if n['zone'] != -1 and n['zone'] == id:
-                to_remove.append(n)
-
-        for n in to_remove:
-            self._wait_list.remove(n)
-
 
 class NotificationThread(threading.Thread):
+    HOUSEKEEPING_INTERVAL = 60
+
     def __init__(self, decoder):
         threading.Thread.__init__(self)
 
@@ -420,47 +493,29 @@ class NotificationThread(threading.Thread):
 
     def stop(self):
         self._running = False
+        self._decoder._notifier_system._scheduler.wake()
 
     def run(self):
         self._running = True
 
         notifier = self._decoder._notifier_system
         while self._running:
-            # This could be moved down to reduce lock time.
-            # Easy button for now is keep it at the top level of this code.
-            with notifier._lock:
-                ncount = len(notifier._futures)
-                if ncount > 0:
-                    with self._decoder.app.app_context():
-                        current_app.logger.info('Background notification functions running {0}.'.format(ncount))
-
-                    remove = []
-                    data = ""
-                    for i in range(ncount):
-                        f = notifier._futures[i]
-                        if f.done():
-                            extra_msg = ""
-                            try:
-                                date = f.result()
-                            except Exception as exc:
-                                extra_msg = exc
-                            else:
-                                extra_msg = 'no exceptions'
-
-                            with self._decoder.app.app_context():
-                                current_app.logger.info('Background notification function {0} finished with {1}.'.format(f.fcname, extra_msg))
-
-                            remove.append(f)
-
-                    for f in remove:
-                        notifier._futures.remove(f)
-
             with self._decoder.app.app_context():
+                notifier.evict_expired_subscribers()
+
                 errors = self._decoder._notifier_system.process_wait_list()
                 for e in errors:
                     current_app.logger.error(e)
 
-            time.sleep(5)
+                # Mirror what was scheduled, sent or cancelled to the database.
+                notifier._scheduler.flush()
+
+            # Sleep until the next delayed notification is due; expired
+            # subscribers are also evicted whenever they are looked up.
+            notifier._scheduler.wait(self.HOUSEKEEPING_INTERVAL)
+
+        with self._decoder.app.app_context():
+            notifier._scheduler.flush()
 
 
 class BaseNotification(object):
@@ -510,15 +565,20 @@ class LogNotification(object):
     def subscribes_to(self, type, **kwargs):
         return True
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         with current_app.app_context():
             if type == ZONE_RESTORE or type == ZONE_FAULT or type == BYPASS:
                 current_app.logger.debug('Event: {0}'.format(text))
             else:
                 current_app.logger.info('Event: {0}'.format(text))
 
-        db.session.add(EventLogEntry(type=type, message=text))
-        db.session.commit()
+        # Batched by the event log writer; never waits on the database.
+        try:
+            zone = int(zone) if zone is not None else None
+        except (TypeError, ValueError):
+            zone = None
+
+        current_app.decoder._event_log_writer.put(type, text, zone, device)
 
 class UPNPPushNotification(BaseNotification):
     def __init__(self, obj):
@@ -531,21 +591,23 @@ class UPNPPushNotification(BaseNotification):
         self.description = 'UPNPPush'
         self.api_token = obj.get_setting('token')
         self.api_endpoint = obj.get_setting('url')
+        self._panel_doc = None
 
     def subscribes_to(self, type, **kwargs):
         return (type in self._events)
 
     @raise_with_stack
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if type is None or type in self._events:
             self._notify_subscribers(type, text, raw)
 
     def _notify_subscribers(self, type, text, raw):
-        panelState = self._build_panel_state()
+        panelState = self._get_panel_state()
 
-        # if we find the host:callback in _subscribers then
-        # updated it and return the same subscription ID back.
-        subscribers = current_app.decoder._notifier_system.get_subscribers()
+        notifier_system = current_app.decoder._notifier_system
+        subscribers = notifier_system.get_subscribers()
+        if not subscribers:
+            return
 
         response =  XML_EVENT_TEMPLATE.format(
             self._build_property("eventid", type, False),
@@ -554,20 +616,54 @@ class UPNPPushNotification(BaseNotification):
             self._build_property("rawmessage", raw, True),
             panelState
         )
-        for k, v in subscribers.items():
-            self._send_notify_event(k, v['callback'], response)
-
-    def _build_panel_state(self):
-        mode = current_app.decoder.device.mode
-        if mode == ADEMCO:
-            mode = 'ADEMCO'
-        elif mode == DSC:
-            mode = 'DSC'
-        else:
-            mode = 'UNKNOWN'
+
+        # Parallel across subscribers, in order for each one.
+        app = current_app._get_current_object()
+        for k, v in list(subscribers.items()):
+            finish = notifier_system.metrics.track(self.description)
+            notifier_system._fanout.submit(k, functools.partial(self._deliver, finish, k, v['callback'], response, app=app),
+                                           on_drop=functools.partial(finish, False, dropped=True))
+
+    def _deliver(self, finish, uuid, notify_url, notify_message, app=None):
+        try:
+            self._send_notify_event(uuid, notify_url, notify_message, app=app)
+        except Exception:
+            finish(False)
+            raise
+
+        finish(True)
+
+    def _get_panel_state(self):
+        """
+        Returns the panel state XML, rebuilt only when the decoder's panel
+        state sequence has moved on.
+        """
+        panel_state = current_app.decoder.panel_state
+
+        cached = self._panel_doc
+        if cached is not None and cached[0] == panel_state.seq:
+            return cached[1]
+
+        snapshot = panel_state.snapshot()
+        if not snapshot['state']:
+            return self._build_panel_state()
+
+        self._panel_doc = (snapshot['seq'], self._build_panel_state(snapshot['state']))
+
+        return self._panel_doc[1]
+
+    def _build_panel_state(self, state=None):
+        decoder = current_app.decoder
+        if state is None:
+            state = read_panel_state(decoder.device, decoder.last_message_received)
+
+        ret = dict(state)
+        last_message_received = ret.pop('last_message_received')
+        relays = ret.pop('panel_relay_status')
+        zones = ret.pop('panel_zones_faulted')
 
         relay_status = Element("panel_relay_status")
-        for (address, channel), value in current_app.decoder.device._relay_status.items():
+        for address, channel, value in relays:
             child = Element("r") # keep it small
             SubElement(child,"a").text = str(address)
             SubElement(child,"c").text = str(channel)
@@ -575,28 +671,13 @@ class UPNPPushNotification(BaseNotification):
             relay_status.append(child)
 
         faulted_zones = Element("panel_zones_faulted")
-        for zid, z in current_app.decoder.device._zonetracker.zones.iteritems():
-            if z.status != ADZone.CLEAR:
-                child = Element("z") # keep it small
-                child.text = str(z.zone)
-                faulted_zones.append(child)
-
-        ret = {
-            'panel_type': mode,
-            'panel_powered': current_app.decoder.device._power_status,
-            'panel_ready': getattr(current_app.decoder.device, "_ready_status", True),
-            'panel_alarming': current_app.decoder.device._alarm_status,
-            'panel_bypassed': None in current_app.decoder.device._bypass_status,
-            'panel_armed': current_app.decoder.device._armed_status,
-            'panel_armed_stay': getattr(current_app.decoder.device, "_armed_stay", False),
-            'panel_fire_detected': current_app.decoder.device._fire_status,
-            'panel_battery_trouble': current_app.decoder.device._battery_status[0],
-            'panel_panicked': current_app.decoder.device._panic_status,
-            'panel_chime': getattr(current_app.decoder.device, "_chime_status", False),
-            'panel_perimeter_only': getattr(current_app.decoder.device, "_perimeter_only_status", False),
-            'panel_entry_delay_off': getattr(current_app.decoder.device, "_entry_delay_off_status", False),
-            'panel_exit': getattr(current_app.decoder.device, "_exit", False)
-        }
+        for zone in zones:
+            child = Element("z") # keep it small
+            child.text = str(zone)
+            name = Zone.get_name(zone)
+            if name:
+                child.set("n", name)
+            faulted_zones.append(child)
 
         # convert to XML
         el = Element("panelstate")
@@ -613,7 +694,7 @@ class UPNPPushNotification(BaseNotification):
 
         # HACK: do not allow parsing of last_message_received as XML it is cdata
         cdel = Element("last_message_received")
-        cdel.append(Comment(' --><![CDATA[' + (current_app.decoder.last_message_received or "") + ']]><!-- '))
+        cdel.append(Comment(' --><![CDATA[' + (last_message_received or "") + ']]><!-- '))
         el.append(cdel)
         # wrap in a property tag
         ep = Element("e:property")
@@ -621,10 +702,8 @@ class UPNPPushNotification(BaseNotification):
 
         return tostring(ep)
 
-    # Warning: Threaded so it may be sent later and state may change.
+    # Warning: Runs on the fan-out workers so state may have changed.
     # Never access any AD2* state vars in a threaded function.
-    @threaded
-    @raise_with_stack
     def _send_notify_event(self, uuid, notify_url, notify_message, app=None):
         """
         Send out notify event to subscriber and return a response.
@@ -648,15 +727,12 @@ class UPNPPushNotification(BaseNotification):
             'NTS': 'upnp:propchange'
         }
 
-        http_handler = HTTPConnection(parsed_url.netloc)
-
-        http_handler.request('NOTIFY', parsed_url.path, notify_message, headers)
-        http_response = http_handler.getresponse()
+        http_response = pool.request('NOTIFY', parsed_url.netloc, parsed_url.path, body=notify_message, headers=headers)
 
         app.logger.info('{0}_send_notify_event: status:{1} reason:{2} headers:{3}'.format(self.description, http_response.status, http_response.reason, headers))
 
         if http_response.status != 200:
-            error_msg = '{0} Notification failed: ({1}: {2})'.format(self.description, http_response.status, http_response.read())
+            error_msg = '{0} Notification failed: ({1}: {2})'.format(self.description, http_response.status, http_response.data)
 
             app.logger.warning(error_msg)
             raise Exception(error_msg)
@@ -686,7 +762,7 @@ class MatrixNotification(BaseNotification):
             'Content-type': CUSTOM_CONTENT_TYPES[JSON]
         }
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
 
         try:
             result = False
@@ -748,13 +824,8 @@ class MatrixNotification(BaseNotification):
 
         parsed_url = urlparse("https://" + self.api_endpoint + "/_matrix/client/r0/rooms/" + self.api_room_id + "/send/m.room.message?access_token=" + self.api_token)
 
-        if sys.version_info >= (2,7,9):
-            http_handler = HTTPSConnection(parsed_url.netloc, context=ssl._create_unverified_context())
-        else:
-            http_handler = HTTPSConnection(parsed_url.netloc)
-
-        http_handler.request(CUSTOM_METHOD, parsed_url.path+"?"+parsed_url.query, headers=self.headers, body=data)
-        http_response = http_handler.getresponse()
+        http_response = pool.request(CUSTOM_METHOD, parsed_url.netloc, parsed_url.path+"?"+parsed_url.query,
+                                     body=data, headers=self.headers, use_ssl=True, verify=False)
 
         if http_response.status == 200:
             return True
@@ -782,7 +853,7 @@ class EmailNotification(BaseNotification):
         self.password = obj.get_setting('password')
         self.suppress_timestamp = obj.get_setting('suppress_timestamp',default=False)
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if check_time_restriction(self.starttime, self.endtime):
             msg = MIMEText(text)
 
@@ -831,7 +902,7 @@ class PushoverNotification(BaseNotification):
         self.priority = obj.get_setting('priority')
         self.title = obj.get_setting('title')
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if not have_chump:
             raise Exception('Missing Pushover library: chump - install using pip')
 
@@ -875,7 +946,7 @@ class TwilioNotification(BaseNotification):
         self.suppress_timestamp = obj.get_setting('suppress_timestamp', default=False)
 
     @raise_with_stack
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if have_twilio == False:
             raise Exception('Missing Twilio library: twilio - install using pip')
 
@@ -927,7 +998,7 @@ class TwiMLNotification(BaseNotification):
         self.suppress_timestamp = obj.get_setting('suppress_timestamp', default=False)
 
     @raise_with_stack
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         text = " From " + self.notification_description + ". " + text
         if check_time_restriction(self.starttime, self.endtime):
             if self.suppress_timestamp == False:
@@ -981,7 +1052,7 @@ class ProwlNotification(BaseNotification):
         }
         self.suppress_timestamp = obj.get_setting('suppress_timestamp', default=False)
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if check_time_restriction(self.starttime, self.endtime):
             if self.suppress_timestamp == False:
                 message_timestamp = time.ctime(time.time())
@@ -999,14 +1070,8 @@ class ProwlNotification(BaseNotification):
 
             self.msg_to_send = text + " From " + self.notification_description + "."
 
-            if sys.version_info >= (2,7,9):
-                http_handler = HTTPSConnection(PROWL_URL, context=ssl._create_unverified_context())
-            else:
-                http_handler = HTTPSConnection(PROWL_URL)
-
-            http_handler.request(PROWL_METHOD, PROWL_PATH, headers=self.headers,body=urlencode(notify_data))
-
-            http_response = http_handler.getresponse()
+            http_response = pool.request(PROWL_METHOD, PROWL_URL, PROWL_PATH, body=urlencode(notify_data),
+                                         headers=self.headers, use_ssl=True, verify=False)
 
             if http_response.status == 200:
                 return True
@@ -1043,7 +1108,7 @@ class GrowlNotification(BaseNotification):
 
         self.suppress_timestamp = obj.get_setting('suppress_timestamp', default=False)
 
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         if not have_gntp:
             raise Exception('Missing Growl library: gntp - install using pip')
 
@@ -1123,16 +1188,8 @@ class CustomNotification(BaseNotification):
         if app is None:
             app = current_app
 
-        if self.is_ssl:
-            if sys.version_info >= (2,7,9):
-                http_handler = HTTPSConnection(self.url, context=ssl._create_unverified_context(), timeout=10)
-            else:
-                http_handler = HTTPSConnection(self.url, timeout=10)
-        else:
-            http_handler = HTTPConnection(self.url, timeout=10)
-
-        http_handler.request(CUSTOM_METHOD, self.path, headers=self.headers, body=data)
-        http_response = http_handler.getresponse()
+        http_response = pool.request(CUSTOM_METHOD, self.url, self.path, body=data, headers=self.headers,
+                                     use_ssl=bool(self.is_ssl), verify=False)
 
         if http_response.status >= 200 and http_response.status <= 299:
             return True
@@ -1151,17 +1208,9 @@ class CustomNotification(BaseNotification):
         if app is None:
             app = current_app
 
-        if self.is_ssl:
-            if sys.version_info >= (2,7,9):
-                http_handler = HTTPSConnection(self.url, context=ssl._create_unverified_context())
-            else:
-                http_handler = HTTPSConnection(self.url)
-        else:
-            http_handler = HTTPConnection(self.url)
-
         get_path = self.path + '?' + data
-        http_handler.request(CUSTOM_METHOD_GET, get_path, headers=self.headers)
-        http_response = http_handler.getresponse()
+        http_response = pool.request(CUSTOM_METHOD_GET, self.url, get_path, headers=self.headers,
+                                     use_ssl=bool(self.is_ssl), verify=False)
 
         if http_response.status == 200:
             return True
@@ -1170,7 +1219,7 @@ class CustomNotification(BaseNotification):
             raise Exception('Custom Notification Failed')
 
     @raise_with_stack
-    def send(self, type, text, raw):
+    def send(self, type, text, raw, zone=None, device=None):
         self.msg_to_send = text
 
         result = False
@@ -154,11 +154,10 @@ def create_by_type(type):
 def build_zone_list():
     zone_list = [(str(i), "Zone {0:02d}".format(i)) for i in range(1, 100)]
 
-    zones = Zone.query.all()
     zone_list_len = len(zone_list)
-    for z in zones:
-        if z.zone_id <= zone_list_len - 1:
-            zone_list[z.zone_id - 1] = (str(z.zone_id), 'Zone {0:02d} - {1}'.format(z.zone_id, z.name))
+    for zone_id, (name, description) in Zone.index.items():
+        if zone_id <= zone_list_len - 1:
+            zone_list[zone_id - 1] = (str(zone_id), 'Zone {0:02d} - {1}'.format(zone_id, name))
 
     return zone_list
 
@@ -309,6 +308,8 @@ def edit_message(id):
         db.session.add(message)
         db.session.commit()
 
+        current_app.decoder._notifier_system.invalidate_message(message.id)
+
         flash('The notification message has been updated.', 'success')
 
         return redirect(url_for('notifications.messages'))
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+"""
+Server-side panel state model with delta encoding.
+
+The model is refreshed from the :py:class:`~alarmdecoder.AlarmDecoder`
+instance whenever :py:class:`Decoder` sees a panel message or event.  Only the
+fields that changed are broadcast, tagged with a monotonically increasing
+sequence number.  Clients receive a full snapshot on connect and request a
+new one whenever they notice a gap in the sequence.
+"""
+
+import threading
+
+from alarmdecoder.panels import ADEMCO, DSC
+from alarmdecoder.zonetracking import Zone as ADZone
+
+PANEL_MODES = {
+    ADEMCO: 'ADEMCO',
+    DSC: 'DSC',
+}
+
+
+def read_panel_state(device, last_message_received=None):
+    """
+    Collects the panel state from an AlarmDecoder device.
+
+    :param device: the device to inspect
+    :type device: :py:class:`~alarmdecoder.AlarmDecoder`
+    :param last_message_received: last raw keypad message
+    :type last_message_received: str
+
+    :returns: dict of plain JSON values
+    """
+    faulted = sorted(z.zone for z in list(device._zonetracker.zones.values()) if z.status != ADZone.CLEAR)
+    relays = sorted([address, channel, value] for (address, channel), value in list(device._relay_status.items()))
+
+    return {
+        'panel_type': PANEL_MODES.get(device.mode, 'UNKNOWN'),
+        'panel_powered': device._power_status,
+        'panel_ready': getattr(device, '_ready_status', True),
+        'panel_alarming': device._alarm_status,
+        'panel_bypassed': None in device._bypass_status,
+        'panel_armed': device._armed_status,
+        'panel_armed_stay': getattr(device, '_armed_stay', False),
+        'panel_fire_detected': device._fire_status,
+        'panel_battery_trouble': device._battery_status[0],
+        'panel_panicked': device._panic_status,
+        'panel_chime': getattr(device, '_chime_status', False),
+        'panel_perimeter_only': getattr(device, '_perimeter_only_status', False),
+        'panel_entry_delay_off': getattr(device, '_entry_delay_off_status', False),
+        'panel_exit': getattr(device, '_exit', False),
+        'panel_zones_faulted': faulted,
+        'panel_relay_status': relays,
+        'last_message_received': last_message_received or '',
+    }
+
+
+class PanelState(object):
+    """
+    Tracks the last broadcast panel state and computes deltas against it.
+    """
+
+    def __init__(self):
+        self._state = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def state(self):
+        return self._state
+
+    def update(self, state):
+        """
+        Replaces the current state and returns what changed.
+
+        :param state: new panel state
+        :type state: dict
+
+        :returns: ``{'seq': n, 'changes': {...}}`` or None if nothing changed
+        """
+        with self._lock:
+            changes = {k: v for k, v in state.items() if k not in self._state or self._state[k] != v}
+            if not changes:
+                return None
+
+            self._state = dict(self._state, **changes)
+            self._seq += 1
+
+            return {'seq': self._seq, 'changes': changes}
+
+    def update_from_device(self, device, last_message_received=None):
+        """
+        Reads the device and returns the delta, see :py:meth:`update`.
+        """
+        if device is None:
+            return None
+
+        return self.update(read_panel_state(device, last_message_received))
+
+    def snapshot(self):
+        """
+        Returns the full state for new or resynchronizing clients.
+
+        :returns: ``{'seq': n, 'state': {...}, 'full': True}``
+        """
+        with self._lock:
+            return {'seq': self._seq, 'state': dict(self._state), 'full': True}
+
+    def reset(self):
+        """
+        Forgets the current state, e.g. after the device was reopened, so the
+        next delta carries every field.
+        """
+        with self._lock:
+            self._state = {}
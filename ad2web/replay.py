@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+"""
+Message replay harness for the decoder pipeline.
+
+Feeds a recorded or synthetic AD2 capture through a :py:class:`ReplayDevice`
+into a wired :py:class:`~ad2web.decoder.Decoder`, exactly as lines from a
+real device would arrive, and reports sustained throughput and per-stage
+latency percentiles:
+
+``line``
+    the whole ``on_read`` dispatch of one line (parse plus handlers)
+``parse``
+    ``line`` less the time spent in the Decoder's handlers
+``message`` / ``event``
+    ``Decoder._on_message`` and ``Decoder._handle_event``
+``panel_state``
+    ``Decoder._publish_panel_state``
+``notify``
+    ``NotificationSystem.send``
+``emit``
+    ``Decoder.emit_event``, up to the broadcast queue
+
+Frames are delivered by a real :py:class:`~ad2web.broadcast.BroadcastQueue`
+whose emitter only counts them, so serialization runs as in production but
+no Socket.IO server is needed.
+
+Used by ``flask replay-capture``, ``tests/benchmarks/decoder_replay_benchmark.py``
+and the pytest-benchmark suite in ``tests/benchmarks``.
+"""
+
+import time
+import random
+import logging
+import functools
+
+import numpy as np
+
+from alarmdecoder import AlarmDecoder
+from alarmdecoder.devices.base_device import Device
+
+from .broadcast import BroadcastQueue
+from .notifications import NotificationSystem
+
+logger = logging.getLogger(__name__)
+
+KEYPAD = 'keypad'
+LRR = 'lrr'
+RFX = 'rfx'
+EXP = 'exp'
+AUI = 'aui'
+
+# Rough mix of a busy panel: mostly keypad updates.
+DEFAULT_MIX = {KEYPAD: 70, RFX: 15, EXP: 7, LRR: 5, AUI: 3}
+
+STAGES = ('line', 'parse', 'message', 'event', 'panel_state', 'notify', 'emit')
+PERCENTILES = (50, 90, 99)
+
+_ZONES = ['FRONT DOOR', 'BACK DOOR', 'GARAGE DOOR', 'KITCHEN MOTION', 'LIVING ROOM WIN',
+          'BASEMENT WINDOW', 'HALL SMOKE', 'PATIO DOOR']
+_READY = '[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+_FAULT = '[00000001000000003A--],{0:03d},[f700000510{0:02d}000008020000000000],"FAULT {0:02d} {1:<23}"'
+_ARMED = '[00110001000000003A--],008,[f70000051008001c28020000000000],"ARMED ***STAY***May Exit Now  {0:02d}"'
+_LRR_CODES = ['CID_3401', 'CID_1401', 'CID_1441', 'CID_3441', 'CID_1301', 'CID_3301']
+
+
+def read_capture(path):
+    """
+    Reads a text capture, one AD2 line per line.  Blank lines and ``#``
+    comments are skipped.
+
+    :param path: capture file
+    :type path: str
+
+    :returns: list of lines without line terminators
+    """
+    with open(path) as f:
+        return [line.rstrip('\r\n') for line in f if line.strip() and not line.startswith('#')]
+
+
+def synthetic(count, mix=None, seed=0):
+    """
+    Generates a deterministic capture with the given message mix.
+
+    :param count: number of lines
+    :type count: int
+    :param mix: relative weights keyed by ``keypad``, ``lrr``, ``rfx``,
+                ``exp`` and ``aui``
+    :type mix: dict
+    :param seed: random seed
+    :type seed: int
+
+    :returns: list of lines
+    """
+    mix = mix or DEFAULT_MIX
+    rnd = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+
+    lines = []
+    for kind in rnd.choices(kinds, weights, k=count):
+        if kind == KEYPAD:
+            roll = rnd.random()
+            if roll < 0.4:
+                lines.append(_READY)
+            elif roll < 0.8:
+                zone = rnd.randrange(len(_ZONES))
+                lines.append(_FAULT.format(zone + 1, _ZONES[zone]))
+            else:
+                lines.append(_ARMED.format(rnd.randrange(60)))
+        elif kind == LRR:
+            lines.append('!LRR:{0:03d},1,{1},ff'.format(rnd.randrange(1, 20), rnd.choice(_LRR_CODES)))
+        elif kind == RFX:
+            lines.append('!RFX:0{0:06d},{1:02x}'.format(rnd.randrange(180000, 180010), rnd.choice([0x00, 0x80, 0xa0, 0x08])))
+        elif kind == EXP:
+            lines.append('!{0}:{1:02d},{2:02d},{3:02d}'.format(rnd.choice(['EXP', 'REL']), rnd.randrange(7, 13),
+                                                            rnd.randrange(1, 5), rnd.randrange(2)))
+        elif kind == AUI:
+            lines.append('!AUI:42020000' + '0' * 58)
+
+    return lines
+
+
+def summarize(samples):
+    """
+    Returns latency percentiles of a list of durations.
+
+    :param samples: durations in seconds
+    :type samples: list
+
+    :returns: dict with ``count``, ``mean``, ``p50``, ``p90``, ``p99`` and
+              ``max`` in microseconds
+    """
+    if not samples:
+        return {'count': 0}
+
+    values = np.asarray(samples) * 1e6
+    summary = {'count': len(samples), 'mean': float(values.mean()), 'max': float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary['p{0}'.format(p)] = float(value)
+
+    return summary
+
+
+class ReplayDevice(Device):
+    """
+    Device fed from a capture instead of hardware.  Written data is counted
+    and dropped.
+    """
+    def __init__(self):
+        Device.__init__(self)
+        self._id = 'replay'
+        self.written = 0
+
+    def open(self, baudrate=None, no_reader_thread=False):
+        self._running = True
+        self.on_open()
+
+        return self
+
+    def close(self):
+        self._running = False
+        self.on_close()
+
+    def write(self, data):
+        self.written += len(data)
+        self.on_write(data=data)
+
+        return len(data)
+
+    def read(self):
+        return ''
+
+    def read_line(self, timeout=0.0, purge_buffer=False):
+        return ''
+
+    def purge(self):
+        pass
+
+    def feed(self, line):
+        """
+        Delivers one line as the reader thread would.
+
+        :param line: AD2 line without terminator
+        :type line: str or bytes
+        """
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+
+        self.on_read(data=line)
+
+
+class Replay(object):
+    """
+    Drives a Decoder from a capture and measures each stage.
+    """
+    DRAIN_TIMEOUT = 10
+
+    def __init__(self, decoder):
+        """
+        Constructor
+
+        :param decoder: decoder to wire to a :py:class:`ReplayDevice`
+        :type decoder: :py:class:`~ad2web.decoder.Decoder`
+        """
+        self.decoder = decoder
+        self.device = None
+        self.frames = 0
+        self._saved = None
+        self._samples = dict((stage, []) for stage in STAGES)
+        self._handler_time = 0.0
+
+    def __enter__(self):
+        self.attach()
+        return self
+
+    def __exit__(self, *exc):
+        self.detach()
+
+    def attach(self):
+        """
+        Wires the decoder to a replay device and a counting broadcast queue,
+        and times its stages.  :py:meth:`detach` undoes it.
+        """
+        decoder = self.decoder
+        self._saved = {
+            'device': decoder.device,
+            'broadcast': decoder._broadcast_thread,
+            'notifier': decoder._notifier_system,
+        }
+
+        if decoder._notifier_system is None:
+            # Decoder.init() creates it along with everything else it starts.
+            with decoder.app.app_context():
+                decoder._notifier_system = NotificationSystem()
+
+        decoder._broadcast_thread = BroadcastQueue(emitter=self._count_frame)
+        decoder._broadcast_thread.start()
+
+        for stage, name in (('message', '_on_message'), ('event', '_handle_event')):
+            setattr(decoder, name, self._timed(stage, getattr(decoder, name), handler=True))
+        for stage, name in (('panel_state', '_publish_panel_state'), ('emit', 'emit_event')):
+            setattr(decoder, name, self._timed(stage, getattr(decoder, name)))
+        notifier = decoder._notifier_system
+        notifier.send = self._timed('notify', notifier.send)
+
+        self.device = ReplayDevice()
+        decoder.device = AlarmDecoder(self.device)
+        decoder.bind_events()
+        decoder.device.open()
+
+        self.reset()
+
+    def detach(self):
+        """Restores the decoder's device, broadcast queue and handlers."""
+        if self._saved is None:
+            return
+
+        decoder = self.decoder
+        # Unbound first, so the close does not look like a lost connection.
+        decoder.remove_events()
+        decoder.device.close()
+        decoder._broadcast_thread.stop()
+        decoder._broadcast_thread.join(2)
+
+        for name in ('_on_message', '_handle_event', '_publish_panel_state', 'emit_event'):
+            decoder.__dict__.pop(name, None)
+        decoder._notifier_system.__dict__.pop('send', None)
+
+        decoder.device = self._saved['device']
+        decoder._broadcast_thread = self._saved['broadcast']
+        decoder._notifier_system = self._saved['notifier']
+        self._saved = None
+
+    def reset(self):
+        """Clears the samples of previous runs."""
+        for samples in self._samples.values():
+            del samples[:]
+        self.frames = 0
+
+    def run(self, lines, rate=None, offsets=None):
+        """
+        Replays lines and waits for the broadcast queue to drain.
+
+        :param lines: AD2 lines
+        :type lines: list
+        :param rate: lines per second, or None for as fast as possible
+        :type rate: float
+        :param offsets: seconds from the start at which each line is fed,
+                        e.g. from a capture journal; overrides ``rate``
+        :type offsets: list
+
+        :returns: dict with ``lines``, ``seconds``, ``throughput`` (lines per
+                  second), ``target_rate``, ``max_behind_ms`` (worst lag
+                  against the target schedule), ``drain_ms``, ``frames``,
+                  ``broadcast`` (queue counters) and ``stages`` (see
+                  :py:func:`summarize`)
+        """
+        feed = self.device.feed
+        samples = self._samples
+        interval = 1.0 / rate if rate else 0
+        behind = 0.0
+
+        started = time.perf_counter()
+        for i, line in enumerate(lines):
+            if offsets is not None or interval:
+                due = started + (offsets[i] if offsets is not None else i * interval)
+                now = time.perf_counter()
+                if now < due:
+                    time.sleep(due - now)
+                else:
+                    behind = max(behind, now - due)
+
+            self._handler_time = 0.0
+            line_started = time.perf_counter()
+            feed(line)
+            elapsed = time.perf_counter() - line_started
+
+            samples['line'].append(elapsed)
+            samples['parse'].append(elapsed - self._handler_time)
+        seconds = time.perf_counter() - started
+
+        drain_started = time.perf_counter()
+        queue = self.decoder._broadcast_thread
+        while queue.depth and time.perf_counter() - drain_started < self.DRAIN_TIMEOUT:
+            time.sleep(0.001)
+        drain = time.perf_counter() - drain_started
+
+        return {
+            'lines': len(lines),
+            'seconds': seconds,
+            'throughput': len(lines) / seconds if seconds else 0.0,
+            'target_rate': rate,
+            'max_behind_ms': behind * 1000,
+            'drain_ms': drain * 1000,
+            'frames': self.frames,
+            'broadcast': queue.stats(),
+            'stages': dict((stage, summarize(values)) for stage, values in samples.items()),
+        }
+
+    @staticmethod
+    def format_report(report):
+        """
+        Formats a :py:meth:`run` report as text.
+
+        :returns: list of lines
+        """
+        broadcast = report['broadcast']
+        lines = [
+            '{0:>12}: {1:10.0f} lines/s, {2} lines in {3:.2f} s (max {4:.1f} ms behind)'.format(
+                'throughput', report['throughput'], report['lines'], report['seconds'], report['max_behind_ms']),
+            '{0:>12}: {1} sent, {2} coalesced, {3} dropped, drained in {4:.1f} ms'.format(
+                'broadcast', broadcast['sent'], broadcast['coalesced'], broadcast['dropped'], report['drain_ms']),
+            '{0:>12}  {1:>8} {2:>9} {3:>9} {4:>9} {5:>9}'.format('stage (us)', 'count', 'p50', 'p90', 'p99', 'max'),
+        ]
+
+        for stage in STAGES:
+            summary = report['stages'][stage]
+            if summary['count']:
+                lines.append('{0:>12}: {1:8d} {2:9.1f} {3:9.1f} {4:9.1f} {5:9.1f}'.format(
+                    stage, summary['count'], summary['p50'], summary['p90'], summary['p99'], summary['max']))
+
+        return lines
+
+    def _count_frame(self, event_name, data, namespace, room=None):
+        self.frames += 1
+
+    def _timed(self, stage, func, handler=False):
+        samples = self._samples[stage]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                samples.append(elapsed)
+                if handler:
+                    self._handler_time += elapsed
+
+        return wrapper
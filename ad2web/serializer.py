@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+"""
+Schema-driven serialization of AlarmDecoder messages and events for Socket.IO.
+
+The converters below replace the old ``jsonpickle.encode(..., unpicklable=False)``
+path in :py:meth:`Decoder.emit_event`.  Instead of walking arbitrary object
+graphs each message class has a fixed list of fields that is compiled once into
+an ``attrgetter``, so turning a message into a plain dict is a single C-level
+call followed by a ``zip``.  The result is handed to Flask-SocketIO untouched
+and therefore only gets JSON encoded once.
+"""
+
+import datetime
+from operator import attrgetter
+
+from alarmdecoder.messages import (BaseMessage, Message, LRRMessage, RFMessage,
+                                   ExpanderMessage, AUIMessage)
+
+# Field schema for each message class.  Order is kept stable so that payloads
+# are deterministic and easy to diff when debugging.
+BASE_FIELDS = ('raw', 'timestamp')
+
+MESSAGE_SCHEMAS = {
+    Message: BASE_FIELDS + (
+        'bitfield', 'numeric_code', 'panel_data', 'mask', 'ready', 'armed_away',
+        'armed_home', 'backlight_on', 'programming_mode', 'beeps', 'zone_bypassed',
+        'ac_power', 'chime_on', 'alarm_event_occurred', 'alarm_sounding',
+        'battery_low', 'entry_delay_off', 'fire_alarm', 'check_zone',
+        'perimeter_only', 'system_fault', 'panel_type', 'text', 'cursor_location'),
+    LRRMessage: BASE_FIELDS + (
+        'event_data', 'event_data_type', 'partition', 'event_type', 'version',
+        'report_code', 'event_prefix', 'event_source', 'event_status',
+        'event_code', 'event_description'),
+    RFMessage: BASE_FIELDS + (
+        'serial_number', 'value', 'battery', 'supervision', 'loop'),
+    ExpanderMessage: BASE_FIELDS + (
+        'type', 'address', 'channel', 'value'),
+    AUIMessage: BASE_FIELDS + (
+        'value',),
+    BaseMessage: BASE_FIELDS,
+}
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+_PRIMITIVE_TYPES = frozenset(_PRIMITIVES)
+
+
+class MessageSerializer(object):
+    """
+    Converts AlarmDecoder message objects and event keyword arguments into
+    compact, JSON-ready dictionaries.
+    """
+
+    def __init__(self, schemas=None):
+        """
+        Constructor
+
+        :param schemas: mapping of message class to a tuple of field names.
+        :type schemas: dict
+        """
+        self._schemas = {}
+        self._converters = {}
+
+        for cls, fields in (schemas or MESSAGE_SCHEMAS).items():
+            self.register(cls, fields)
+
+    def register(self, cls, fields):
+        """
+        Registers (or replaces) the field schema for a message class.
+
+        :param cls: message class
+        :type cls: type
+        :param fields: attribute names to serialize
+        :type fields: tuple
+        """
+        fields = tuple(fields)
+        self._schemas[cls] = fields
+        # Lookups are cached per concrete type, so drop anything derived.
+        self._converters.clear()
+
+    def serialize(self, data):
+        """
+        Converts a payload into plain JSON types.
+
+        :param data: payload to convert
+        :type data: any
+
+        :returns: JSON-ready representation of the payload
+        """
+        if type(data) in _PRIMITIVE_TYPES:
+            return data
+
+        converter = self._converters.get(type(data))
+        if converter is None:
+            converter = self._compile(type(data))
+
+        return converter(data)
+
+    def _compile(self, cls):
+        if issubclass(cls, BaseMessage):
+            fields = self._schema_for(cls)
+            getter = attrgetter(*fields)
+
+            serialize = self.serialize
+
+            # Most fields are already primitives, so skip the call for those.
+            if len(fields) == 1:
+                converter = lambda obj: {fields[0]: serialize(getter(obj))}
+            else:
+                converter = lambda obj: {k: v if type(v) in _PRIMITIVE_TYPES else serialize(v)
+                                         for k, v in zip(fields, getter(obj))}
+
+        elif issubclass(cls, (datetime.datetime, datetime.date, datetime.time)):
+            converter = lambda obj: obj.isoformat()
+        elif issubclass(cls, dict):
+            converter = self._convert_dict
+        elif issubclass(cls, (list, tuple, set, frozenset)):
+            converter = lambda obj: [self.serialize(v) for v in obj]
+        elif issubclass(cls, bytes):
+            converter = lambda obj: obj.decode('utf-8', 'replace')
+        elif hasattr(cls, 'dict'):
+            converter = lambda obj: self._convert_dict(obj.dict())
+        else:
+            converter = str
+
+        self._converters[cls] = converter
+
+        return converter
+
+    def _schema_for(self, cls):
+        for klass in cls.__mro__:
+            if klass in self._schemas:
+                return self._schemas[klass]
+
+        return BASE_FIELDS
+
+    def _convert_dict(self, d):
+        return {str(k): v if type(v) in _PRIMITIVE_TYPES else self.serialize(v)
+                for k, v in d.items()}
+
+
+serializer = MessageSerializer()
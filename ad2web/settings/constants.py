@@ -8,12 +8,14 @@ from ..zones import Zone
 from ..keypad import KeypadButton
 from ..cameras import Camera
 from ..api import APIKey
+from ..devices import DeviceConfig
 
 HOSTS_FILE = '/etc/hosts'
 HOSTNAME_FILE = '/etc/hostname'
 NETWORK_FILE = '/etc/network/interfaces'
 
 NONE = 0
+HOURLY = 3600
 DAILY = 86400
 WEEKLY = 7 * DAILY
 MONTHLY = 30 * DAILY
@@ -50,7 +52,8 @@ def get_export_map():
         'zones.json': Zone,
         'buttons.json': KeypadButton,
         'cameras.json': Camera,
-        'apikeys.json': APIKey
+        'apikeys.json': APIKey,
+        'devices.json': DeviceConfig
     }
 
 IP_CHECK_SERVER_URL = "https://www.httpbin.org/ip"
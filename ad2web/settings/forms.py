@@ -18,7 +18,7 @@ from ..utils import allowed_file, ALLOWED_AVATAR_EXTENSIONS, INSTANCE_FOLDER_PAT
 from ..utils import SEX_TYPE
 
 from ..widgets import ButtonField
-from .constants import DAILY, WEEKLY, MONTHLY, NONE
+from .constants import HOURLY, DAILY, WEEKLY, MONTHLY, NONE
 
 class ProfileForm(Form):
     multipart = True
@@ -62,6 +62,8 @@ class PasswordForm(Form):
 
 class ImportSettingsForm(Form):
     import_file = FileField(u'Settings Archive', [DataRequired()])
+    dry_run = BooleanField(u'Dry Run?', default=False, description=u'Only check the archive and report what would change')
+    sid = HiddenField()
 
     submit = SubmitField(u'Import')
 
@@ -129,11 +131,13 @@ class VersionCheckerForm(Form):
     submit = SubmitField(u'Save')
 
 class ExportConfigureForm(Form):
-    frequency = SelectField(u'Frequency', choices=[(NONE, u'None'), (DAILY, u'Daily'), (WEEKLY, u'Weekly'), (MONTHLY, u'Monthly')], default=NONE, description=u'Frequency of Automatic Export', coerce=int)
+    frequency = SelectField(u'Frequency', choices=[(NONE, u'None'), (HOURLY, u'Hourly'), (DAILY, u'Daily'), (WEEKLY, u'Weekly'), (MONTHLY, u'Monthly')], default=NONE, description=u'Frequency of Automatic Export', coerce=int)
     email = BooleanField(u'Email Export?', default=True)
     email_address = StringField(u'Email Address', [Optional(), Length(max=255)], description=u'Email Address to Send Export to')
     local_file = BooleanField(u'Save to Local File?', default=True)
     local_file_path = StringField(u'Path to Save file', [Optional(), Length(max=255)], default=os.path.join(INSTANCE_FOLDER_PATH, 'exports'), description='Path on AlarmDecoder to Save Export')
     days_to_keep = IntegerField(u'Days to Keep Exports on Disk?', [Optional(), NumberRange(1, 255)],default=7)
+    incremental = BooleanField(u'Incremental Backups?', default=False, description=u'Only export rows changed since the last backup')
+    full_every = IntegerField(u'Incremental Backups Between Full Backups', [Optional(), NumberRange(1, 1000)], default=24)
 
     submit = SubmitField(u'Save')
@@ -1,8 +1,81 @@
 # -*- coding: utf-8 -*-
 
 from sqlalchemy import Column
+from sqlalchemy.orm import make_transient_to_detached
 
 from ..extensions import db
+from ..tablecache import TableCache
+
+
+class SettingsCache(TableCache):
+    """
+    Process-wide cache of the settings table, see :py:class:`TableCache`.
+    """
+
+    def __init__(self):
+        TableCache.__init__(self)
+        self._rows = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        :returns: dict
+        """
+        return {
+            'size': len(self._rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+        }
+
+    def get(self, name):
+        """
+        Returns the cached ``(id, int_value, string_value)`` row for a setting.
+
+        :param name: setting name
+        :type name: str
+
+        :returns: tuple or None if the setting does not exist
+        """
+        with self._lock:
+            self.load()
+
+            row = self._rows.get(name)
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return row
+
+    def _load(self):
+        rows = db.session.query(Setting.id, Setting.name, Setting.int_value, Setting.string_value).all()
+
+        self._rows = {name: (id, int_value, string_value) for id, name, int_value, string_value in rows}
+
+    def _clear(self):
+        self._rows = {}
+
+    def _row(self, setting):
+        return (setting.id, setting.name, setting.int_value, setting.string_value)
+
+    def _store(self, row):
+        id, name, int_value, string_value = row
+
+        # A renamed setting leaves its old name behind.
+        for old_name, old_row in list(self._rows.items()):
+            if old_row[0] == id and old_name != name:
+                del self._rows[old_name]
+
+        self._rows[name] = (id, int_value, string_value)
+
+    def _discard(self, row):
+        self._rows.pop(row[1], None)
+
 
 class Setting(db.Model):
     __tablename__ = 'settings'
@@ -12,16 +85,53 @@ class Setting(db.Model):
     int_value = Column(db.Integer)
     string_value = Column(db.String(255))
 
+    cache = SettingsCache()
+
     @classmethod
     def get_by_name(cls, name, default=None):
-        setting = cls.query.filter_by(name=name).first()
-        if not setting:
-            setting = Setting(name=name)
-            if default is not None:
-                setting.value = default
+        row = cls.cache.get(name)
+        if row is not None:
+            existing = db.session.identity_map.get(db.session.identity_key(Setting, row[0]))
+            if existing is not None:
+                return existing
+
+            setting = Setting(id=row[0], name=name, int_value=row[1], string_value=row[2])
+            make_transient_to_detached(setting)
+
+            # Attach without a SELECT so callers can still modify and commit it.
+            return db.session.merge(setting, load=False)
+
+        setting = Setting(name=name)
+        if default is not None:
+            setting.value = default
 
         return setting
 
+    @classmethod
+    def get_many(cls, names, defaults=None):
+        """
+        Reads several setting values at once, straight from the cache.
+
+        :param names: setting names
+        :type names: list
+        :param defaults: fallback values keyed by name
+        :type defaults: dict
+
+        :returns: dict of name to value
+        """
+        defaults = defaults or {}
+
+        ret = {}
+        for name in names:
+            row = cls.cache.get(name)
+            value = None
+            if row is not None:
+                value = row[1] if row[1] is not None else row[2]
+
+            ret[name] = value if value is not None else defaults.get(name)
+
+        return ret
+
     @property
     def value(self):
         for k in ('int_value', 'string_value'):
@@ -53,3 +163,6 @@ class Setting(db.Model):
             val = other.value
 
         return self.value != val
+
+
+Setting.cache.watch(Setting)
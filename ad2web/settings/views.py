@@ -3,8 +3,6 @@
 import os
 import platform
 import hashlib
-import io
-import tarfile
 import json
 import re
 import socket
@@ -38,7 +36,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from alarmdecoder.panels import DSC
 from ..ser2sock import ser2sock
-from ..extensions import db
+from ..extensions import db, socketio
 
 from ..utils import allowed_file, make_dir, INSTANCE_FOLDER_PATH
 from ..decorators import admin_required
@@ -49,6 +47,7 @@ from .constants import HOSTS_FILE, HOSTNAME_FILE, NETWORK_FILE, KNOWN_MODULES, D
 from ..upnp import UPNP
 from sh import hostname
 from ..exporter import Exporter
+from ..importer import Importer
 
 try:
     from sh import service
@@ -502,6 +501,8 @@ def configure_exports():
         if form.local_file_path.data == '':
             form.local_file_path.data = os.path.join(INSTANCE_FOLDER_PATH, 'exports')
         form.days_to_keep.data = Setting.get_by_name('days_to_keep',default=7).value
+        form.incremental.data = Setting.get_by_name('export_incremental',default=False).value
+        form.full_every.data = Setting.get_by_name('export_full_every',default=24).value
 
     if form.validate_on_submit():
         frequency = int(form.frequency.data)
@@ -510,6 +511,8 @@ def configure_exports():
         local_file = form.local_file.data
         local_file_path = form.local_file_path.data
         days = form.days_to_keep.data
+        incremental = form.incremental.data
+        full_every = form.full_every.data
 
         to_email = Setting.get_by_name('export_mailer_to')
         to_email.value = email_address
@@ -528,12 +531,19 @@ def configure_exports():
         days_to_keep = Setting.get_by_name('days_to_keep')
         days_to_keep.value = days
 
+        export_incremental = Setting.get_by_name('export_incremental')
+        export_incremental.value = incremental
+        export_full_every = Setting.get_by_name('export_full_every')
+        export_full_every.value = full_every
+
         db.session.add(to_email)
         db.session.add(email)
         db.session.add(export_frequency)
         db.session.add(localfile)
         db.session.add(localpath)
         db.session.add(days_to_keep)
+        db.session.add(export_incremental)
+        db.session.add(export_full_every)
 
         db.session.commit()
 
@@ -751,40 +761,36 @@ def switch_branch():
 def import_backup():
     form = ImportSettingsForm()
     form.multipart = True
-    if form.validate_on_submit():
-        archive_data = form.import_file.data.read()
-        fileobj = io.BytesIO(archive_data)
+    use_ssl = Setting.get_by_name('use_ssl', default=False).value
 
-        prefix = 'alarmdecoder-export'
+    if form.validate_on_submit():
+        progress = None
+        if form.sid.data:
+            sid = form.sid.data
 
-        try:
-            with tarfile.open(mode='r:gz', fileobj=fileobj) as tar:
-                root = tar.getmember(prefix)
+            def progress(data):
+                socketio.emit('import_progress', data, namespace='/alarmdecoder', to=sid)
 
-                # Get the EXPORT_MAP dynamically to avoid circular imports
-                from .constants import get_export_map
-                EXPORT_MAP = get_export_map()
+        # The upload is spooled to disk by werkzeug and read as a stream.
+        importer = Importer(form.import_file.data.stream, progress=progress)
 
-                for member in tar.getmembers():
-                    if member.name == prefix:
-                        continue
-                    else:
-                        filename = os.path.basename(member.name)
-                        if filename in EXPORT_MAP.keys():
-                            _import_model(tar, member, EXPORT_MAP[filename])
+        try:
+            report = importer.run(dry_run=form.dry_run.data)
 
-                db.session.commit()
+            if form.dry_run.data:
+                return render_template('settings/import.html', form=form, ssl=use_ssl, report=report)
 
-                _import_refresh()
+            _import_refresh()
 
+            if report['errors']:
+                for error in report['errors']:
+                    current_app.logger.error('Import Error: {0}'.format(error))
+                flash('Import finished with errors: {0}'.format('; '.join(report['errors'])), 'error')
+            else:
                 current_app.logger.info('Successfully imported backup file.')
                 flash('Import finished.', 'success')
 
-                return redirect(url_for('frontend.index'))
-
-        except (tarfile.ReadError, KeyError) as err:
-            current_app.logger.error('Import Error: {0}'.format(err))
-            flash('Import Failed: Not a valid AlarmDecoder archive.', 'error')
+            return redirect(url_for('frontend.index'))
 
         except (SQLAlchemyError, ValueError) as err:
             db.session.rollback()
@@ -792,34 +798,8 @@ def import_backup():
             current_app.logger.error('Import Error: {0}'.format(err))
             flash('Import failed: {0}'.format(err), 'error')
 
-    use_ssl = Setting.get_by_name('use_ssl', default=False).value
-
     return render_template('settings/import.html', form=form, ssl=use_ssl)
 
-def _import_model(tar, tarinfo, model):
-    model.query.delete()
-
-    filedata = tar.extractfile(tarinfo).read()
-    items = json.loads(filedata)
-
-    # If we're importing User, get it dynamically
-    is_user_model = model.__name__ == 'User'
-    if is_user_model:
-        User, _, _, _ = get_user_related_constants()
-
-    for itm in items:
-        m = model()
-        for k, v in itm.iteritems():
-            if isinstance(model.__table__.columns[k].type, db.DateTime) and v is not None:
-                v = datetime.strptime(v, '%Y-%m-%d %H:%M:%S.%f')
-
-            if k == 'password' and is_user_model:
-                setattr(m, '_password', v)
-            else:
-                setattr(m, k, v)
-
-        db.session.add(m)
-
 def _import_refresh():
     from ..certificate import Certificate, CA, SERVER
     config_path = Setting.get_by_name('ser2sock_config_path')
@@ -1,6 +1,15 @@
 var AlarmDecoder = function() {
     var AlarmDecoder = {};
     var _socket = null;
+    var _panel_state = {};
+    var _panel_seq = null;
+    var _following_log = false;
+    var _device = 0;    // Device being viewed; 0 is the primary device.
+
+    // Payloads arrive as objects; older servers sent pre-encoded JSON strings.
+    var _decode = function(msg) {
+        return (typeof msg === 'string') ? JSON.parse(msg) : msg;
+    };
 
     AlarmDecoder.init = function() {
         this.connect("/alarmdecoder");
@@ -13,11 +22,20 @@ var AlarmDecoder = function() {
             'max reconnection attempts': Infinity,
         });
 
-        _socket.on('connect', function() { });
+        _socket.on('connect', function() {
+            // Rooms don't survive a reconnect.
+            if (_following_log)
+                _socket.emit('log_follow');
+            if (_device !== 0) {
+                // The server puts every client in the primary device's room.
+                _socket.emit('device_unsubscribe', 0);
+                _socket.emit('device_subscribe', _device);
+            }
+        });
         _socket.on('disconnect', function() { });
 
         _socket.on('message', function(msg) {
-            obj = JSON.parse(msg);
+            obj = _decode(msg);
 
             msg = obj.message;
             msg.message_type = obj.message_type;
@@ -26,42 +44,121 @@ var AlarmDecoder = function() {
         });
 
         _socket.on('event', function(msg) {
-            obj = JSON.parse(msg);
+            obj = _decode(msg);
 
             PubSub.publish('event', obj);
         });
 
+        _socket.on('panel_state', function(msg) {
+            obj = _decode(msg);
+
+            // Frames from a device we just switched away from.
+            if (obj.device_id !== undefined && obj.device_id !== _device)
+                return;
+
+            if (obj.full) {
+                _panel_state = obj.state;
+                _panel_seq = obj.seq;
+            }
+            else {
+                // Stale delta, already covered by a snapshot.
+                if (_panel_seq !== null && obj.seq <= _panel_seq)
+                    return;
+
+                // Missed a delta; ask for a fresh snapshot.
+                if (_panel_seq === null || obj.seq !== _panel_seq + 1) {
+                    _socket.emit('panel_state_resync', _panel_seq, _device);
+                    return;
+                }
+
+                for (var key in obj.changes)
+                    _panel_state[key] = obj.changes[key];
+                _panel_seq = obj.seq;
+            }
+
+            PubSub.publish('panel_state', { 'seq': _panel_seq, 'state': _panel_state, 'changes': obj.full ? obj.state : obj.changes });
+        });
+
         _socket.on('test', function(msg) {
-            obj = JSON.parse(msg);
+            obj = _decode(msg);
 
             PubSub.publish('test', obj);
         });
 
         _socket.on('device_open', function(msg) {
-            obj = JSON.parse(msg)
+            obj = _decode(msg);
 
             PubSub.publish('device_open', obj);
         });
 
         _socket.on('device_close', function(msg) {
-            obj = JSON.parse(msg)
+            obj = _decode(msg);
 
             PubSub.publish('device_close', obj);
         });
 
         _socket.on('firmwareupload', function(msg) {
-            obj = JSON.parse(msg);
+            obj = _decode(msg);
 
             PubSub.publish('firmwareupload', obj);
         });
+
+        _socket.on('log_lines', function(msg) {
+            obj = _decode(msg);
+
+            PubSub.publish('log_lines', obj);
+        });
+
+        _socket.on('import_progress', function(msg) {
+            obj = _decode(msg);
+
+            PubSub.publish('import_progress', obj);
+        });
     };
 
     AlarmDecoder.disconnect = function() {
         _socket.disconnect();
     };
 
+    AlarmDecoder.panel_state = function() {
+        return _panel_state;
+    };
+
+    AlarmDecoder.device = function() {
+        return _device;
+    };
+
+    // Switches the messages, events and panel state received to another device.
+    AlarmDecoder.view_device = function(device_id) {
+        if (device_id === _device)
+            return;
+
+        _socket.emit('device_unsubscribe', _device);
+        _device = device_id;
+        _panel_state = {};
+        _panel_seq = null;
+        _socket.emit('device_subscribe', device_id);
+    };
+
+    AlarmDecoder.devices = function(callback) {
+        _socket.emit('devices', callback);
+    };
+
+    AlarmDecoder.follow_log = function(follow) {
+        _following_log = follow;
+        _socket.emit(follow ? 'log_follow' : 'log_unfollow');
+    };
+
+    AlarmDecoder.sid = function() {
+        return _socket ? _socket.id : null;
+    };
+
     AlarmDecoder.emit = function(type, arg) {
-        _socket.emit(type, arg);
+        // Keys go to the device being viewed.
+        if (type === 'keypress')
+            _socket.emit(type, arg, _device);
+        else
+            _socket.emit(type, arg);
     };
 
     return AlarmDecoder;
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory copies of small, read-mostly tables (settings, zones).
+"""
+
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from .extensions import db
+
+
+class TableCache(object):
+    """
+    Process-wide copy of a table, loaded once per engine.
+
+    Rows written through the ORM are held by the session that flushed them
+    and applied when that session commits, so other threads never see
+    uncommitted values and a rollback only drops that session's changes.
+    Bulk ``query.delete()`` calls bypass the mapper events, so callers
+    doing them must :py:meth:`invalidate` afterwards.
+
+    Subclasses implement :py:meth:`_load`, :py:meth:`_clear`,
+    :py:meth:`_row`, :py:meth:`_store` and :py:meth:`_discard`.
+    """
+
+    def __init__(self):
+        self._engine = None
+        self._lock = threading.RLock()
+        self._key = None
+
+        self.loads = 0
+
+    def watch(self, model):
+        """
+        Follows the ORM writes to a model.
+
+        :param model: the cached model
+        :type model: :py:class:`flask_sqlalchemy.Model`
+        """
+        self._key = 'table_cache.' + model.__tablename__
+
+        event.listen(model, 'after_insert', self._on_store)
+        event.listen(model, 'after_update', self._on_store)
+        event.listen(model, 'after_delete', self._on_discard)
+        event.listen(Session, 'after_commit', self._on_commit)
+        event.listen(Session, 'after_rollback', self._on_rollback)
+
+    def load(self):
+        """
+        Loads the table if it has not been loaded for this engine yet.
+        """
+        with self._lock:
+            engine = db.engine
+            if self._engine is engine:
+                return
+
+            self._load()
+            self._engine = engine
+            self.loads += 1
+
+    def invalidate(self):
+        """
+        Drops everything; the table is reloaded on the next read.
+        """
+        with self._lock:
+            self._clear()
+            self._engine = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _row(self, target):
+        """Returns the cached fields of a flushed object."""
+        raise NotImplementedError
+
+    def _store(self, row):
+        raise NotImplementedError
+
+    def _discard(self, row):
+        raise NotImplementedError
+
+    def _on_store(self, mapper, connection, target):
+        self._defer(target, True)
+
+    def _on_discard(self, mapper, connection, target):
+        self._defer(target, False)
+
+    def _defer(self, target, store):
+        session = object_session(target)
+        if session is None:
+            self._apply([(store, self._row(target))])
+            return
+
+        session.info.setdefault(self._key, []).append((store, self._row(target)))
+
+    def _on_commit(self, session):
+        changes = session.info.pop(self._key, None)
+        if changes:
+            self._apply(changes)
+
+    def _on_rollback(self, session):
+        session.info.pop(self._key, None)
+
+    def _apply(self, changes):
+        with self._lock:
+            # Not loaded yet; the load will read the committed rows.
+            if self._engine is None:
+                return
+
+            for store, row in changes:
+                if store:
+                    self._store(row)
+                else:
+                    self._discard(row)
@@ -1,5 +1,14 @@
 <script type="text/javascript">
     var timeout;
+    var log_lines = [];
+    var LOG_FILE = 'info.log';
+
+    function show_log_lines(num_lines)
+    {
+        log_lines = log_lines.slice(-num_lines);
+        $('#log_data').val(log_lines.join('\r\n') + '\r\n');
+    }
+
     function get_log_data(num_lines)
     {
         $.ajax({
@@ -7,24 +16,82 @@
             dataType: "json",
             url: '/log/alarmdecoder/get_data/' + num_lines,
             success: function(data) {
-                var newline = '\r\n';
-                $('#log_data').val('');
-                for( var i = 0; i < data.length; i++ )
-                {
-                    text = $.trim(data[i]);
-                    $('#log_data').val( $('#log_data').val() + text + newline );
-                }
+                log_lines = $.map(data, function(line) { return $.trim(line); });
+                show_log_lines(num_lines);
+            },
+        });
+    }
+
+    function poll_log_data(num_lines)
+    {
+        get_log_data(num_lines);
+        timeout = setTimeout(function(){ poll_log_data(num_lines); }, 10000);
+    }
+
+    function follow_log(num_lines)
+    {
+        window.clearTimeout(timeout);
+        get_log_data(num_lines);
+
+        // New lines are pushed as they are written; poll only without a socket.
+        if (typeof decoder !== 'undefined' && decoder !== null)
+            decoder.follow_log(true);
+        else
+            timeout = setTimeout(function(){ poll_log_data(num_lines); }, 10000);
+    }
+
+    function query_records()
+    {
+        var params = {};
+        $.each($('#records_query').serializeArray(), function(i, field) {
+            if (field.value)
+                params[field.name] = field.value;
+        });
+
+        $.ajax({
+            type: "GET",
+            dataType: "json",
+            url: '/log/alarmdecoder/records',
+            data: params,
+            success: function(data) {
+                var tbody = $('#records_table tbody').empty();
+                $.each(data.records, function(i, record) {
+                    var message = record.exc ? record.message + '\n' + record.exc : record.message;
+                    tbody.append($('<tr>')
+                        .append($('<td>').text(record.time.replace('T', ' ').slice(0, 23)))
+                        .append($('<td>').text(record.level))
+                        .append($('<td>').text(record.logger + ':' + record.line))
+                        .append($('<td>').append($('<pre>').text(message))));
+                });
+                $('#records_summary').text(data.records.length + ' records, ' + data.scanned + ' of ' + data.segments + ' segments read');
+            },
+            error: function(xhr) {
+                var data = xhr.responseJSON || {};
+                $('#records_summary').text(data.error || 'Error querying log records');
             },
         });
-        timeout = setTimeout(function(){ get_log_data(num_lines); }, 10000);
     }
 
     $(document).ready(function() {
         var num_lines = $('#num_lines').val();
-        get_log_data(num_lines);
+
+        $('#records_query').submit(function(e) {
+            e.preventDefault();
+            query_records();
+        });
+        follow_log(num_lines);
+
+        PubSub.subscribe('log_lines', function(type, msg) {
+            if (msg.file !== LOG_FILE || $('#stop_refresh').prop('checked'))
+                return;
+
+            for (var i = 0; i < msg.lines.length; i++)
+                log_lines.push($.trim(msg.lines[i]));
+
+            show_log_lines($('#num_lines').val());
+        });
 
         $('#num_lines').change(function() {
-            window.clearTimeout(timeout);
             num_lines = $('#num_lines').val();
             get_log_data(num_lines);
         });
@@ -47,11 +114,15 @@
             var isChecked = $('#stop_refresh').prop('checked') ? true : false;
 
             if( isChecked )
+            {
                 window.clearTimeout(timeout);
+                if (typeof decoder !== 'undefined' && decoder !== null)
+                    decoder.follow_log(false);
+            }
             else
             {
                 num_lines = $('#num_lines').val();
-                get_log_data(num_lines);
+                follow_log(num_lines);
             }
         });
     });
@@ -27,6 +27,16 @@
                 $('#loading').hide();
             }
         }
+        // Keyset cursors returned by the server, keyed by the page they continue to.
+        var pageCursors = {};
+        function pageKey(aoData, next)
+        {
+            var params = {};
+            $.each(aoData, function(i, item) { params[item.name] = item.value; });
+
+            var start = parseInt(params.iDisplayStart, 10) + (next ? parseInt(params.iDisplayLength, 10) : 0);
+            return params.sSearch + '|' + params.iDisplayLength + '|' + start;
+        }
         $(document).ready(function() {
             $.fn.dataTableExt.oPagination.iFullNumbersShowPages = 3;
             $.fn.spin.presets.flower = {
@@ -59,6 +69,19 @@
                     {"type": "date" },
                 ],
                 "sAjaxSource": "/log/retrieve_events_paging_data",
+                "fnServerParams": function(aoData) {
+                    var cursor = pageCursors[pageKey(aoData, false)];
+                    if (cursor)
+                        aoData.push({ "name": "sCursor", "value": cursor });
+                },
+                "fnServerData": function(sSource, aoData, fnCallback, oSettings) {
+                    oSettings.jqXHR = $.getJSON(sSource, aoData, function(json) {
+                        if (json.sCursor)
+                            pageCursors[pageKey(aoData, true)] = json.sCursor;
+
+                        fnCallback(json);
+                    });
+                },
                 "aaSorting": [[0, "desc" ]],
                 "oLanguage": {
                     "sInfoFiltered": "",
@@ -91,6 +114,7 @@
                         $.ajax({
                             url: "/log/delete",
                         }).done( function( data ) {
+                            pageCursors = {};
                             oTable.fnClearTable();
                         });
                     },
@@ -126,6 +126,23 @@ def tar_add_textfile(tar, name, data, parent_path=None):
     tar.addfile(ti, io.TextIOWrapper(buffer=io.BytesIO(data), encoding='ascii'))
 
 
+def tar_add_fileobj(tar, name, fileobj, parent_path=None):
+    """Adds a seekable binary file from its current position to the end."""
+    path = name
+    if parent_path:
+        path = os.path.join(parent_path, name)
+
+    start = fileobj.tell()
+    fileobj.seek(0, io.SEEK_END)
+
+    ti = tarfile.TarInfo(name=path)
+    ti.mtime = time.time()
+    ti.size = fileobj.tell() - start
+    fileobj.seek(start)
+
+    tar.addfile(ti, fileobj)
+
+
 # Wrappers to support older versions of Flask-Login alongside newer ones
 def user_is_authenticated(user):
     if user is None:
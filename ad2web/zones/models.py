@@ -3,6 +3,69 @@
 from sqlalchemy import Column
 
 from ..extensions import db
+from ..tablecache import TableCache
+
+
+class ZoneIndex(TableCache):
+    """
+    In-memory ``zone_id -> (name, description)`` index of the zones table,
+    see :py:class:`TableCache`.
+    """
+
+    def __init__(self):
+        TableCache.__init__(self)
+        self._zones = {}
+        self._ids = {}
+
+    def get(self, zone_id):
+        """
+        Returns ``(name, description)`` for a zone.
+
+        :param zone_id: zone number
+        :type zone_id: int
+
+        :returns: tuple or None if the zone is not named
+        """
+        with self._lock:
+            self.load()
+
+            return self._zones.get(zone_id)
+
+    def items(self):
+        """
+        Returns all ``(zone_id, (name, description))`` pairs ordered by zone.
+        """
+        with self._lock:
+            self.load()
+
+            return sorted(self._zones.items())
+
+    def _load(self):
+        rows = db.session.query(Zone.id, Zone.zone_id, Zone.name, Zone.description).all()
+
+        self._zones = {zone_id: (name, description) for id, zone_id, name, description in rows}
+        self._ids = {id: zone_id for id, zone_id, name, description in rows}
+
+    def _clear(self):
+        self._zones = {}
+        self._ids = {}
+
+    def _row(self, zone):
+        return (zone.id, zone.zone_id, zone.name, zone.description)
+
+    def _store(self, row):
+        id, zone_id, name, description = row
+
+        # A renumbered zone leaves its old number behind.
+        old_id = self._ids.get(id)
+        if old_id is not None and old_id != zone_id:
+            self._zones.pop(old_id, None)
+
+        self._zones[zone_id] = (name, description)
+        self._ids[id] = zone_id
+
+    def _discard(self, row):
+        self._zones.pop(self._ids.pop(row[0], row[1]), None)
 
 
 class Zone(db.Model):
@@ -13,8 +76,13 @@ class Zone(db.Model):
     name = Column(db.String(32), nullable=False)
     description = Column(db.String(255))
 
+    index = ZoneIndex()
+
     @classmethod
     def get_name(cls, id):
-        zone = cls.query.filter_by(zone_id=id).first()
+        zone = cls.index.get(id)
+
+        return zone[0] if zone is not None else None
+
 
-        return zone.name if zone is not None else None
+Zone.index.watch(Zone)
@@ -90,11 +90,15 @@ def import_zone():
     delete_all_zones()
 
     for d in data:
-        address = d['address']
+        try:
+            address = int(d['address'])
+        except (ValueError, TypeError):
+            continue
+
         name = d['zone_name']
         description = d['zone_name'] if d['zone_name'] != '' else 'Generated - No Alpha Found'
 
-        if not zone_exists_in_db(address):
+        if address not in zones and Zone.index.get(address) is None:
             zone = Zone()
 
             zone.zone_id = address
@@ -114,17 +118,11 @@ def import_zone():
 
     return jsonify(success=zones)
 
-def zone_exists_in_db(id):
-    zone = Zone.query.filter_by(zone_id=id).first()
-
-    if zone:
-        return True
-
-    return False
-
 def delete_all_zones():
     try:
         db.session.query(Zone).delete()
         db.session.commit()
     except:
         db.session.rollback()
+
+    Zone.index.invalidate()
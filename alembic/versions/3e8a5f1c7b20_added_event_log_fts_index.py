@@ -0,0 +1,60 @@
+"""Added full-text index for event log messages.
+
+Revision ID: 3e8a5f1c7b20
+Revises: 9c41e7a2b3d5
+Create Date: 2026-10-17 14:02:51.640127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3e8a5f1c7b20'
+down_revision = '9c41e7a2b3d5'
+
+from alembic import op
+import sqlalchemy as sa
+
+# Rows indexed per statement so large logs don't build one huge transaction step.
+CHUNK = 10000
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    # Rows above this id are indexed by the insert trigger.
+    up_to = bind.execute(sa.text("SELECT MAX(id) FROM event_log")).scalar() or 0
+
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS event_log_fts USING fts5("
+               "message, content='event_log', content_rowid='id', prefix='2 3')")
+    op.execute("CREATE TRIGGER IF NOT EXISTS event_log_fts_insert AFTER INSERT ON event_log BEGIN "
+               "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS event_log_fts_delete AFTER DELETE ON event_log BEGIN "
+               "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS event_log_fts_update AFTER UPDATE OF message ON event_log BEGIN "
+               "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+               "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
+
+    last_id = 0
+    while last_id < up_to:
+        next_id = bind.execute(sa.text(
+            "SELECT MAX(id) FROM (SELECT id FROM event_log WHERE id > :last AND id <= :up_to ORDER BY id LIMIT :chunk)"),
+            {'last': last_id, 'up_to': up_to, 'chunk': CHUNK}).scalar()
+        if next_id is None:
+            break
+
+        bind.execute(sa.text(
+            "INSERT INTO event_log_fts(rowid, message) SELECT id, message FROM event_log WHERE id > :last AND id <= :next"),
+            {'last': last_id, 'next': next_id})
+        last_id = next_id
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_insert")
+    op.execute("DROP TABLE IF EXISTS event_log_fts")
@@ -0,0 +1,48 @@
+"""Added event log zone, retention index and rollup tables.
+
+Revision ID: 5b7d2e9a4c61
+Revises: 3e8a5f1c7b20
+Create Date: 2026-10-17 15:36:08.413902
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2e9a4c61'
+down_revision = '3e8a5f1c7b20'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('event_log', sa.Column('zone', sa.SmallInteger(), nullable=True))
+    op.create_index('ix_event_log_type_timestamp', 'event_log', ['type', 'timestamp'])
+
+    for name in ('event_log_hourly', 'event_log_daily'):
+        op.create_table(name,
+        sa.Column('period', sa.DateTime(), nullable=False),
+        sa.Column('type', sa.SmallInteger(), nullable=False),
+        sa.Column('zone', sa.SmallInteger(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('period', 'type', 'zone')
+        )
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+
+    # Existing rows have no zone.  Periods are written in the format the
+    # DateTime type uses on SQLite so later increments find the same rows.
+    op.execute("INSERT INTO event_log_hourly (period, type, zone, count) "
+               "SELECT substr(timestamp, 1, 13) || ':00:00.000000', type, -1, COUNT(*) "
+               "FROM event_log WHERE timestamp IS NOT NULL GROUP BY 1, 2")
+    op.execute("INSERT INTO event_log_daily (period, type, zone, count) "
+               "SELECT substr(timestamp, 1, 10) || ' 00:00:00.000000', type, -1, COUNT(*) "
+               "FROM event_log WHERE timestamp IS NOT NULL GROUP BY 1, 2")
+
+
+def downgrade():
+    op.drop_table('event_log_daily')
+    op.drop_table('event_log_hourly')
+    op.drop_index('ix_event_log_type_timestamp', 'event_log')
+    op.drop_column('event_log', 'zone')
@@ -0,0 +1,40 @@
+"""Added devices table and event log device column.
+
+Revision ID: 7d4c1b9e2f08
+Revises: 5b7d2e9a4c61
+Create Date: 2026-10-17 18:12:44.105237
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d4c1b9e2f08'
+down_revision = '5b7d2e9a4c61'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('devices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('enabled', sa.Boolean(), nullable=False),
+    sa.Column('device_type', sa.String(length=32), nullable=False),
+    sa.Column('device_location', sa.String(length=32), nullable=False),
+    sa.Column('device_path', sa.String(length=255), nullable=True),
+    sa.Column('device_baudrate', sa.Integer(), nullable=True),
+    sa.Column('device_address', sa.String(length=255), nullable=True),
+    sa.Column('device_port', sa.Integer(), nullable=True),
+    sa.Column('use_ssl', sa.Boolean(), nullable=False),
+    sa.Column('address_mask', sa.String(length=8), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+    # Existing rows predate multiple devices and stay NULL.
+    op.add_column('event_log', sa.Column('device', sa.SmallInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('event_log', 'device')
+    op.drop_table('devices')
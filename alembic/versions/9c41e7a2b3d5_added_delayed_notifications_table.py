@@ -0,0 +1,33 @@
+"""Added delayed notifications table.
+
+Revision ID: 9c41e7a2b3d5
+Revises: 823cb6eb9df4
+Create Date: 2026-10-17 10:12:44.218306
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9c41e7a2b3d5'
+down_revision = '823cb6eb9df4'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('delayed_notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('notification_id', sa.Integer(), nullable=False),
+    sa.Column('zone', sa.Integer(), nullable=False),
+    sa.Column('type', sa.Integer(), nullable=False),
+    sa.Column('send_time', sa.Float(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=True),
+    sa.Column('raw', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_delayed_notifications_send_time', 'delayed_notifications', ['send_time'])
+
+
+def downgrade():
+    op.drop_index('ix_delayed_notifications_send_time', 'delayed_notifications')
+    op.drop_table('delayed_notifications')
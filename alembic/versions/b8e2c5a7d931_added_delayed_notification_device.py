@@ -0,0 +1,23 @@
+"""Added device column to delayed notifications.
+
+Revision ID: b8e2c5a7d931
+Revises: 7d4c1b9e2f08
+Create Date: 2026-10-17 21:04:17.512960
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2c5a7d931'
+down_revision = '7d4c1b9e2f08'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Pending rows were scheduled for the primary device and stay NULL.
+    op.add_column('delayed_notifications', sa.Column('device', sa.SmallInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('delayed_notifications', 'device')
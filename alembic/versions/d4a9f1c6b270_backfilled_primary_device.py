@@ -0,0 +1,29 @@
+"""Backfilled the primary device on rows written before multiple devices.
+
+Revision ID: d4a9f1c6b270
+Revises: b8e2c5a7d931
+Create Date: 2026-10-18 09:41:26.338104
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9f1c6b270'
+down_revision = 'b8e2c5a7d931'
+
+from alembic import op
+
+
+# ad2web.devices.PRIMARY_DEVICE
+PRIMARY_DEVICE = 0
+
+
+def upgrade():
+    # Events and delayed notifications from before the devices table all
+    # came from the primary device, which new rows record as 0.
+    op.execute('UPDATE event_log SET device = {0} WHERE device IS NULL'.format(PRIMARY_DEVICE))
+    op.execute('UPDATE delayed_notifications SET device = {0} WHERE device IS NULL'.format(PRIMARY_DEVICE))
+
+
+def downgrade():
+    # The backfilled rows can't be told apart from new ones; nothing to undo.
+    pass
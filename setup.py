@@ -35,7 +35,7 @@ setup(
         'pyopenssl',
     ],
     extras_require={
-        'dev': ['pytest', 'coverage', 'mypy', 'flake8']
+        'dev': ['pytest', 'pytest-benchmark', 'coverage', 'mypy', 'flake8']
     },
     classifiers=[
         'Development Status :: 4 - Beta',
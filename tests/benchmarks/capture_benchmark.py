@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+    Capture Benchmark
+    ~~~~~~~~~~~~~~~~~
+
+    Compares the cost per line of the binary capture journal with writing
+    the same lines through a text ``logging.FileHandler``.
+
+    Run from the project root:
+
+        PYTHONPATH=. python tests/benchmarks/capture_benchmark.py [lines]
+"""
+import os
+import sys
+import time
+import logging
+import tempfile
+
+from ad2web.capture import CaptureWriter, READ
+from ad2web.replay import synthetic
+
+
+def binary_journal(path, lines):
+    writer = CaptureWriter(path, max_bytes=1 << 30)
+    for line in lines:
+        writer.write(READ, line)
+    writer.close()
+
+
+def text_log(path, lines):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    log = logging.getLogger('capture_benchmark')
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    log.addHandler(handler)
+
+    for line in lines:
+        log.info('Received: %s', line)
+
+    log.removeHandler(handler)
+    handler.close()
+
+
+def main(count=200000):
+    lines = synthetic(count)
+    tmp = tempfile.mkdtemp()
+
+    print('Lines: {0}'.format(count))
+    results = {}
+    for name, func in (('text log', text_log), ('journal', binary_journal)):
+        path = os.path.join(tmp, name.replace(' ', '_'))
+        started = time.perf_counter()
+        func(path, lines)
+        elapsed = time.perf_counter() - started
+
+        results[name] = elapsed / count * 1e6
+        print('{0:>10}: {1:8.2f} us/line {2:10d} bytes'.format(name, results[name], os.path.getsize(path)))
+
+    print('{0:>10}: {1:8.2f}x'.format('speedup', results['text log'] / results['journal']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
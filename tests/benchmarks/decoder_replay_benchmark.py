@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+    Decoder Replay Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Replays a synthetic or recorded AD2 capture through a wired ``Decoder``
+    (parser, panel state, notifications, broadcast queue) and prints the
+    sustained throughput and per-stage latency percentiles.
+
+    Run from the project root:
+
+        PYTHONPATH=. python tests/benchmarks/decoder_replay_benchmark.py [lines] [rate] [capture]
+
+    ``rate`` is lines per second, 0 for as fast as possible.  With a
+    ``capture`` file its lines are repeated up to ``lines``.
+"""
+import sys
+
+from ad2web.app import create_app
+from ad2web.config import TestConfig
+from ad2web.extensions import db
+from ad2web.replay import Replay, read_capture, synthetic
+
+
+def load(lines, capture=None):
+    if capture is None:
+        return synthetic(lines)
+
+    recorded = read_capture(capture)
+    return (recorded * (lines // len(recorded) + 1))[:lines]
+
+
+def main(lines=20000, rate=0, capture=None):
+    app, _ = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+
+        with Replay(app.decoder) as replay:
+            report = replay.run(load(lines, capture), rate=rate or None)
+
+    print('Lines: {0}, target rate: {1}'.format(report['lines'], rate or 'unpaced'))
+    for line in Replay.format_report(report):
+        print(line)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0,
+         sys.argv[3] if len(sys.argv) > 3 else None)
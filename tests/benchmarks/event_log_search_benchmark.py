@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+    Event Log Search Benchmark
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares ``LIKE '%term%'`` scans with the FTS5 index from
+    :py:mod:`ad2web.log.search` on a synthetic event log.
+
+    Run from the project root:
+
+        PYTHONPATH=. python tests/benchmarks/event_log_search_benchmark.py [rows]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+from ad2web.log.search import FTS_DDL, parse, match_expression
+
+ZONES = ['Front Door', 'Back Door', 'Garage Door', 'Kitchen Window', 'Living Room Motion',
+         'Basement Window', 'Hallway Smoke', 'Master Bedroom Window', 'Patio Door', 'Office Motion']
+
+TEMPLATES = [
+    'Zone {zone} ({num}) has been faulted.',
+    'Zone {zone} ({num}) has been restored.',
+    'Zone {zone} ({num}) has been bypassed.',
+    'The alarm system has been armed (AWAY).',
+    'The alarm system has been armed (STAY).',
+    'The alarm system has been disarmed.',
+    'Alarm tripped by zone {zone} ({num})!',
+    'Power status has changed to AC.',
+    'Low battery detected.',
+    'Partition 1 Open/Close Event by user {num}',
+]
+
+QUERIES = ['garage', 'kitch', '"front door"', 'zone:"patio door"', 'armed away', 'nomatch']
+
+SCHEMA = ("CREATE TABLE event_log (id INTEGER PRIMARY KEY, type SMALLINT NOT NULL, "
+          "timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, message TEXT NOT NULL)")
+
+
+def build(path, rows, with_index):
+    db = sqlite3.connect(path)
+    db.execute(SCHEMA)
+    db.execute("CREATE INDEX ix_event_log_timestamp ON event_log (timestamp)")
+    if with_index:
+        for statement in FTS_DDL:
+            db.execute(statement)
+
+    rnd = random.Random(42)
+
+    def generate():
+        for i in range(rows):
+            zone = rnd.randrange(len(ZONES))
+            message = rnd.choice(TEMPLATES).format(zone=ZONES[zone], num=zone + 1)
+            yield (rnd.randrange(1, 20), '2020-01-01 00:00:00', message)
+
+    started = time.time()
+    db.executemany("INSERT INTO event_log (type, timestamp, message) VALUES (?, ?, ?)", generate())
+    db.commit()
+
+    return db, time.time() - started
+
+
+def time_query(db, sql, params, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.time()
+        db.execute(sql, params).fetchall()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best * 1000
+
+
+def main(rows=1000000):
+    tmp = tempfile.mkdtemp()
+    plain, plain_load = build(os.path.join(tmp, 'plain.db'), rows, False)
+    indexed, indexed_load = build(os.path.join(tmp, 'fts.db'), rows, True)
+
+    print('Rows: {0}'.format(rows))
+    print('{0:>22}: {1:8.1f} s (plain) {2:8.1f} s (with FTS triggers)'.format('load', plain_load, indexed_load))
+    print('{0:>22}  {1:>12} {2:>12} {3:>12} {4:>12}'.format('query', 'like count', 'fts count', 'like page', 'fts page'))
+
+    for query in QUERIES:
+        terms = parse(query)
+        like = ' AND '.join(['message LIKE ?'] * len(terms))
+        like_params = ['%' + value + '%' for kind, value in terms]
+        match = "id IN (SELECT rowid FROM event_log_fts WHERE event_log_fts MATCH ?)"
+        match_params = [match_expression(terms)]
+        page = " ORDER BY timestamp DESC, id DESC LIMIT 25"
+
+        print('{0:>22}: {1:9.1f} ms {2:9.1f} ms {3:9.1f} ms {4:9.1f} ms'.format(
+            query,
+            time_query(plain, "SELECT COUNT(*) FROM event_log WHERE " + like, like_params),
+            time_query(indexed, "SELECT COUNT(*) FROM event_log WHERE " + match, match_params),
+            time_query(plain, "SELECT id FROM event_log WHERE " + like + page, like_params),
+            time_query(indexed, "SELECT id FROM event_log WHERE " + match + page, match_params)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    Serializer Benchmark
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compares the schema-driven serializer used by ``Decoder.emit_event`` with
+    the previous ``jsonpickle`` path on a recorded AD2 message corpus.
+
+    Run from the project root:
+
+        PYTHONPATH=. python tests/benchmarks/serializer_benchmark.py [iterations]
+"""
+import os
+import sys
+import json
+import timeit
+
+from alarmdecoder.messages import Message, LRRMessage, RFMessage, ExpanderMessage, AUIMessage
+from alarmdecoder.util import InvalidMessageError
+
+from ad2web.serializer import serializer
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'ad2_capture.txt')
+
+MESSAGE_TYPES = {
+    '!LRR': (LRRMessage, 'lrr'),
+    '!RFX': (RFMessage, 'rfx'),
+    '!EXP': (ExpanderMessage, 'exp'),
+    '!REL': (ExpanderMessage, 'exp'),
+    '!AUI': (AUIMessage, 'aui'),
+}
+
+
+def load_corpus(path=CORPUS):
+    """Parses the corpus into ``(message, message_type)`` pairs."""
+    messages = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            cls, ftype = MESSAGE_TYPES.get(line[0:4], (Message, 'panel'))
+            if line[0] == '!' and cls is Message:
+                continue    # Boot/version/config lines are not emitted.
+
+            try:
+                messages.append((cls(line), ftype))
+            except InvalidMessageError:
+                pass
+
+    return messages
+
+
+def jsonpickle_path(messages):
+    import jsonpickle
+
+    for message, ftype in messages:
+        # Old Decoder.emit_event: jsonpickle, then SocketIO encodes the string again.
+        json.dumps(jsonpickle.encode({'message': message, 'message_type': ftype}, unpicklable=False))
+
+
+def serializer_path(messages):
+    for message, ftype in messages:
+        json.dumps(serializer.serialize({'message': message, 'message_type': ftype}))
+
+
+def main(iterations=200):
+    messages = load_corpus()
+    print('Corpus: {0} messages, {1} iterations'.format(len(messages), iterations))
+
+    results = {}
+    for name, func in (('jsonpickle', jsonpickle_path), ('serializer', serializer_path)):
+        try:
+            elapsed = min(timeit.repeat(lambda: func(messages), number=iterations, repeat=3))
+        except ImportError as err:
+            print('{0:>12}: skipped ({1})'.format(name, err))
+            continue
+
+        per_message = elapsed / (iterations * len(messages)) * 1e6
+        results[name] = per_message
+        print('{0:>12}: {1:8.2f} us/message'.format(name, per_message))
+
+    if len(results) == 2:
+        print('{0:>12}: {1:8.2f}x'.format('speedup', results['jsonpickle'] / results['serializer']))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+    Decoder hot path benchmarks, run with pytest-benchmark:
+
+        pytest tests/benchmarks/test_decoder_replay.py --benchmark-autosave
+        pytest tests/benchmarks/test_decoder_replay.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+    Per-stage percentiles of the last round are kept in ``extra_info``.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from ad2web.app import create_app
+from ad2web.config import TestConfig
+from ad2web.extensions import db
+from ad2web.replay import Replay, KEYPAD, LRR, RFX, EXP, AUI, read_capture, synthetic
+
+CAPTURE = os.path.join(os.path.dirname(__file__), 'data', 'ad2_capture.txt')
+LINES = 2000
+
+
+@pytest.fixture
+def replay():
+    app, _ = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+
+        with Replay(app.decoder) as replay:
+            yield replay
+
+
+def _bench(benchmark, replay, lines):
+    def setup():
+        replay.reset()
+        return (lines,), {}
+
+    report = benchmark.pedantic(replay.run, setup=setup, rounds=5)
+
+    benchmark.extra_info['throughput'] = report['throughput']
+    for stage, summary in report['stages'].items():
+        if summary['count']:
+            benchmark.extra_info[stage] = dict((k, summary[k]) for k in ('p50', 'p90', 'p99'))
+
+    assert report['stages']['line']['count'] == len(lines)
+    assert report['broadcast']['errors'] == 0
+
+    return report
+
+
+def test_recorded_capture(benchmark, replay):
+    recorded = read_capture(CAPTURE)
+    _bench(benchmark, replay, (recorded * (LINES // len(recorded) + 1))[:LINES])
+
+
+@pytest.mark.parametrize('kind', [KEYPAD, LRR, RFX, EXP, AUI])
+def test_message_type(benchmark, replay, kind):
+    _bench(benchmark, replay, synthetic(LINES, mix={kind: 1}))
+
+
+def test_mixed(benchmark, replay):
+    report = _bench(benchmark, replay, synthetic(LINES))
+
+    assert report['stages']['message']['count'] > 0
+    assert report['stages']['event']['count'] > 0
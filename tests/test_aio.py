@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import time
+import socket
+import threading
+
+import pytest
+
+from ad2web.aio import AsyncRuntime
+
+
+@pytest.fixture
+def runtime():
+    runtime = AsyncRuntime()
+    runtime.start()
+    yield runtime
+    runtime.stop()
+
+
+@pytest.fixture
+def server():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    received = []
+
+    def serve():
+        conn, _ = listener.accept()
+        conn.sendall(b'!Sending.done\r\n\xff[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "\r\n')
+        data = conn.recv(64)
+        received.append(data)
+        conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+
+    yield listener.getsockname(), received
+
+    thread.join(2)
+    listener.close()
+
+
+def _wait(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_stream_device_dispatches_lines(runtime, server):
+    interface, received = server
+    lines, closed = [], []
+
+    device = runtime.device(interface)
+    device.on_read += lambda sender, data: lines.append(data)
+    device.on_close += lambda sender: closed.append(True)
+    device.open()
+    device.write('K1234\r')
+
+    assert _wait(lambda: closed)
+    assert lines == [b'!Sending.done',
+                     b'[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "']
+    assert received == [b'K1234\r']
+    assert not device.is_reader_alive()
+
+
+def test_schedule_runs_checks_without_overlap(runtime):
+    active, overlaps = [], []
+
+    def check():
+        if active:
+            overlaps.append(True)
+        active.append(True)
+        time.sleep(0.02)
+        active.pop()
+
+    runtime.schedule('check', check, lambda: 0)
+
+    assert _wait(lambda: runtime.stats()['checks']['check']['runs'] >= 3)
+    assert not overlaps
+    assert runtime.stats()['checks']['check']['duration_ms_max'] >= 20
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+
+from ad2web.extensions import db
+from ad2web.backup import IncrementalBackup, read_manifest, FULL, DELTA
+from ad2web.settings import Setting
+from ad2web.zones import Zone
+
+from tests import TestCase
+
+
+class TestIncrementalBackup(TestCase):
+
+    def setUp(self):
+        super(TestIncrementalBackup, self).setUp()
+        self.folder = tempfile.mkdtemp()
+        self.backup = IncrementalBackup(full_every=2, folder=self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+        super(TestIncrementalBackup, self).tearDown()
+
+    def _set(self, name, value):
+        setting = Setting.get_by_name(name)
+        setting.value = value
+        db.session.add(setting)
+        db.session.commit()
+
+    def test_deltas_hold_only_changed_rows(self):
+        self._set('backup_test', 'one')
+        full = read_manifest(self.backup.run())
+
+        assert self.backup.run() is None
+
+        self._set('backup_test_2', 'two')
+        delta = read_manifest(self.backup.run())
+
+        assert full['kind'] == FULL
+        assert delta['kind'] == DELTA
+        assert delta['parent'] == full['id']
+        assert delta['tables'] == {'settings': 1}
+
+    def test_restore_replays_base_and_deltas(self):
+        self._set('backup_test', 'one')
+        self.backup.run()
+        self._set('backup_test', 'two')
+        self.backup.run()
+
+        Setting.query.filter_by(name='backup_test').delete()
+        db.session.commit()
+
+        self.backup.restore()
+
+        assert Setting.get_by_name('backup_test').value == 'two'
+        assert len(self.backup.chain()) == 2
+
+    def test_restore_refreshes_zone_names(self):
+        db.session.add(Zone(zone_id=7, name='Front Door'))
+        db.session.commit()
+        self.backup.run()
+
+        Zone.query.filter_by(zone_id=7).first().name = 'Renamed'
+        db.session.commit()
+        assert Zone.get_name(7) == 'Renamed'
+
+        self.backup.restore(self.backup.chain()[0]['id'])
+
+        assert Zone.get_name(7) == 'Front Door'
+
+    def test_identical_archives_are_stored_once(self):
+        self._set('backup_test', 'one')
+        first = self.backup.run()
+        os.remove(self.backup.state_path)
+
+        assert self.backup.run() == first
+        assert len(self.backup.archives()) == 1
+
+    def test_ambiguous_prefix_is_rejected(self):
+        self._set('backup_test', 'one')
+        self.backup.run()
+        self._set('backup_test', 'two')
+        self.backup.run()
+
+        ids = sorted(self.backup.archives())
+        with self.assertRaises(ValueError):
+            self.backup.chain('')
+
+        assert self.backup.chain(ids[0][:12])[-1]['id'] == ids[0]
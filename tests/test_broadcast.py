@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+from alarmdecoder.messages import Message
+
+from ad2web.broadcast import BroadcastQueue
+
+READY = '[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+FAULT = '[00000001000000003A--],003,[f70000051003000008020000000000],"FAULT 03 FRONT DOOR             "'
+
+
+def _queue(**kwargs):
+    sent = []
+    queue = BroadcastQueue(emitter=lambda event, data, namespace: sent.append((event, data)), **kwargs)
+    return queue, sent
+
+
+def test_keypad_frames_coalesce_per_partition():
+    queue, sent = _queue()
+    queue.put('message', {'message': Message(READY), 'message_type': 'panel'})
+    queue.put('message', {'message': Message(FAULT), 'message_type': 'panel'})
+
+    assert queue.flush() == 1
+    assert sent[0][1]['message']['raw'] == FAULT
+    assert queue.stats()['coalesced'] == 1
+
+
+def test_events_are_never_dropped():
+    queue, sent = _queue(max_depth=2)
+    queue.put('message', {'message': Message(READY), 'message_type': 'panel'})
+    for zone in range(5):
+        queue.put('event', {'zone': zone, 'event_type': 8})
+
+    queue.flush()
+
+    assert [data['zone'] for event, data in sent] == [0, 1, 2, 3, 4]
+    assert queue.stats()['dropped'] == 1
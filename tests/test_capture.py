@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import pytest
+
+from ad2web.capture import (CaptureWriter, CaptureReader, RECORD, READ, KEYPRESS,
+                            journal_files, read_journal)
+
+LINE = b'[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('capture.ad2j'))
+    writer = CaptureWriter(path)
+    writer.write(READ, LINE)
+    writer.write(KEYPRESS, '1234')
+    writer.write(READ, b'!RFX:0180036,80')
+    writer.close()
+
+    records = list(read_journal(path))
+
+    assert [(r.kind, r.data) for r in records] == [(READ, LINE), (KEYPRESS, b'1234'), (READ, b'!RFX:0180036,80')]
+    assert records[0].time <= records[1].time <= records[2].time
+    assert writer.stats()['records'] == 3
+
+
+def test_idle_writer_flushes_on_timer(tmpdir):
+    path = str(tmpdir.join('capture.ad2j'))
+    writer = CaptureWriter(path, flush_interval=0.05)
+    writer.write(READ, LINE)
+    writer.write(KEYPRESS, '1234')
+
+    deadline = time.time() + 5
+    while len(list(read_journal(path))) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert [r.data for r in read_journal(path)] == [LINE, b'1234']
+    writer.close()
+
+
+def test_rotation_keeps_order(tmpdir):
+    path = str(tmpdir.join('capture.ad2j'))
+    writer = CaptureWriter(path, max_bytes=(RECORD.size + 8) * 10, backups=2)
+    for i in range(50):
+        writer.write(READ, '{0:08d}'.format(i))
+    writer.close()
+
+    files = journal_files(path)
+    assert files == [path + '.2', path + '.1', path]
+    assert writer.rotations > 2
+
+    # Older files beyond the backups are gone; what is left is contiguous.
+    values = [int(r.data) for r in read_journal(path)]
+    assert values == list(range(values[0], 50))
+
+
+def test_new_run_starts_a_new_file(tmpdir):
+    path = str(tmpdir.join('capture.ad2j'))
+    for line in (b'first', b'second'):
+        writer = CaptureWriter(path)
+        writer.write(READ, line)
+        writer.close()
+
+    assert [r.data for r in read_journal(path)] == [b'first', b'second']
+
+
+def test_truncated_tail_is_ignored(tmpdir):
+    path = str(tmpdir.join('capture.ad2j'))
+    writer = CaptureWriter(path)
+    writer.write(READ, b'complete')
+    writer.write(READ, b'cut short')
+    writer.close()
+
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+
+    with CaptureReader(path) as reader:
+        assert [r.data for r in reader] == [b'complete']
+
+
+def test_rejects_other_files(tmpdir):
+    path = tmpdir.join('capture.ad2j')
+    path.write('not a journal, just some text')
+
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import logging
+import contextlib
+
+from alarmdecoder import AlarmDecoder
+from alarmdecoder.messages import Message
+
+from ad2web.broadcast import BroadcastQueue
+from ad2web.decoder import Decoder, DeviceConnection, resolve_device_config
+from ad2web.devices import DeviceConfig, PRIMARY_DEVICE, device_room
+from ad2web.panelstate import PanelState
+from ad2web.replay import ReplayDevice
+
+READY = '[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+
+
+class FakeApp(object):
+    logger = logging.getLogger(__name__)
+
+    def app_context(self):
+        return contextlib.nullcontext()
+
+
+class FakeDecoder(object):
+    """The primary device plus the decoder's event handlers."""
+    bind_events = Decoder.bind_events
+    remove_events = Decoder.remove_events
+    _on_device_open = Decoder._on_device_open
+    _on_device_close = Decoder._on_device_close
+    _on_message = Decoder._on_message
+    _publish_panel_state = Decoder._publish_panel_state
+
+    def __init__(self):
+        self.app = FakeApp()
+        self.logger = self.app.logger
+        self.device_id = PRIMARY_DEVICE
+        self.name = None
+        self.device = None
+        self.panel_state = PanelState()
+        self.last_message_received = None
+        self._capture = None
+        self._runtime = None
+        self.emitted = []
+
+    def emit_event(self, event_name, data=None, namespace='/alarmdecoder', device_id=None):
+        self.emitted.append((event_name, device_id))
+
+
+def _config(**kwargs):
+    settings = dict(id=1, name='garage', device_type='AD2USB', device_location='network',
+                    device_address='127.0.0.1', device_port=10000, use_ssl=False, address_mask='FFFFFFFF')
+    settings.update(kwargs)
+    return DeviceConfig(**settings)
+
+
+def test_device_rooms_coalesce_separately():
+    sent = []
+    queue = BroadcastQueue(emitter=lambda event, data, namespace, room=None: sent.append((data['message']['raw'], room)))
+    for device_id in (PRIMARY_DEVICE, 1):
+        queue.put('message', {'message': Message(READY), 'message_type': 'panel'}, room=device_room(device_id))
+
+    assert queue.flush() == 2
+    assert [room for raw, room in sent] == ['device:0', 'device:1']
+    assert queue.stats()['coalesced'] == 0
+
+
+def test_resolve_network_device():
+    config = resolve_device_config(_config(device_port=10001).settings())
+
+    assert config['interface'] == ('127.0.0.1', 10001)
+    assert not config['serial'] and not config['use_ssl']
+    assert resolve_device_config(_config(device_location='local', device_path=None).settings()) is None
+
+
+def test_connection_events_are_tagged():
+    decoder = FakeDecoder()
+    connection = DeviceConnection(decoder, _config())
+
+    device = ReplayDevice()
+    connection.device = AlarmDecoder(device)
+    decoder.bind_events(connection)
+    connection.device.open()
+    device.feed(READY)
+
+    assert ('device_open', 1) in decoder.emitted
+    assert ('message', 1) in decoder.emitted
+    assert ('panel_state', 1) in decoder.emitted
+    assert connection.last_message_received is not None
+    assert connection.panel_state.seq == 1
+
+    # The primary device's state is untouched.
+    assert decoder.last_message_received is None
+    assert decoder.panel_state.seq == 0
+
+    connection.close()
+    assert connection.device is None
+
+
+def test_connection_open_failure_is_recorded():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    decoder = FakeDecoder()
+    connection = DeviceConnection(decoder, _config(device_port=port))
+    connection.open()
+
+    assert connection.device is None
+    assert connection.last_open_error
+    assert connection.stats()['id'] == 1
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from ad2web.extensions import db
+from ad2web.log import EventLogEntry, ALARM, ZONE_FAULT
+from ad2web.log import rollup
+from ad2web.log.retention import EventLogMaintenance
+from ad2web.log.writer import EventLogWriter
+
+from tests import TestCase
+
+
+class TestEventLogRetention(TestCase):
+
+    def test_old_zone_events_expire_and_rollups_keep_counts(self):
+        writer = EventLogWriter(self.app)
+        for i in range(5):
+            writer.put(ZONE_FAULT, 'Zone 3 has been faulted.', 3)
+        writer.put(ALARM, 'Alarm tripped by zone 3!', 3)
+
+        db.session.execute(db.text("UPDATE event_log SET timestamp = '2020-01-01 10:00:00'"))
+        db.session.commit()
+
+        maintenance = EventLogMaintenance(self.app, batch_size=2, batch_pause=0)
+        assert maintenance.run_once() == 5
+        assert maintenance.stats()['expired'] == {'ZONE FAULT': 5}
+
+        # Alarms are kept forever.
+        db.session.remove()
+        assert [e.type for e in EventLogEntry.query.all()] == [ALARM]
+
+        counts = dict((c['type'], c['count']) for c in rollup.history('day', zone=3))
+        assert counts == {ZONE_FAULT: 5, ALARM: 1}
+
+    def test_rebuild_counts_rows_per_hour(self):
+        db.session.add(EventLogEntry(type=ZONE_FAULT, message='a', zone=1, timestamp=datetime.datetime(2020, 1, 1, 10, 5)))
+        db.session.add(EventLogEntry(type=ZONE_FAULT, message='b', zone=1, timestamp=datetime.datetime(2020, 1, 1, 10, 55)))
+        db.session.add(EventLogEntry(type=ZONE_FAULT, message='c', zone=1, timestamp=datetime.datetime(2020, 1, 1, 11, 0)))
+        db.session.commit()
+
+        with db.engine.begin() as connection:
+            assert rollup.rebuild(connection) == 3
+
+        assert [c['count'] for c in rollup.history('hour')] == [2, 1]
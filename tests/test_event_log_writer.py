@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from ad2web.extensions import db
+from ad2web.log import EventLogEntry, ALARM, ZONE_FAULT
+from ad2web.log.writer import EventLogWriter
+
+from tests import TestCase
+
+
+class TestEventLogWriter(TestCase):
+
+    def test_rows_are_written_in_batches(self):
+        writer = EventLogWriter(self.app, batch_size=5, flush_interval=0.05)
+        writer.start()
+
+        for i in range(12):
+            writer.put(ZONE_FAULT, 'Zone {0} has been faulted.'.format(i))
+
+        deadline = time.time() + 5
+        while writer.written < 12 and time.time() < deadline:
+            time.sleep(0.01)
+
+        writer.stop()
+        writer.join(5)
+
+        stats = writer.stats()
+        assert EventLogEntry.query.count() == 12
+        assert stats['batch_size_max'] == 5
+        assert stats['batches'] >= 3
+        assert stats['depth'] == 0
+
+    def test_urgent_events_are_written_immediately(self):
+        writer = EventLogWriter(self.app, batch_size=100, flush_interval=60)
+        writer.start()
+
+        writer.put(ZONE_FAULT, 'Zone 1 has been faulted.')
+        writer.put(ALARM, 'Alarm tripped by zone 1!')
+
+        deadline = time.time() + 5
+        while writer.written < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        writer.stop()
+        writer.join(5)
+        db.session.remove()
+
+        messages = [e.message for e in EventLogEntry.query.order_by(EventLogEntry.id)]
+        assert messages == ['Zone 1 has been faulted.', 'Alarm tripped by zone 1!']
+        assert writer.stats()['batches'] == 1
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import tarfile
+
+from ad2web.extensions import db
+from ad2web.exporter import Exporter
+from ad2web.settings import Setting
+
+from tests import TestCase
+
+
+class TestExporter(TestCase):
+
+    def _archive(self, exporter):
+        return tarfile.open(mode='r:gz', fileobj=io.BytesIO(b''.join(exporter.iter_archive())))
+
+    def test_tables_are_written_as_json_lines(self):
+        for i in range(1200):
+            db.session.add(Setting(name='export_test_{0}'.format(i), value=str(i)))
+        db.session.commit()
+
+        exporter = Exporter()
+        exporter.BATCH_SIZE = 100
+        exporter.SPOOL_SIZE = 4096
+
+        with self._archive(exporter) as tar:
+            member = tar.getmember('alarmdecoder-export/settings.jsonl')
+            rows = [json.loads(line) for line in tar.extractfile(member)]
+
+        names = dict((r['name'], r['value']) for r in rows)
+        assert len(rows) == Setting.query.count()
+        assert names['export_test_1199'] == '1199'
+
+    def test_write_file_streams_to_disk(self):
+        exporter = Exporter()
+        exporter.exportSettings()
+
+        path = exporter.writeFile()
+
+        with tarfile.open(path, mode='r:gz') as tar:
+            assert 'alarmdecoder-export/users.jsonl' in tar.getnames()
+
+        exporter.removeFile()
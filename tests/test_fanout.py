@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ad2web.notifications.fanout import OrderedFanout
+
+
+def test_deliveries_keep_order_per_key():
+    executor = ThreadPoolExecutor(max_workers=4)
+    fanout = OrderedFanout(executor)
+    delivered = {'hub1': [], 'hub2': []}
+
+    for i in range(20):
+        for key in delivered:
+            fanout.submit(key, lambda key=key, i=i: (time.sleep(0.001), delivered[key].append(i)))
+
+    executor.shutdown(wait=True)
+
+    assert delivered['hub1'] == list(range(20))
+    assert delivered['hub2'] == list(range(20))
+    assert fanout.stats()['completed'] == 40
+
+
+
+def test_dropped_tasks_report_back():
+    fanout = OrderedFanout(max_pending=2)
+    ran, dropped = [], []
+
+    # Hold the key busy so later tasks queue up behind this one.
+    def first():
+        for i in range(4):
+            fanout.submit('hub', lambda i=i: ran.append(i), on_drop=lambda i=i: dropped.append(i))
+
+    fanout.submit('hub', first)
+
+    assert ran == [2, 3]
+    assert dropped == [0, 1]
+    assert fanout.stats()['dropped'] == 2
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+from ad2web.extensions import db
+from ad2web.exporter import Exporter
+from ad2web.importer import Importer
+from ad2web.settings import Setting
+from ad2web.zones import Zone
+
+from tests import TestCase
+
+
+class TestImporter(TestCase):
+
+    def _archive(self):
+        return io.BytesIO(b''.join(Exporter().iter_archive()))
+
+    def test_dry_run_reports_without_writing(self):
+        db.session.add(Setting(name='import_test', value='one'))
+        db.session.commit()
+        archive = self._archive()
+
+        Setting.get_by_name('import_test').value = 'two'
+        db.session.commit()
+
+        report = Importer(archive).run(dry_run=True)
+
+        assert report['errors'] == []
+        assert report['tables']['settings']['changed'] == 1
+        assert Setting.get_by_name('import_test').value == 'two'
+
+    def test_import_replaces_tables_and_reports_progress(self):
+        db.session.add(Setting(name='import_test', value='one'))
+        db.session.commit()
+        archive = self._archive()
+
+        db.session.add(Setting(name='import_test_extra', value='x'))
+        db.session.commit()
+
+        progress = []
+        report = Importer(archive, progress=progress.append).run()
+
+        assert report['tables']['settings']['imported'] == report['tables']['settings']['rows']
+        assert Setting.query.filter_by(name='import_test_extra').first() is None
+        assert progress[-1]['stage'] == 'done'
+
+    def test_import_refreshes_zone_names(self):
+        db.session.add(Zone(zone_id=7, name='Front Door'))
+        db.session.commit()
+        archive = self._archive()
+
+        Zone.query.filter_by(zone_id=7).first().name = 'Renamed'
+        db.session.commit()
+        assert Zone.get_name(7) == 'Renamed'
+
+        Importer(archive).run()
+
+        assert Zone.get_name(7) == 'Front Door'
+
+    def test_invalid_archive_is_rejected(self):
+        with pytest.raises(ValueError):
+            Importer(io.BytesIO(b'not an archive')).run()
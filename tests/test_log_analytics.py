@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import io
+import datetime
+
+import numpy as np
+
+from ad2web.extensions import db
+from ad2web.log import EventLogEntry, ARM, DISARM, ALARM, ZONE_FAULT
+from ad2web.log import analytics, rollup
+
+from tests import TestCase
+
+
+class TestEventLogAnalytics(TestCase):
+
+    def add_events(self, *events):
+        start = datetime.datetime(2020, 1, 1, 10, 0)
+        for minutes, type, zone in events:
+            db.session.add(EventLogEntry(type=type, message=str(type), zone=zone,
+                                         timestamp=start + datetime.timedelta(minutes=minutes)))
+        db.session.commit()
+
+    def test_aggregates(self):
+        self.add_events((0, ARM, None), (30, ARM, None), (60, DISARM, None),
+                        (61, ZONE_FAULT, 3), (62, ZONE_FAULT, 3), (125, ZONE_FAULT, 4), (130, ALARM, 4))
+
+        assert analytics.zone_faults() == [
+            {'hour': '2020-01-01T11:00:00', 'zone': 3, 'count': 2},
+            {'hour': '2020-01-01T12:00:00', 'zone': 4, 'count': 1},
+        ]
+
+        timeline = analytics.arm_timeline()
+        assert [(t['state'], t['seconds']) for t in timeline] == [('armed', 3600.0), ('disarmed', None)]
+
+        assert analytics.alarm_counts() == [{'day': '2020-01-01', 'type': ALARM, 'type_name': 'ALARM', 'count': 1}]
+
+    def test_aggregates_use_rollups(self):
+        # Rolled up only (raw rows expired), then raw only (not rolled up yet).
+        with db.engine.begin() as connection:
+            rollup.record(connection, [{'type': ZONE_FAULT, 'zone': 3, 'timestamp': datetime.datetime(2020, 1, 1, 9, 15)},
+                                       {'type': ALARM, 'zone': 3, 'timestamp': datetime.datetime(2020, 1, 1, 9, 20)}])
+        self.add_events((5, ZONE_FAULT, 3), (24 * 60, ALARM, 3))
+
+        assert analytics.zone_faults() == [
+            {'hour': '2020-01-01T09:00:00', 'zone': 3, 'count': 1},
+            {'hour': '2020-01-01T10:00:00', 'zone': 3, 'count': 1},
+        ]
+        assert analytics.alarm_counts() == [
+            {'day': '2020-01-01', 'type': ALARM, 'type_name': 'ALARM', 'count': 1},
+            {'day': '2020-01-02', 'type': ALARM, 'type_name': 'ALARM', 'count': 1},
+        ]
+
+    def test_npz_export(self):
+        self.add_events((0, ARM, None), (60 * 30, ZONE_FAULT, 2))
+
+        data = b''.join(analytics.export('npz', chunk=datetime.timedelta(hours=1)))
+        columns = np.load(io.BytesIO(data))
+
+        assert columns['type'].tolist() == [ARM, ZONE_FAULT]
+        assert columns['zone'].tolist() == [-1, 2]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+from ad2web.extensions import db
+from ad2web.log import EventLogEntry, ZONE_FAULT
+from ad2web.log.paging import fetch_page
+
+from tests import TestCase
+
+
+class TestEventLogPaging(TestCase):
+
+    def setUp(self):
+        super(TestEventLogPaging, self).setUp()
+        start = datetime.datetime(2020, 1, 1, 10, 0)
+        for minute in range(5):
+            db.session.add(EventLogEntry(type=ZONE_FAULT, message='event {0}'.format(minute),
+                                         timestamp=start + datetime.timedelta(minutes=minute)))
+        db.session.commit()
+
+    def messages(self, page):
+        return [e['message'] for e in page['events']]
+
+    def test_cursor_and_before(self):
+        first = fetch_page(limit=2)
+        second = fetch_page(limit=2, cursor=first['next'])
+        last = fetch_page(limit=2, cursor=second['next'])
+
+        assert self.messages(first) == ['event 4', 'event 3']
+        assert first['prev'] is None
+        assert self.messages(second) == ['event 2', 'event 1']
+        assert self.messages(last) == ['event 0']
+        assert last['next'] is None
+
+        assert self.messages(fetch_page(limit=2, before=last['prev'])) == ['event 2', 'event 1']
+        assert self.messages(fetch_page(limit=2, before=second['prev'])) == ['event 4', 'event 3']
+
+    def test_offset(self):
+        page = fetch_page(limit=2, offset=3)
+
+        assert self.messages(page) == ['event 1', 'event 0']
+        assert page['next'] is None
+        assert page['prev'] is not None
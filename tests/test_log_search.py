@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+from ad2web.log.search import parse, match_expression, matches
+
+
+def test_parse_prefix_phrase_and_zone_terms():
+    assert parse('front "back door" zone:"patio door" fron*') == [
+        ('prefix', 'front'), ('phrase', 'back door'), ('phrase', 'patio door'), ('prefix', 'fron')]
+    assert parse('  ') == []
+    assert parse('" * "') == []
+
+
+def test_match_expression_quotes_user_input():
+    assert match_expression(parse('front "back door"')) == '"front"* AND "back door"'
+    assert match_expression(parse('NEAR( OR ^x')) == '"NEAR"* AND "OR"* AND "x"*'
+
+
+def test_matches_follows_fts_semantics():
+    message = 'Zone Back Door (2) has been faulted.'
+
+    assert matches(parse('back fault'), message)
+    assert matches(parse('"back door"'), message)
+    assert not matches(parse('"back doo"'), message)
+    assert not matches(parse('ack'), message)
+    assert not matches(parse('back kitchen'), message)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from ad2web import logstore
+from ad2web.logstore import SegmentedLogHandler
+
+
+def _record(name, level, message, created):
+    record = logging.LogRecord(name, level, __file__, 1, message, None, None)
+    record.created = created
+    return record
+
+
+def test_query_only_reads_matching_segments(tmpdir):
+    folder = str(tmpdir.join('records'))
+    handler = SegmentedLogHandler(folder, max_bytes=2000)
+
+    for i in range(60):
+        handler.handle(_record('ad2web.decoder', logging.INFO, 'Reading {0}'.format(i), 1000 + i))
+    handler.handle(_record('ad2web.decoder', logging.ERROR, 'Reconnect failed', 2000))
+    for i in range(60):
+        handler.handle(_record('ad2web.notifications', logging.INFO, 'Sent {0}'.format(i), 3000 + i))
+    handler.close()
+
+    result = logstore.query(folder, level='ERROR')
+    assert [r['message'] for r in result['records']] == ['Reconnect failed']
+    assert result['scanned'] < result['segments']
+
+    result = logstore.query(folder, since=1050, until=1055, logger='ad2web.decoder')
+    assert [r['message'] for r in result['records']] == ['Reading {0}'.format(i) for i in range(54, 49, -1)]
+
+    assert logstore.query(folder, text='sent 5', limit=3)['records'][0]['message'] == 'Sent 59'
+
+
+def test_unindexed_segment_is_indexed_on_start(tmpdir):
+    folder = str(tmpdir.join('records'))
+    handler = SegmentedLogHandler(folder)
+    handler.handle(_record('ad2web', logging.WARNING, 'left open', 1000))
+    # Simulate a crash: the segment is never closed.
+    handler._stream.close()
+
+    SegmentedLogHandler(folder).close()
+
+    assert len(tmpdir.join('records').listdir(lambda p: p.ext == '.idx')) == 1
+    assert logstore.query(folder, level='WARNING')['records'][0]['message'] == 'left open'
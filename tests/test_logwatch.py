@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from ad2web.logwatch import LogWatcher
+from ad2web.log.follow import LogFollower
+
+
+def test_tail_returns_whole_lines(tmpdir):
+    log = tmpdir.join('info.log')
+    data = b'\n'.join([b'x' * n for n in range(0, 3000, 70)]) + b'\n'
+    log.write_binary(data)
+
+    for window in (1, 5, 40, 100):
+        assert LogWatcher.tail(str(log), window) == data.splitlines()[-window:]
+
+    tmpdir.join('empty.log').write_binary(b'')
+    assert LogWatcher.tail(str(tmpdir.join('empty.log')), 10) == []
+
+
+def test_follower_pushes_appended_lines(tmpdir):
+    log = tmpdir.join('info.log')
+    log.write('before\n')
+    frames = []
+
+    follower = LogFollower(str(tmpdir), emitter=lambda name, data, room: frames.append(data))
+    with open(str(log), 'a') as f:
+        f.write('first\nsecond\n')
+    follower.poll()
+
+    assert frames == [{'file': 'info.log', 'lines': ['first', 'second']}]
+
+
+def test_follower_stop_interrupts_wait(tmpdir):
+    # Longer than either wait, with inotify or polling.
+    follower = LogFollower(str(tmpdir), emitter=lambda name, data, room: None, interval=60)
+    follower.start()
+    time.sleep(0.1)
+
+    started = time.time()
+    follower.stop()
+    follower.join(5)
+
+    assert not follower.is_alive()
+    assert time.time() - started < LogWatcher.INOTIFY_TIMEOUT
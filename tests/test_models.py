@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from ad2web.user import User, UserDetail
+from ad2web.settings import Setting
+from ad2web.zones import Zone
+from ad2web.extensions import db
 
 from tests import TestCase
 
@@ -11,3 +14,51 @@ class TestUser(TestCase):
 
         assert User.query.count() == 2
         assert UserDetail.query.count() == 2
+
+
+class TestSetting(TestCase):
+
+    def test_cache_follows_writes(self):
+        setting = Setting.get_by_name('device_type')
+        setting.value = 'AD2USB'
+        db.session.add(setting)
+        db.session.commit()
+
+        assert Setting.get_many(['device_type', 'missing'], defaults={'missing': 1}) == {'device_type': 'AD2USB', 'missing': 1}
+
+        db.session.delete(Setting.get_by_name('device_type'))
+        db.session.commit()
+
+        assert Setting.get_by_name('device_type', default='AD2PI').value == 'AD2PI'
+        assert Setting.cache.stats()['hits'] > 0
+
+    def test_cache_applies_commits_only(self):
+        setting = Setting.get_by_name('device_type')
+        setting.value = 'AD2USB'
+        db.session.add(setting)
+        db.session.commit()
+        loads = Setting.cache.stats()['loads']
+
+        setting = Setting.get_by_name('device_type')
+        setting.value = 'AD2PI'
+        db.session.flush()
+        db.session.rollback()
+
+        assert Setting.get_many(['device_type']) == {'device_type': 'AD2USB'}
+        assert Setting.cache.stats()['loads'] == loads
+
+
+class TestZone(TestCase):
+
+    def test_index_follows_writes(self):
+        zone = Zone(zone_id=3, name='Front Door', description='Entry')
+        db.session.add(zone)
+        db.session.commit()
+
+        assert Zone.get_name(3) == 'Front Door'
+
+        zone.zone_id = 4
+        db.session.commit()
+
+        assert Zone.get_name(3) is None
+        assert Zone.index.items() == [(4, ('Front Door', 'Entry'))]
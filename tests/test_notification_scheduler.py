@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from ad2web.devices import PRIMARY_DEVICE
+from ad2web.notifications.constants import ZONE_FAULT, ZONE_RESTORE
+from ad2web.notifications.scheduler import NotificationScheduler
+
+
+class _Notifier(object):
+    def __init__(self, id, suppress=1):
+        self.id = id
+        self.suppress = suppress
+
+
+def test_duplicates_are_ignored_and_due_entries_pop_in_order():
+    scheduler = NotificationScheduler(persist=False)
+    first, second = _Notifier(1), _Notifier(2)
+
+    assert scheduler.schedule(second, ZONE_FAULT, 4, 'zone 4', None, 20)
+    assert scheduler.schedule(first, ZONE_FAULT, 3, 'zone 3', None, 10)
+    assert not scheduler.schedule(first, ZONE_FAULT, 3, 'zone 3 again', None, 15)
+
+    assert scheduler.next_deadline() == 10
+    assert [e['message'] for e in scheduler.pop_due(now=30)] == ['zone 3', 'zone 4']
+    assert len(scheduler) == 0
+
+
+def test_restore_suppresses_pending_fault():
+    scheduler = NotificationScheduler(persist=False)
+    notifier = _Notifier(1)
+
+    scheduler.schedule(notifier, ZONE_FAULT, 3, 'fault', None, 10)
+    assert not scheduler.schedule(notifier, ZONE_RESTORE, 3, 'restore', None, 10)
+
+    assert len(scheduler) == 0
+    assert scheduler.next_deadline() is None
+
+
+def test_devices_keep_separate_zones():
+    scheduler = NotificationScheduler(persist=False)
+    notifier = _Notifier(1)
+
+    assert scheduler.schedule(notifier, ZONE_FAULT, 3, 'primary', None, 10)
+    assert scheduler.schedule(notifier, ZONE_FAULT, 3, 'garage', None, 10, device=1)
+    assert not scheduler.schedule(notifier, ZONE_RESTORE, 3, 'restore', None, 10, device=1)
+
+    assert [(e['message'], e['device']) for e in scheduler.pop_due(now=30)] == [('primary', PRIMARY_DEVICE)]
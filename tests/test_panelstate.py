@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+from alarmdecoder import AlarmDecoder
+
+from ad2web.panelstate import PanelState
+
+READY = '[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+FAULT = '[00000001000000003A--],003,[f70000051003000008020000000000],"FAULT 03 FRONT DOOR             "'
+
+
+def test_deltas_carry_only_changed_fields():
+    device = AlarmDecoder(None)
+    state = PanelState()
+
+    device._handle_message(READY.encode())
+    first = state.update_from_device(device, READY)
+    assert first['seq'] == 1
+    assert first['changes']['panel_ready'] is True
+
+    assert state.update_from_device(device, READY) is None
+
+    device._handle_message(FAULT.encode())
+    delta = state.update_from_device(device, FAULT)
+    assert delta['seq'] == 2
+    assert delta['changes']['panel_ready'] is False
+    assert 'panel_type' not in delta['changes']
+
+    snapshot = state.snapshot()
+    assert snapshot['seq'] == 2
+    assert snapshot['state']['last_message_received'] == FAULT
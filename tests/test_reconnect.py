@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import contextlib
+
+from ad2web.decoder import DecoderThread
+
+
+class FakeApp(object):
+    logger = logging.getLogger(__name__)
+
+    def app_context(self):
+        return contextlib.nullcontext()
+
+
+class FakeDecoder(object):
+    def __init__(self, failures):
+        self.app = FakeApp()
+        self.device = None
+        self.trigger_restart = False
+        self.trigger_reopen_device = False
+        self.last_open_error = None
+        self.remaining_failures = failures
+        self.opens = []
+
+    def open(self, no_reader_thread=False, reuse_config=False):
+        self.opens.append(reuse_config)
+        if self.remaining_failures:
+            self.remaining_failures -= 1
+            return
+
+        self.device = object()
+        self.trigger_reopen_device = False
+
+
+def _supervisor(decoder):
+    thread = DecoderThread(decoder)
+    thread.BACKOFF_INITIAL = 0.01
+    thread.BACKOFF_MAX = 0.05
+    return thread
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_close_wakes_supervisor_immediately():
+    decoder = FakeDecoder(failures=0)
+    thread = _supervisor(decoder)
+    thread.start()
+
+    started = time.time()
+    decoder.trigger_reopen_device = True
+    thread.wake()
+    _wait_for(lambda: decoder.device is not None)
+
+    thread.stop()
+    thread.join(1)
+
+    assert time.time() - started < 1
+    assert thread.stats()['reconnects'] == 1
+
+
+def test_failed_attempts_back_off_and_reuse_config():
+    decoder = FakeDecoder(failures=3)
+    thread = _supervisor(decoder)
+    thread.start()
+
+    decoder.trigger_reopen_device = True
+    thread.wake()
+    _wait_for(lambda: decoder.device is not None)
+
+    thread.stop()
+    thread.join(1)
+
+    stats = thread.stats()
+    assert decoder.opens == [False, True, True, True]
+    assert stats['failures'] == 3
+    assert stats['reconnect_ms_last'] > 0
+
+
+def test_backoff_is_capped():
+    thread = DecoderThread(FakeDecoder(failures=0))
+
+    delays = [thread.backoff(n) for n in range(1, 20)]
+
+    assert all(d <= thread.BACKOFF_MAX for d in delays)
+    assert delays[-1] >= thread.BACKOFF_MAX / 2
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+
+from alarmdecoder.messages import Message, RFMessage, ExpanderMessage
+
+from ad2web.serializer import MessageSerializer, serializer
+
+KEYPAD = '[10000001000000003A--],008,[f70000051008001c08020000000000],"****DISARMED****  Ready to Arm  "'
+
+
+def test_serialize_keypad_message():
+    payload = serializer.serialize({'message': Message(KEYPAD), 'message_type': 'panel'})
+
+    assert payload['message_type'] == 'panel'
+    assert payload['message']['raw'] == KEYPAD
+    assert payload['message']['ready'] is True
+    assert payload['message']['text'].strip() == '****DISARMED****  Ready to Arm'
+    assert isinstance(payload['message']['timestamp'], str)
+
+    # Must be encodable without any custom hooks.
+    json.dumps(payload)
+
+
+def test_serialize_event_kwargs():
+    rfx = RFMessage('!RFX:0180036,80')
+    payload = serializer.serialize({'zone': 3, 'message': rfx, 'when': datetime.date(2020, 1, 2)})
+
+    assert payload['zone'] == 3
+    assert payload['when'] == '2020-01-02'
+    assert payload['message']['serial_number'] == '0180036'
+    assert payload['message']['loop'] == [True, False, False, False]
+
+
+def test_register_schema():
+    s = MessageSerializer()
+    s.register(ExpanderMessage, ('address', 'channel'))
+
+    assert s.serialize(ExpanderMessage('!EXP:07,01,01')) == {'address': 7, 'channel': 1}
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from http.client import HTTPConnection, HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ad2web.notifications.transport import ConnectionPool
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply()
+
+    def do_NOTIFY(self):
+        self.do_POST()
+
+    def do_PUT(self):
+        self.do_POST()
+
+    def _reply(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    server.connections = 0
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuses_connections(stub_server):
+    netloc = '127.0.0.1:{0}'.format(stub_server.server_address[1])
+
+    # One connection per notification, as the notifiers used to do.
+    for _ in range(10):
+        conn = HTTPConnection(netloc, timeout=5)
+        conn.request('POST', '/notify', body='zone fault')
+        conn.getresponse().read()
+        conn.close()
+
+    assert stub_server.connections == 10
+
+    pool = ConnectionPool()
+    for _ in range(10):
+        response = pool.request('NOTIFY', netloc, '/notify', body='zone fault')
+        assert response.status == 200
+        assert response.data == b'ok'
+
+    assert stub_server.connections == 11
+    assert pool.stats()['connects'] == 1
+    assert pool.stats()['reused'] == 9
+
+    pool.close()
+
+
+def test_pool_retries_after_connection_failure(stub_server):
+    pool = ConnectionPool(retries=1, backoff=0)
+    port = stub_server.server_address[1]
+
+    stub_server.shutdown()
+    stub_server.server_close()
+
+    with pytest.raises(OSError):
+        pool.request('POST', '127.0.0.1:{0}'.format(port), '/notify', body='x', timeout=1)
+
+    assert pool.stats()['retried'] == 1
+
+
+class _DroppingHandler(_StubHandler):
+    def do_POST(self):
+        # Received, then the connection drops before any response.
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.received += 1
+        self.close_connection = True
+
+
+def test_pool_does_not_resend_received_post(stub_server):
+    stub_server.RequestHandlerClass = _DroppingHandler
+    stub_server.received = 0
+    netloc = '127.0.0.1:{0}'.format(stub_server.server_address[1])
+    pool = ConnectionPool(retries=2, backoff=0)
+
+    with pytest.raises(HTTPException):
+        pool.request('POST', netloc, '/notify', body='alarm', timeout=1)
+
+    assert stub_server.received == 1
+    assert pool.stats()['retried'] == 0
+
+    with pytest.raises(HTTPException):
+        pool.request('PUT', netloc, '/notify', body='alarm', timeout=1)
+
+    assert stub_server.received == 4